@@ -0,0 +1,31 @@
+from functools import wraps
+import hmac
+
+from flask import abort, current_app, request
+
+#----------------------------------------------------------------------------#
+# Admin access.
+#----------------------------------------------------------------------------#
+
+
+def admin_required(view):
+    # admin routes need ADMIN_TOKEN set in the config and sent back either as
+    # the X-Admin-Token header or a ?token= parameter. No token, no admin.
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        expected = current_app.config.get('ADMIN_TOKEN')
+        given = request.headers.get('X-Admin-Token') or request.args.get('token')
+        if not expected or not given or not hmac.compare_digest(given, expected):
+            abort(403)
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def requested_ids() -> list:
+    # ids can come as a JSON {"ids": [...]} body or repeated ids form fields
+    payload = request.get_json(silent=True)
+    if payload is not None:
+        ids = payload.get('ids', [])
+    else:
+        ids = request.form.getlist('ids')
+    return [int(id) for id in ids]
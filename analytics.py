@@ -0,0 +1,184 @@
+from collections import Counter
+from datetime import date, timedelta
+
+from sqlalchemy import Date, String, func, insert, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+from identity import get_artists, get_venues
+from models import db, Artist, BookingRollup, Show, ShowArchive, Venue, local_time
+
+#----------------------------------------------------------------------------#
+# Booking analytics.
+#----------------------------------------------------------------------------#
+
+# BookingRollup holds one row per (local show day, city, state, genre). A show
+# counts once for every genre of its artist and once more under ALL_GENRES,
+# which the location and month totals use. The dashboard only aggregates the
+# rollup, so it costs the same no matter how many shows were ever booked.
+# Archiving a venue/artist doesn't remove its bookings from the stats, purged
+# shows drop out on the next rebuild. Shows moved out of the database by
+# `flask maintenance` stay counted: a rebuild leaves the days before the
+# archive horizon alone, see retention.py.
+
+# genre bucket for artists without genres, every primary key column needs a value
+NO_GENRE = 'Unspecified'
+ALL_GENRES = '*'
+
+# shows per fetch when counting in python, rollup rows per INSERT
+CHUNK_SIZE = 5000
+UPSERT_CHUNK_SIZE = 500
+
+# every day unless rebuild_rollups passes the archive horizon
+POSTGRES_REBUILD = text(
+    '''
+    INSERT INTO "BookingRollup" (day, city, state, genre, bookings)
+    SELECT CAST(timezone(v.timezone, timezone('utc', s.start_time)) AS date),
+           COALESCE(v.city, ''), COALESCE(v.state, ''),
+           COALESCE(g.genre, :no_genre), count(*)
+    FROM "Show" s
+    JOIN "Venue" v ON v.id = s.venue_id
+    JOIN "Artist" a ON a.id = s.artist_id
+    LEFT JOIN LATERAL unnest(a.genres) AS g(genre) ON true
+    WHERE CAST(timezone(v.timezone, timezone('utc', s.start_time)) AS date) >= :horizon
+    GROUP BY 1, 2, 3, 4
+    UNION ALL
+    SELECT CAST(timezone(v.timezone, timezone('utc', s.start_time)) AS date),
+           COALESCE(v.city, ''), COALESCE(v.state, ''), :all_genres, count(*)
+    FROM "Show" s
+    JOIN "Venue" v ON v.id = s.venue_id
+    WHERE CAST(timezone(v.timezone, timezone('utc', s.start_time)) AS date) >= :horizon
+    GROUP BY 1, 2, 3
+    '''
+).bindparams(no_genre=NO_GENRE, all_genres=ALL_GENRES, horizon=date.min)
+
+
+class month_of(FunctionElement):
+    # month_of(date) -> 'YYYY-MM'
+    type = String()
+    inherit_cache = True
+
+
+@compiles(month_of)
+def _month_of(element, compiler, **kw):
+    return "strftime('%%Y-%%m', %s)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(month_of, 'postgresql')
+def _month_of_postgresql(element, compiler, **kw):
+    return "to_char(%s, 'YYYY-MM')" % compiler.process(element.clauses, **kw)
+
+
+def _upsert(counts) -> None:
+    # adds counts {(day, city, state, genre): n} to the rollup in the caller's
+    # transaction, with INSERT .. ON CONFLICT on postgres and sqlite
+    if not counts:
+        return
+    values = [{'day': day, 'city': city, 'state': state, 'genre': genre, 'bookings': n}
+              for (day, city, state, genre), n in counts.items()]
+
+    dialects = {'postgresql': postgresql, 'sqlite': sqlite}
+    dialect = dialects.get(db.session.get_bind().dialect.name)
+    if dialect is not None:
+        for i in range(0, len(values), UPSERT_CHUNK_SIZE):
+            statement = dialect.insert(BookingRollup).values(
+                values[i:i + UPSERT_CHUNK_SIZE])
+            db.session.execute(statement.on_conflict_do_update(
+                index_elements=['day', 'city', 'state', 'genre'],
+                set_={'bookings': BookingRollup.bookings + statement.excluded.bookings}))
+        return
+
+    for row in values:
+        updated = BookingRollup.query.filter_by(
+            day=row['day'], city=row['city'], state=row['state'], genre=row['genre']
+        ).update({'bookings': BookingRollup.bookings + row['bookings']},
+                 synchronize_session=False)
+        if not updated:
+            db.session.execute(insert(BookingRollup).values(row))
+
+
+def _count(rows) -> Counter:
+    # rows of (day, city, state, genres)
+    counts = Counter()
+    for day, city, state, genres in rows:
+        location = (day, city or '', state or '')
+        counts[(*location, ALL_GENRES)] += 1
+        for genre in genres or [NO_GENRE]:
+            counts[(*location, genre)] += 1
+    return counts
+
+
+def record_bookings(shows) -> None:
+    # called with the shows about to be committed, as dicts with venue_id,
+    # artist_id and the local start_time. Doesn't commit, so the rollup and the
+    # shows land in the same transaction.
+    # the booking code already looked these up in the request, see identity.py
+    venues = get_venues({show['venue_id'] for show in shows})
+    artists = get_artists({show['artist_id'] for show in shows})
+
+    _upsert(_count(
+        (show['start_time'].date(), venues[show['venue_id']].city,
+         venues[show['venue_id']].state, artists[show['artist_id']].genres)
+        for show in shows))
+
+
+def archive_horizon():
+    # local day before which the shows were moved to the archive files, or None
+    return db.session.query(func.max(ShowArchive.archived_before)).scalar()
+
+
+def rebuild_rollups() -> int:
+    # recomputes the rollup in one transaction, readers keep seeing the old
+    # numbers until it commits. Postgres aggregates everything in a single
+    # INSERT .. SELECT, other databases stream the shows and count them here.
+    # Days before the archive horizon are kept as they are, their shows are
+    # no longer in the table.
+    horizon = archive_horizon() or date.min
+    try:
+        BookingRollup.query.filter(BookingRollup.day >= horizon).delete(
+            synchronize_session=False)
+        if db.session.get_bind().dialect.name == 'postgresql':
+            db.session.execute(POSTGRES_REBUILD, {'horizon': horizon})
+        else:
+            day = func.date(local_time(Show.start_time, Venue.timezone), type_=String)
+            rows = db.session.query(
+                day, Venue.city, Venue.state, Artist.genres
+            ).join(Venue, Venue.id == Show.venue_id).join(
+                Artist, Artist.id == Show.artist_id
+            ).filter(func.date(local_time(Show.start_time, Venue.timezone), type_=Date)
+                     >= horizon).yield_per(CHUNK_SIZE)
+            _upsert(_count(
+                (date.fromisoformat(str(day)[:10]), city, state, genres)
+                for day, city, state, genres in rows))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return db.session.query(func.count()).select_from(BookingRollup).scalar()
+
+
+def summary(months=None) -> dict:
+    # booking volume by location, genre and month, optionally only for shows
+    # from `months` months ago onwards, upcoming ones included
+    query = db.session.query
+    filters = []
+    if months:
+        filters.append(BookingRollup.day >= date.today() - timedelta(days=31 * months))
+    shows = [*filters, BookingRollup.genre == ALL_GENRES]
+
+    total = func.sum(BookingRollup.bookings).label('bookings')
+    by_location = query(BookingRollup.city, BookingRollup.state, total).filter(
+        *shows).group_by(BookingRollup.city, BookingRollup.state).order_by(
+        total.desc(), BookingRollup.state, BookingRollup.city)
+    by_genre = query(BookingRollup.genre, total).filter(
+        *filters, BookingRollup.genre != ALL_GENRES).group_by(
+        BookingRollup.genre).order_by(total.desc(), BookingRollup.genre)
+    month = month_of(BookingRollup.day).label('month')
+    by_month = query(month, total).filter(*shows).group_by(month).order_by(month)
+
+    return {
+        'by_location': [row._asdict() for row in by_location],
+        'by_genre': [row._asdict() for row in by_genre],
+        'by_month': [row._asdict() for row in by_month],
+    }
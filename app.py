@@ -3,20 +3,46 @@
 #----------------------------------------------------------------------------#
 
 from dataclasses import asdict
+from datetime import datetime
 from flask_migrate import Migrate, upgrade
 from forms import *
-from logging import Formatter, FileHandler
+from logging import Formatter
+from logging.handlers import WatchedFileHandler
 import logging
 from sqlalchemy import func
 from flask_sqlalchemy import SQLAlchemy
-from flask_moment import Moment
+from flask_moment import Moment, moment as client_moment
+from markupsafe import Markup
 import re
+import click
 import dateutil.parser
 import babel
-from flask import (Flask, render_template, request,
-                   flash, redirect, url_for)
-
-from models import db, Artist, Venue, Show
+from flask import (Flask, Response, render_template, request, abort, stream_template,
+                   flash, redirect, url_for, jsonify, send_file)
+from werkzeug.exceptions import ServiceUnavailable
+
+from models import db, Artist, Venue, Show, ShowFeed, local_time, utcnow
+from partitions import ensure_show_partitions
+from scheduling import BookingError, book_shows, expand_occurrences, parse_start_time, to_utc
+from deletion import archive_venues, archive_artists, purge_venues, purge_artists
+from admin import admin_required, requested_ids
+from routing import replica_read
+from autocomplete import get_index, init_autocomplete, update_index
+from updates import StaleEditError, update_from_form
+from analytics import rebuild_rollups, record_bookings, summary
+from feed import rebuild_feed, sync_feed
+from events import backlog, get_hub, init_events, stream
+from identity import get_artist, get_venue
+from tickets import ReservationError, availability, reserve
+from dedupe import THRESHOLD, MergeError, find_duplicates, merge
+from prerender import PAGE_FIELDS, init_prerender, prerender_all, refresh, related_ids
+from compression import buffered, init_compression
+from health import liveness, readiness
+from ratelimit import init_rate_limits, limited, stats as rate_limit_stats
+from profiler import get_profiler, init_profiler
+from retention import FORMATS, archive_shows, init_retention, rotate_log
+from images import (CACHE_MAX_AGE, MIMETYPES, THUMBNAIL_WIDTHS, ImageFetchError,
+                    get_thumbnails, init_images, thumbnail_url, verify)
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -26,6 +52,14 @@ app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
 db.init_app(app=app)
+init_compression(app)
+init_rate_limits(app)
+init_events(app)
+init_prerender(app)
+init_profiler(app)
+init_retention(app)
+init_images(app)
+init_autocomplete(app)
 
 # Connect to a local postgresql database
 # This is done in the config.py and imported on above using app.config.from_object('config')
@@ -39,7 +73,7 @@ migrate = Migrate(app, db)
 
 
 def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
+    date = value if isinstance(value, datetime) else dateutil.parser.parse(value)
     if format == 'full':
         format = "EEEE MMMM, d, y 'at' h:mma"
     elif format == 'medium':
@@ -47,22 +81,225 @@ def format_datetime(value, format='medium'):
     return babel.dates.format_datetime(date, format, locale='en')
 
 
+# moment.js spellings of the format_datetime formats
+MOMENT_FORMATS = {
+    'full': 'dddd MMMM, D, YYYY [at] h:mmA',
+    'medium': 'ddd MM, DD, YYYY h:mmA',
+}
+
+
+def show_time(show, format='medium'):
+    # start time of a show row (start_time local to the venue, start_time_utc).
+    # With CLIENT_SIDE_DATES the page only carries ISO timestamps, the browser
+    # formats them with moment.js and adds "in 3 days", so rows cost no babel
+    # formatting and a cached or pre-rendered page never shows a stale label.
+    if not app.config['CLIENT_SIDE_DATES']:
+        return format_datetime(show['start_time'], format)
+    # local=True keeps the venue's wall clock time instead of the browser's zone
+    local = client_moment(show['start_time'], local=True).format(
+        MOMENT_FORMATS.get(format, format))
+    relative = client_moment(show['start_time_utc']).fromNow(refresh=True)
+    return local + Markup(' &middot; ') + relative
+
+
 app.jinja_env.filters['datetime'] = format_datetime
+app.jinja_env.filters['show_time'] = show_time
+# image_link urls go through the thumbnail proxy, see images.py
+app.jinja_env.filters['thumb'] = thumbnail_url
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+
+@app.cli.command('create-show-partitions')
+@click.option('--years-ahead', default=2, show_default=True)
+def create_show_partitions(years_ahead):
+    # run from cron so next year's Show partition exists before it's needed
+    created = ensure_show_partitions(db.engine, years_ahead)
+    print(f'Created partitions: {", ".join(created) or "none"}')
+
+
+@app.cli.command('rebuild-analytics')
+def rebuild_analytics():
+    # recomputes the booking rollups from every show, the app keeps them
+    # current on its own, this is for after bulk imports or purges. The days
+    # `flask maintenance` archived are kept as they are.
+    rows = rebuild_rollups()
+    print(f'Rebuilt booking rollups: {rows} rows')
+
+
+@app.cli.command('rebuild-show-feed')
+def rebuild_show_feed():
+    # writes keep the feed current, this is for after imports or manual fixes
+    rows = rebuild_feed()
+    print(f'Rebuilt show feed: {rows} shows')
+
+
+@app.cli.command('prerender')
+@click.option('--output', help='Directory for the pages, PRERENDER_DIR by default.')
+@click.option('--workers', type=int, help='Processes, one per CPU by default.')
+def prerender(output, workers):
+    # static copies of every venue and artist page, see prerender.py
+    directory = output or app.config['PRERENDER_DIR']
+    if not directory:
+        raise click.UsageError('Set PRERENDER_DIR or pass --output.')
+    results = prerender_all(app, directory, workers or app.config['PRERENDER_WORKERS'])
+    print(f'Pre-rendered {results["venues"]} venue and {results["artists"]} artist pages '
+          f'into {directory}, removed {results["removed"]} stale pages')
+
+
+@app.cli.command('find-duplicates')
+@click.argument('kind', type=click.Choice(['venues', 'artists']))
+@click.option('--threshold', default=THRESHOLD, show_default=True,
+              help='Name similarity from 0 to 1.')
+def find_duplicates_command(kind, threshold):
+    # prints merge candidates, one group per line: keep id, then the duplicates
+    for group in find_duplicates(kind[:-1], threshold):
+        keep = group['keep']
+        duplicates = ', '.join(
+            f'{d["id"]} "{d["name"]}" ({d["score"]}, {"+".join(d["reasons"])})'
+            for d in group['duplicates'])
+        print(f'{keep["id"]} "{keep["name"]}" <- {duplicates}')
+
+
+@app.cli.command('merge-duplicates')
+@click.argument('kind', type=click.Choice(['venues', 'artists']))
+@click.argument('keep_id', type=int)
+@click.argument('duplicate_ids', type=int, nargs=-1, required=True)
+def merge_duplicates_command(kind, keep_id, duplicate_ids):
+    try:
+        result = merge_entities(kind, keep_id, duplicate_ids)
+    except MergeError as e:
+        raise click.ClickException(str(e))
+    print(f'Merged {result["merged"]} {kind} into {keep_id}, '
+          f'moved {result["shows_moved"]} shows')
+
+
+@app.cli.command('maintenance')
+@click.option('--days', type=int, help='Archive shows older than this, RETENTION_DAYS by default.')
+@click.option('--output', help='Directory for the archive, RETENTION_DIR by default.')
+@click.option('--format', 'format', type=click.Choice(FORMATS),
+              help='Parquet when pyarrow is installed, gzipped NDJSON otherwise.')
+@click.option('--skip-logs', is_flag=True, help="Don't rotate the log file.")
+def maintenance(days, output, format, skip_logs):
+    # run daily from cron, see retention.py
+    days = days if days is not None else app.config['RETENTION_DAYS']
+    if days < 1:
+        raise click.UsageError('--days must be at least 1.')
+    try:
+        result = archive_shows(
+            output or app.config['RETENTION_DIR'], days,
+            format or app.config['RETENTION_FORMAT'],
+            app.config['RETENTION_BATCH_SIZE'], app.config['RETENTION_PAUSE_SECONDS'])
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    print(f'Archived {result["shows"]} shows older than {days} days '
+          f'into {len(result["parts"])} files')
+    pending = refresh(app, venues=sorted(result['venues']),
+                      artists=sorted(result['artists']))
+    if pending is not None:
+        # the command exits right after, the pages are rendered before it does
+        pending.result()
+    if not skip_logs:
+        rotated = rotate_log(app.config['LOG_FILE'], app.config['LOG_BACKUP_COUNT'])
+        print(f'Rotated {app.config["LOG_FILE"]}' if rotated else 'No log to rotate')
 
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
 
+def split_shows(shows_query):
+    # upcoming and past shows are fetched with their own start_time predicate
+    # against the database clock, so postgres only scans the Show partitions
+    # each side needs and nothing gets compared in python
+    upcoming = shows_query.filter(
+        Show.start_time >= utcnow()).order_by(Show.start_time).all()
+    past = shows_query.filter(
+        Show.start_time < utcnow()).order_by(Show.start_time.desc()).all()
+    return [row._asdict() for row in upcoming], [row._asdict() for row in past]
+
+
+def stream_page(template, **context):
+    # list pages can run to thousands of rows, they're sent while rendering so
+    # the browser gets the page head and the first rows right away
+    if not app.config.get('STREAM_TEMPLATES', True):
+        return render_template(template, **context)
+    chunks = buffered(stream_template(template, **context),
+                      app.config.get('STREAM_BUFFER_SIZE', 4096))
+    return app.response_class(chunks, mimetype='text/html')
+
+
 @app.route('/')
 def index():
     return render_template('pages/home.html')
 
 
+@ app.route('/healthz')
+def healthz():
+    # the worker is up and answering, nothing else is checked
+    response = jsonify(liveness())
+    response.cache_control.no_store = True
+    return response
+
+
+@ app.route('/readyz')
+def readyz():
+    # database reachable within HEALTH_CHECK_TIMEOUT, pool usage and migrations
+    report, ready = readiness(app, db.engine)
+    response = jsonify(report)
+    response.status_code = 200 if ready else 503
+    response.cache_control.no_store = True
+    return response
+
+
+@ app.route('/autocomplete')
+@ replica_read
+@ limited('autocomplete')
+def autocomplete():
+    # typeahead for the search boxes, answered from the in-memory prefix index
+    prefix = request.args.get('q', '')
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    kinds = [request.args['type']] if request.args.get(
+        'type') in ('venue', 'artist') else ['venue', 'artist']
+
+    index = get_index()
+    response = {'query': prefix}
+    for kind in kinds:
+        response[f'{kind}s'] = index.search(prefix, kind, limit)
+    return jsonify(response)
+
+
+@ app.route('/images/<int:width>')
+def image_thumbnail(width):
+    # resized copy of an image_link, fetched once and then served from disk
+    url, signature = request.args.get('url', ''), request.args.get('sig')
+    if width not in THUMBNAIL_WIDTHS or not verify(url, signature):
+        abort(404)
+    try:
+        path = get_thumbnails(app).get(url, width)
+        if path is None:
+            raise FileNotFoundError(url)
+        response = send_file(path, mimetype=MIMETYPES[path.rsplit('.', 1)[1]],
+                             max_age=CACHE_MAX_AGE, conditional=True)
+    except FileNotFoundError:
+        # evicted before it could be sent, refetched on the next request
+        return redirect(url)
+    except ImageFetchError as e:
+        # the page still gets its picture, straight from the source
+        app.logger.warning(str(e))
+        return redirect(url)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
 #  Venues
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@ replica_read
 def venues():
     # replace with real venues data.
     #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
@@ -76,7 +313,7 @@ def venues():
     # doing a full outer join so that all venues always show
     query = Show.query.join(Venue, full=True).with_entities(
         Venue.city, Venue.state, Venue.name, Venue.id, func.count(Venue.id)
-    ).group_by(Venue.city, Venue.state, Venue.name, Venue.id).order_by(Venue.state, Venue.city, Venue.name)
+    ).filter(Venue.deleted_at.is_(None)).group_by(Venue.city, Venue.state, Venue.name, Venue.id).order_by(Venue.state, Venue.city, Venue.name)
 
     results = {}
 
@@ -94,22 +331,22 @@ def venues():
         data.append(d)
 
     print(data)
-    return render_template('pages/venues.html', areas=data)
+    return stream_page('pages/venues.html', areas=data)
 
 
 @ app.route('/venues/search', methods=['POST'])
+@ replica_read
+@ limited('search')
 def search_venues():
     # Implement search on artists with partial string search. Ensure it is case-insensitive.
     # seach for Hop should return "The Musical Hop".
     # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
 
-    # transform form object to dictionary
-    search_term = request.form.to_dict(flat=False)['search_term']
+    search_term = f"%{request.form.get('search_term', '')}%"
 
-    search_term = f"%{search_term}%"
-
-    # note: using .match() is not compatible with SqlLite
-    query = Venue.query.filter(Venue.name.match(search_term)).all()
+    # ilike like the artist search, .match() is a full text search on postgres
+    # and doesn't exist on sqlite
+    query = Venue.active().filter(Venue.name.ilike(search_term)).all()
 
     response = {"count": len(query), "data": query}
 
@@ -117,27 +354,23 @@ def search_venues():
 
 
 @ app.route('/venues/<int:venue_id>')
+@ replica_read
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
     # replace with real venue data from the venues table, using venue_id
-    ct = datetime.now().strftime('%Y-%m-%d %H:%S:%M')
-    query = Venue.query.get(venue_id)
+    query = get_venue(venue_id)
 
     if query:
         data = Venue.to_dict(query)
 
-        shows_query = Show.query.join(Venue, full=True).join(Artist).with_entities(
-            Venue.id, Venue.name, Show.start_time, Artist.id, Artist.name, Artist.image_link
-        ).filter_by(id=venue_id).all()
+        shows_query = Show.query.join(Artist).with_entities(
+            Artist.id.label('artist_id'), Artist.name.label('artist_name'),
+            Artist.image_link.label('artist_image_link'),
+            local_time(Show.start_time, query.timezone).label('start_time'),
+            Show.start_time.label('start_time_utc')
+        ).filter(Show.venue_id == venue_id, Show.archived_at.is_(None))
 
-        upcoming_shows, past_shows, current_show = [], [], {}
-        for id, venue, start_time, artist_id, artist_name, artist_image_link in shows_query:
-            current_show = {'venue_id': id, 'venue_name': venue, 'artist_id': artist_id, 'artist_name': artist_name,
-                            'artist_image_link': artist_image_link, 'start_time': start_time}
-            if start_time > ct:
-                upcoming_shows.append(current_show)
-            else:
-                past_shows.append(current_show)
+        upcoming_shows, past_shows = split_shows(shows_query)
 
         data.update(
             {
@@ -162,6 +395,7 @@ def create_venue_form():
 
 
 @ app.route('/venues/create', methods=['POST'])
+@ limited('write')
 def create_venue_submission():
     # Insert form data as a new Venue record in the db, instead
     # Modify data to be the data object returned from db insertion
@@ -180,6 +414,8 @@ def create_venue_submission():
 
             db.session.add(venue)
             db.session.commit()
+            update_index('venue', venue.id, venue.name)
+            refresh(app, venues=[venue.id])
             # on successful db insert, flash success
 
             flash('Venue "' + venue.name +
@@ -201,36 +437,182 @@ def create_venue_submission():
     return render_template('pages/home.html')
 
 
-@ app.route('/venues/<venue_id>', methods=['DELETE'])
+@ app.route('/venues/<int:venue_id>', methods=['DELETE'])
+@ limited('write')
 def delete_venue(venue_id):
-    # Complete this endpoint for taking a venue_id, and using
-    # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
+    # venues are soft deleted, their shows get archived in the same transaction
+    # so the Show.venue_id foreign key never gets in the way
     try:
-        Venue.query.filter_by(id=venue_id).delete()
-        db.session.commit()
-    except:
-        db.session.rollback()
+        archived = archive_venues([venue_id])
+    except Exception as e:
+        app.logger.error(f'Venue {venue_id} could not be deleted. Error: {e}')
+        return jsonify({'success': False, 'error': 'Venue could not be deleted.'}), 500
     finally:
         db.session.close()
-    # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
-    # clicking that button delete it from the db then redirect the user to the homepage
-    return None
+
+    if not archived:
+        return jsonify({'success': False, 'error': 'Venue not found.'}), 404
+    update_index('venue', venue_id)
+    refresh(app, venues=[venue_id], related=['venue'])
+    return jsonify({'success': True, 'redirect': url_for('index')})
+
+
+@ app.route('/admin/<any(venues, artists):kind>/delete', methods=['POST'])
+@ admin_required
+def admin_bulk_delete(kind):
+    # bulk archive (default) or hard delete of thousands of venues/artists,
+    # done with set based UPDATE/DELETE statements instead of loading rows
+    try:
+        ids = requested_ids()
+    except (AttributeError, TypeError, ValueError):
+        return jsonify({'error': 'ids must be a list of integers.'}), 400
+
+    action = request.args.get('action', 'archive')
+    handlers = {
+        ('venues', 'archive'): archive_venues,
+        ('venues', 'delete'): purge_venues,
+        ('artists', 'archive'): archive_artists,
+        ('artists', 'delete'): purge_artists,
+    }
+    if (kind, action) not in handlers:
+        return jsonify({'error': f'Unknown action "{action}".'}), 400
+
+    # a purge deletes the shows linking to the pages of the other kind
+    other = 'artists' if kind == 'venues' else 'venues'
+    others = related_ids(kind[:-1], ids) if (
+        action == 'delete' and app.config['PRERENDER_DIR']) else set()
+
+    count = handlers[(kind, action)](ids)
+    for id in ids:
+        update_index(kind[:-1], id)
+    refresh(app, **{kind: ids, other: others}, related=[kind[:-1]])
+    return jsonify({'action': action, 'requested': len(ids), 'affected': count})
+
+
+
+def analytics_months():
+    # ?months=N leaves out shows older than N months, everything by default
+    months = request.args.get('months', type=int)
+    return months if months and months > 0 else None
+
+
+@ app.route('/admin/analytics')
+@ admin_required
+@ replica_read
+def admin_analytics():
+    months = analytics_months()
+    return render_template('pages/analytics.html', stats=summary(months), months=months)
+
+
+@ app.route('/admin/analytics.json')
+@ admin_required
+@ replica_read
+def admin_analytics_json():
+    return jsonify(summary(analytics_months()))
+
+
+def merge_entities(kind, keep_id, duplicate_ids) -> dict:
+    # merge plus the per worker caches and static pages of the records involved
+    result = merge(kind[:-1], keep_id, duplicate_ids)
+    for id in duplicate_ids:
+        update_index(kind[:-1], id)
+    refresh(app, **{kind: [keep_id, *duplicate_ids]}, related=[kind[:-1]])
+    return result
+
+
+@ app.route('/admin/<any(venues, artists):kind>/duplicates')
+@ admin_required
+@ replica_read
+def admin_duplicates(kind):
+    # merge candidates, ?threshold= name similarity from 0 to 1
+    threshold = request.args.get('threshold', THRESHOLD, type=float)
+    return jsonify({'groups': find_duplicates(kind[:-1], threshold)})
+
+
+@ app.route('/admin/<any(venues, artists):kind>/merge', methods=['POST'])
+@ admin_required
+def admin_merge(kind):
+    # {"keep": id, "ids": [duplicate ids]}, the shows of the duplicates move
+    # to keep and the duplicates are archived
+    try:
+        keep_id = int((request.get_json(silent=True) or request.form).get('keep'))
+        ids = requested_ids()
+    except (AttributeError, TypeError, ValueError):
+        return jsonify({'error': 'keep must be an id and ids a list of integers.'}), 400
+
+    try:
+        result = merge_entities(kind, keep_id, ids)
+    except MergeError as e:
+        return jsonify({'error': str(e)}), 404
+    return jsonify(result)
+
+
+@ app.route('/admin/rate-limits')
+@ admin_required
+def admin_rate_limits():
+    # requests this worker turned away, by route group and reason
+    return jsonify(rate_limit_stats(app))
+
+
+@ app.route('/admin/profiler')
+@ admin_required
+def admin_profiler():
+    # state of this worker's profiler and the samples per route
+    return jsonify(get_profiler(app).status())
+
+
+@ app.route('/admin/profiler/start', methods=['POST'])
+@ admin_required
+def admin_profiler_start():
+    # {"seconds": 30, "sample_rate": 0.1} profiles a tenth of the requests
+    # for 30 seconds, see profiler.py
+    payload = request.get_json(silent=True) or request.form
+    try:
+        seconds = float(payload.get('seconds', 30))
+        sample_rate = float(payload.get('sample_rate', 1))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'seconds and sample_rate must be numbers.'}), 400
+    if not 0 < seconds <= app.config['PROFILER_MAX_SECONDS'] or not 0 < sample_rate <= 1:
+        return jsonify({'error': f'seconds must be up to {app.config["PROFILER_MAX_SECONDS"]} '
+                                 'and sample_rate between 0 and 1.'}), 400
+    profiler = get_profiler(app)
+    profiler.start(seconds, sample_rate)
+    return jsonify(profiler.status())
+
+
+@ app.route('/admin/profiler/stop', methods=['POST'])
+@ admin_required
+def admin_profiler_stop():
+    profiler = get_profiler(app)
+    profiler.stop()
+    return jsonify(profiler.status())
+
+
+@ app.route('/admin/profiler/stacks')
+@ admin_required
+def admin_profiler_stacks():
+    # collapsed stacks for flamegraph.pl or speedscope, ?route=GET /shows for one route
+    stacks = get_profiler(app).collapsed(request.args.get('route'))
+    return app.response_class(stacks, mimetype='text/plain')
 
 #  Artists
 #  ----------------------------------------------------------------
 
 
 @ app.route('/artists')
+@ replica_read
 def artists():
     # Replace with real data returned from querying the database
 
     # list all artists alphabetically by their name
-    data = Artist.query.order_by(Artist.name).all()
+    data = Artist.active().order_by(Artist.name).all()
 
-    return render_template('pages/artists.html', artists=data)
+    return stream_page('pages/artists.html', artists=data)
 
 
 @ app.route('/artists/search', methods=['POST'])
+@ replica_read
+@ limited('search')
 def search_artists():
     # Implement search on artists with partial string search. Ensure it is case-insensitive.
     # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
@@ -239,27 +621,28 @@ def search_artists():
 
     # tried using .match instead of .ilike - ilike is case insensitive and friendlier to wild cards.
     # .match did not return NickiJ when searching nic.
-    query = Artist.query.filter(Artist.name.ilike(search_term)).all()
+    query = Artist.active().filter(Artist.name.ilike(search_term)).all()
 
     response = {'count': len(query), 'data': query}
     return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
 
 
 @ app.route('/artists/<int:artist_id>')
+@ replica_read
 def show_artist(artist_id):
     # Shows the artist page with the given artist_id
     # Replace with real artist data from the artist table, using artist_id
-    ct = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    query = Artist.query.get(artist_id)
+    query = get_artist(artist_id)
 
-    if artist_id:
+    if query:
         data = Artist.to_dict(query)
 
-        shows_query = Show.query.filter_by(artist_id=artist_id).join(Venue, full=True).join(Artist, full=True).with_entities(
-            Venue.id, Venue.name, Show.start_time, Venue.image_link
-        ).all()
-
-        print(shows_query)
+        shows_query = Show.query.join(Venue).with_entities(
+            Venue.id.label('venue_id'), Venue.name.label('venue_name'),
+            Venue.image_link.label('venue_image_link'),
+            local_time(Show.start_time, Venue.timezone).label('start_time'),
+            Show.start_time.label('start_time_utc')
+        ).filter(Show.artist_id == artist_id, Show.archived_at.is_(None))
 
         req = dict(('website' if 'website' in k else k, v)
                    for k, v in data.items())
@@ -269,16 +652,7 @@ def show_artist(artist_id):
         # genres have been reverted to an array of strings.
         # data['genres'] = re.split(',', data['genres'])
 
-        upcoming_shows, past_shows, current_show = [], [], {}
-
-        for id, venue, start_time, venue_image_link in shows_query:
-            current_show = {'venue_id': id, 'venue_name': venue,
-                            'venue_image_link': venue_image_link, 'start_time': start_time}
-            print(current_show)
-            if start_time > ct:
-                upcoming_shows.append(current_show)
-            else:
-                past_shows.append(current_show)
+        upcoming_shows, past_shows = split_shows(shows_query)
 
         data.update(
             {
@@ -296,106 +670,77 @@ def show_artist(artist_id):
 #  ----------------------------------------------------------------
 
 
-@ app.route('/artists/<int:artist_id>/edit', methods=['GET'])
-def edit_artist(artist_id):
-    form = ArtistForm()
+def edit_submission(model, kind, entity_id, form, template):
+    # writes only the changed columns with a single versioned UPDATE, a promoter
+    # editing an outdated form is sent back to the current data instead of
+    # silently overwriting somebody else's edit
+    edit_endpoint, show_endpoint = f'edit_{kind}', f'show_{kind}'
+    if not form.validate():
+        message = []
+        for field, err in form.errors.items():
+            message.append(field + ' ' + '|'.join(err))
+        flash('Errors ' + str(message))
+        return render_template(template, form=form, **{kind: {'id': entity_id, 'name': form.name.data}}), 400
 
-    query = Artist.query.get(artist_id)
+    try:
+        changes = update_from_form(model, entity_id, form, form.version.data)
+    except StaleEditError:
+        flash(f'This {kind} was changed by someone else while you were editing. '
+              'Please review the current details and apply your changes again.')
+        return redirect(url_for(edit_endpoint, **{f'{kind}_id': entity_id}))
+    except Exception as e:
+        db.session.rollback()
+        flash(f'An error occurred. Changes could not be saved. Error: {e}')
+        return redirect(url_for(edit_endpoint, **{f'{kind}_id': entity_id}))
 
-    if query:
-        data = Artist.to_dict(query)
-        # rename key website to website_link for form
-        # (that uses website_link while everything else called it website...)
-        req = dict(('website_link' if 'website' in k else k, v)
-                   for k, v in data.items())
-        for k, v in req.items():
-            if k == 'id':
-                continue
-            form[f'{k}'].data = v
+    if changes is None:
+        return render_template('errors/404.html'), 404
+    if 'name' in changes:
+        update_index(kind, entity_id, changes['name'])
+    if changes:
+        refresh(app, **{f'{kind}s': [entity_id]},
+                related=[kind] if PAGE_FIELDS[kind] & changes.keys() else [])
+    return redirect(url_for(show_endpoint, **{f'{kind}_id': entity_id}))
 
-        return render_template('forms/edit_artist.html', form=form, artist=data)
-    else:
-        print(f'Artist with id {artist_id} could not be found.')
+
+@ app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+def edit_artist(artist_id):
     # Populate form with fields from artist with ID <artist_id>
-    return render_template('errors/404.html'), 404
+    artist = get_artist(artist_id)
+    if artist is None:
+        return render_template('errors/404.html'), 404
+
+    form = EditArtistForm(obj=artist)
+    return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 
 @ app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@ limited('write')
 def edit_artist_submission(artist_id):
     # Take values from the form submitted, and update existing
     # artist record with ID <artist_id> using the new attributes
-    form = ArtistForm(request.form, meta={'csrf': False})
-
-    data = Artist.query.filter_by(id=artist_id).first()
-
-    if data:
-        if form.validate():
-            try:
-                artist = Artist()
-                artist = data
-                form.populate_obj(artist)
-
-                db.session.merge(artist)
-                db.session.commit()
-            except Exception as e:
-                db.session.rollback()
-                print(e)
-
-            return redirect(url_for('show_artist', artist_id=artist_id))
-        else:
-            print(form.errors)
-
-    return render_template('errors/404.html'), 404
+    form = EditArtistForm(request.form, meta={'csrf': False})
+    return edit_submission(Artist, 'artist', artist_id, form, 'forms/edit_artist.html')
 
 
 @ app.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
-    form = VenueForm()
-
     # Populate form with values from venue with ID <venue_id>
-    query = Venue.query.get(venue_id)
-    if query:
-        data = Venue.to_dict(query)
+    venue = get_venue(venue_id)
+    if venue is None:
+        return render_template('errors/404.html'), 404
 
-        for k, v in data.items():
-            if k == 'id':
-                continue
-            if k == 'description':
-                form[f'seeking_{k}'].data = v
-            else:
-                form[f'{k}'].data = v
-
-        return render_template('forms/edit_venue.html', form=form, venue=data)
-    else:
-        print(f'Venue with id {venue_id} not found.')
-    return render_template('errors/404.html'), 404
+    form = EditVenueForm(obj=venue)
+    return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
 @ app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@ limited('write')
 def edit_venue_submission(venue_id):
     # Take values from the form submitted, and update existing
     # venue record with ID <venue_id> using the new attributes
-
-    form = VenueForm(request.form, meta={'csrf': False})
-    data = Venue.query.filter_by(id=venue_id).first()
-
-    if data:
-        if form.validate():
-            try:
-                venue = Venue()
-                venue = data
-                form.populate_obj(venue)
-
-                db.session.merge(venue)
-                db.session.commit()
-            except Exception as e:
-                db.session.rollback()
-                print(e)
-
-            return redirect(url_for('show_venue', venue_id=venue_id))
-        else:
-            print(form.errors)
-    return render_template('errors/404.html'), 404
+    form = EditVenueForm(request.form, meta={'csrf': False})
+    return edit_submission(Venue, 'venue', venue_id, form, 'forms/edit_venue.html')
 
 #  Create Artist
 #  ----------------------------------------------------------------
@@ -408,6 +753,7 @@ def create_artist_form():
 
 
 @ app.route('/artists/create', methods=['POST'])
+@ limited('write')
 def create_artist_submission():
     # called upon submitting the new artist listing form
     # Insert form data as a new Venue record in the db, instead
@@ -427,6 +773,8 @@ def create_artist_submission():
 
             db.session.add(artist)
             db.session.commit()
+            update_index('artist', artist.id, artist.name)
+            refresh(app, artists=[artist.id])
 
             # on successful db insert, flash success
             flash(f'Artist {artist.name} was successfully listed!')
@@ -448,28 +796,28 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @ app.route('/shows')
+@ replica_read
 def shows():
     # displays list of shows at /shows
     # Replace with real venues data.
 
-    # The alternative to using a list and map combination..
-    query = Show.query.join(Venue).join(Artist).with_entities(
-        Venue.name, Venue.id, Artist.name, Artist.id, Artist.image_link, Show.start_time
-    ).order_by(Show.start_time).all()
+    # read from the denormalized feed, one indexed range scan on start_time
+    query = ShowFeed.query.with_entities(
+        ShowFeed.venue_id, ShowFeed.venue_name, ShowFeed.artist_id,
+        ShowFeed.artist_name, ShowFeed.artist_image_link,
+        ShowFeed.local_start_time.label('start_time'),
+        ShowFeed.start_time.label('start_time_utc'))
 
-    results = []
+    # ?period=upcoming|past only reads the part of the index it needs
+    period = request.args.get('period')
+    if period == 'upcoming':
+        query = query.filter(ShowFeed.start_time >= utcnow())
+    elif period == 'past':
+        query = query.filter(ShowFeed.start_time < utcnow())
 
-    for (venue_name, venue_id, artist_name, artist_id, artist_image, start_time) in query:
-        results.append({
-            'venue_id': venue_id,
-            'venue_name': venue_name,
-            'artist_id': artist_id,
-            'artist_name': artist_name,
-            'artist_image_link': artist_image,
-            'start_time': start_time
-        })
+    results = [row._asdict() for row in query.order_by(ShowFeed.start_time)]
 
-    return render_template('pages/shows.html', shows=results)
+    return stream_page('pages/shows.html', shows=results)
 
 
 @ app.route('/shows/create')
@@ -480,6 +828,7 @@ def create_shows():
 
 
 @ app.route('/shows/create', methods=['POST'])
+@ limited('write')
 def create_show_submission():
 
     # called to create new shows in the db, upon submitting new show listing form
@@ -489,11 +838,19 @@ def create_show_submission():
         try:
             show = Show()
             form.populate_obj(show)
+            show.start_time = to_utc(form.start_time.data, form.venue_timezone)
+            # validating the form loaded the venue
+            show.tickets_available = get_venue(show.venue_id).capacity
 
             db.session.add(show)
+            db.session.flush()
+            sync_feed(Show.id == show.id)
+            record_bookings([{'venue_id': show.venue_id, 'artist_id': show.artist_id,
+                              'start_time': form.start_time.data}])
             db.session.commit()
+            refresh(app, venues=[int(form.venue_id.data)], artists=[int(form.artist_id.data)])
 
-            flash(f'Show successfully booked for {show.start_time}!')
+            flash(f'Show successfully booked for {form.start_time.data}!')
         except Exception as e:
             db.session.rollback()
             flash(f'An error occurred. Show could not be listed. Error: {e} ')
@@ -505,6 +862,154 @@ def create_show_submission():
             message.append(field + ' ' + '|'.join(err))
         flash('Errors ' + str(message))
 
+    return render_template('forms/new_show.html', form=form)
+
+
+@ app.route('/shows/recurring')
+def create_recurring_shows():
+    form = RecurringShowForm()
+    return render_template('forms/new_recurring_show.html', form=form)
+
+
+@ app.route('/shows/recurring', methods=['POST'])
+@ limited('write')
+def create_recurring_shows_submission():
+    # books every occurrence of a residency in one transaction, or none at all
+    form = RecurringShowForm(request.form, meta={"csrf": False})
+    if form.validate():
+        try:
+            occurrences = expand_occurrences(
+                form.start_time.data, form.recurrence.data,
+                form.end_date.data, form.interval_days.data)
+            count = book_shows([
+                {'artist_id': form.artist_id.data,
+                 'venue_id': form.venue_id.data, 'start_time': start_time}
+                for start_time in occurrences
+            ])
+            refresh(app, venues=[int(form.venue_id.data)], artists=[int(form.artist_id.data)])
+            flash(f'{count} shows successfully booked!')
+            return render_template('pages/home.html')
+        except BookingError as e:
+            flash('Shows could not be booked. ' + ' '.join(e.problems))
+        except Exception as e:
+            flash(f'An error occurred. Shows could not be listed. Error: {e} ')
+    else:
+        message = []
+        for field, err in form.errors.items():
+            message.append(field + ' ' + '|'.join(err))
+        flash('Errors ' + str(message))
+
+    return render_template('forms/new_recurring_show.html', form=form)
+
+
+@ app.route('/shows/batch', methods=['POST'])
+@ limited('write')
+def create_shows_batch():
+    # JSON body: {"shows": [{"artist_id", "venue_id", "start_time",
+    #                        optional "recurrence", "end_date", "interval_days"}]}
+    # every occurrence is validated before anything is written
+    payload = request.get_json(silent=True) or {}
+    items = payload.get('shows')
+    if not isinstance(items, list):
+        return jsonify({'error': 'Expected a "shows" list.'}), 400
+
+    try:
+        bookings = []
+        for item in items:
+            if not isinstance(item, dict):
+                raise BookingError([f'Invalid show {item!r}.'], 400)
+            start_time = parse_start_time(item.get('start_time'))
+            if item.get('recurrence'):
+                occurrences = expand_occurrences(
+                    start_time, item['recurrence'],
+                    parse_start_time(item.get('end_date'), 'end_date').date(),
+                    item.get('interval_days'))
+            else:
+                occurrences = [start_time]
+            bookings.extend(
+                {'artist_id': item.get('artist_id'),
+                 'venue_id': item.get('venue_id'), 'start_time': occurrence}
+                for occurrence in occurrences
+            )
+        count = book_shows(bookings)
+    except BookingError as e:
+        return jsonify({'error': 'Shows could not be booked.', 'problems': e.problems}), e.status
+
+    # book_shows validated the ids
+    refresh(app, venues={int(booking['venue_id']) for booking in bookings},
+            artists={int(booking['artist_id']) for booking in bookings})
+
+    return jsonify({'booked': count}), 201
+
+
+#  Tickets
+#  ----------------------------------------------------------------
+
+@ app.route('/shows/<int:show_id>/tickets')
+def show_tickets(show_id):
+    tickets = availability(show_id)
+    if tickets is None:
+        return jsonify({'error': f'Show {show_id} does not exist.'}), 404
+    return jsonify(dict(tickets, show_id=show_id))
+
+
+@ app.route('/shows/<int:show_id>/reserve', methods=['POST'])
+@ limited('tickets')
+def reserve_tickets(show_id):
+    # {"quantity": n}, all n tickets or none, see tickets.py
+    payload = request.get_json(silent=True) or request.form
+    try:
+        quantity = int(payload.get('quantity', 1))
+    except (TypeError, ValueError):
+        quantity = 0
+    if not 1 <= quantity <= app.config['MAX_TICKETS_PER_RESERVATION']:
+        return jsonify({'error': 'quantity must be between 1 and '
+                        f'{app.config["MAX_TICKETS_PER_RESERVATION"]}.'}), 400
+
+    try:
+        remaining = reserve(show_id, quantity)
+    except ReservationError as e:
+        return jsonify({'error': str(e), 'tickets_available': e.tickets_available}), e.status
+    return jsonify({'show_id': show_id, 'reserved': quantity, 'tickets_available': remaining})
+
+
+#  Live updates
+#  ----------------------------------------------------------------
+
+def event_stream(channel):
+    # server-sent events of new and changed shows, see events.py
+    hub = get_hub(app)
+    subscriber = hub.subscribe(channel)
+    if subscriber is None:
+        raise ServiceUnavailable(retry_after=app.config['EVENTS_RETRY_SECONDS'])
+
+    missed = []
+    last_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    try:
+        if last_id and last_id.isdigit():
+            missed = backlog(channel, int(last_id), app.config['EVENTS_REPLAY_LIMIT'])
+    except Exception:
+        hub.unsubscribe(subscriber)
+        raise
+
+    return Response(stream(hub, subscriber, missed), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@ app.route('/events/shows')
+def show_events():
+    return event_stream('shows')
+
+
+@ app.route('/events/venues/<int:venue_id>')
+def venue_events(venue_id):
+    return event_stream(f'venue:{venue_id}')
+
+
+@ app.route('/events/artists/<int:artist_id>')
+def artist_events(artist_id):
+    return event_stream(f'artist:{artist_id}')
+
 
 @ app.errorhandler(404)
 def not_found_error(error):
@@ -517,7 +1022,8 @@ def server_error(error):
 
 
 if not app.debug:
-    file_handler = FileHandler('error.log')
+    # reopened when `flask maintenance` rotates the file
+    file_handler = WatchedFileHandler(app.config['LOG_FILE'])
     file_handler.setFormatter(
         Formatter(
             '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
@@ -0,0 +1,230 @@
+from bisect import bisect_left, insort
+from threading import Lock, Thread
+import re
+import time
+import unicodedata
+
+from flask import current_app
+
+from models import db, Artist, Venue
+
+#----------------------------------------------------------------------------#
+# Typeahead prefix index.
+#----------------------------------------------------------------------------#
+
+# any run of characters that aren't letters or digits, in every script
+WORD_SPLIT = re.compile(r'[\W_]+')
+
+
+def normalize(value) -> str:
+    # accents are dropped so "beyonce" finds "Beyoncé", letters of other
+    # scripts are kept as they are
+    decomposed = unicodedata.normalize('NFKD', (value or '').casefold())
+    value = unicodedata.normalize('NFC', ''.join(
+        char for char in decomposed if not unicodedata.combining(char)))
+    return ' '.join(word for word in WORD_SPLIT.split(value) if word)
+
+
+def index_keys(name) -> list:
+    # every word starts a key so "hop" finds "The Musical Hop" as well
+    words = normalize(name).split(' ')
+    return [' '.join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+class PrefixIndex:
+    """ Per kind sorted lists of (key, id) searched with bisect, so a lookup is
+    a binary search plus a short scan and never touches the database."""
+
+    KINDS = ('venue', 'artist')
+
+    def __init__(self) -> None:
+        self._keys = {kind: [] for kind in self.KINDS}
+        self._names = {}
+        self._lock = Lock()
+        self.built_at = None
+        # the background rebuild, see get_index
+        self.refresh_thread = None
+        # (kind, id, name or None) of the writes made while a build reads the
+        # database, replayed onto the new lists before they're swapped in
+        self._changes = None
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def record_changes(self) -> None:
+        # call before reading the entries of the next build
+        with self._lock:
+            self._changes = []
+
+    def forget_changes(self) -> None:
+        # the build failed, the current lists already have the changes
+        with self._lock:
+            self._changes = None
+
+    def build(self, entries) -> None:
+        # entries is an iterable of (kind, id, name)
+        keys, names = {kind: [] for kind in self.KINDS}, {}
+        for kind, id, name in entries:
+            names[(kind, id)] = name
+            keys[kind].extend((key, id) for key in index_keys(name))
+        for kind_keys in keys.values():
+            kind_keys.sort()
+        with self._lock:
+            self._keys, self._names = keys, names
+            for kind, id, name in self._changes or ():
+                self._remove(kind, id)
+                if name is not None:
+                    self._insert(kind, id, name)
+            self._changes = None
+            self.built_at = time.monotonic()
+
+    def _remove(self, kind, id) -> None:
+        name = self._names.pop((kind, id), None)
+        if name is None:
+            return
+        keys = self._keys[kind]
+        for key in index_keys(name):
+            i = bisect_left(keys, (key, id))
+            if i < len(keys) and keys[i] == (key, id):
+                del keys[i]
+
+    def _insert(self, kind, id, name) -> None:
+        self._names[(kind, id)] = name
+        for key in index_keys(name):
+            insort(self._keys[kind], (key, id))
+
+    def add(self, kind, id, name) -> None:
+        # also used for edits, the old keys of the entry are dropped first
+        with self._lock:
+            self._remove(kind, id)
+            self._insert(kind, id, name)
+            if self._changes is not None:
+                self._changes.append((kind, id, name))
+
+    def remove(self, kind, id) -> None:
+        with self._lock:
+            self._remove(kind, id)
+            if self._changes is not None:
+                self._changes.append((kind, id, None))
+
+    def search(self, prefix, kind, limit=10) -> list:
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        results, seen = [], set()
+        # add/remove shift the list, the scan is short enough to hold the lock
+        with self._lock:
+            keys = self._keys[kind]
+            i = bisect_left(keys, (prefix,))
+            while i < len(keys) and len(results) < limit:
+                key, id = keys[i]
+                if not key.startswith(prefix):
+                    break
+                name = self._names.get((kind, id))
+                if name is not None and id not in seen:
+                    seen.add(id)
+                    results.append({'id': id, 'name': name})
+                i += 1
+        return results
+
+
+def _load_entries():
+    for id, name in db.session.query(Venue.id, Venue.name).filter(Venue.deleted_at.is_(None)):
+        yield 'venue', id, name
+    for id, name in db.session.query(Artist.id, Artist.name).filter(Artist.deleted_at.is_(None)):
+        yield 'artist', id, name
+
+
+# one build at a time per worker, requests that need the index wait for it
+_build_lock = Lock()
+
+
+def _refresh(app, index) -> None:
+    try:
+        index.record_changes()
+        with app.app_context():
+            entries = list(_load_entries())
+            db.session.remove()
+        index.build(entries)
+    except Exception as e:
+        index.forget_changes()
+        app.logger.warning(f'Autocomplete index could not be rebuilt: {e}')
+
+
+def _build(app) -> PrefixIndex:
+    # call holding _build_lock. Writes made while it loads go to the index
+    # being built (update_index finds it) and are replayed by build.
+    index = app.extensions.get('autocomplete')
+    if index is None:
+        index = PrefixIndex()
+        index.record_changes()
+        app.extensions['autocomplete_building'] = index
+        try:
+            index.build(_load_entries())
+        finally:
+            app.extensions.pop('autocomplete_building', None)
+        app.extensions['autocomplete'] = index
+    return index
+
+
+def _warm_up(app) -> None:
+    try:
+        with app.app_context(), _build_lock:
+            _build(app)
+            db.session.remove()
+    except Exception as e:
+        app.logger.warning(f'Autocomplete index could not be built: {e}')
+
+
+def get_index() -> PrefixIndex:
+    # built when the worker starts serving (see init_autocomplete), then
+    # rebuilt every AUTOCOMPLETE_REFRESH_SECONDS so writes handled by other
+    # workers show up eventually. The rebuild runs on a background thread,
+    # requests keep answering from the old index.
+    app = current_app._get_current_object()
+    index = app.extensions.get('autocomplete')
+    if index is None:
+        # still warming up, or it failed
+        with _build_lock:
+            return _build(app)
+
+    refresh = app.config['AUTOCOMPLETE_REFRESH_SECONDS']
+    if time.monotonic() - index.built_at > refresh:
+        with _build_lock:
+            thread = index.refresh_thread
+            if thread is None or not thread.is_alive():
+                index.refresh_thread = Thread(target=_refresh, args=(app, index),
+                                              name='autocomplete', daemon=True)
+                index.refresh_thread.start()
+    return index
+
+
+def update_index(kind, id, name=None) -> None:
+    # keeps the index current after a write, name=None removes. An index that
+    # isn't being built yet will read the change from the database.
+    extensions = current_app.extensions
+    index = extensions.get('autocomplete') or extensions.get('autocomplete_building')
+    if index is None:
+        return
+    if name is None:
+        index.remove(kind, id)
+    else:
+        index.add(kind, id, name)
+
+
+def init_autocomplete(app) -> None:
+    app.config.setdefault('AUTOCOMPLETE_REFRESH_SECONDS', 300)
+    app.config.setdefault('AUTOCOMPLETE_WARM_UP', True)
+
+    @app.before_request
+    def warm_up_autocomplete():
+        # the first request of a worker (usually a /readyz probe) starts the
+        # build in the background, so no /autocomplete request pays for it.
+        # Not at import, the database may not be there yet and forked
+        # workers wouldn't inherit the thread.
+        if (app.config['AUTOCOMPLETE_WARM_UP'] and 'autocomplete' not in app.extensions
+                and 'autocomplete_warm_up' not in app.extensions):
+            thread = Thread(target=_warm_up, args=(app,), name='autocomplete', daemon=True)
+            if app.extensions.setdefault('autocomplete_warm_up', thread) is thread:
+                thread.start()
@@ -0,0 +1,74 @@
+"""Validation micro-benchmark for VenueForm, ArtistForm and ShowForm.
+
+    python benchmarks/bench_forms.py [--number 2000] [--database-uri URI]
+
+ShowForm checks its ids against the database, so it needs at least one
+artist and venue in the configured database.
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.datastructures import MultiDict
+
+from app import app
+from forms import ArtistForm, ShowForm, VenueForm
+from models import db, Artist, Venue
+
+VENUE = MultiDict([
+    ('name', 'The Musical Hop'), ('city', 'San Francisco'), ('state', 'CA'),
+    ('address', '1015 Folsom Street'), ('phone', '123-123-1234'),
+    ('genres', 'Jazz'), ('genres', 'Reggae'), ('genres', 'Folk'),
+    ('facebook_link', 'https://www.facebook.com/TheMusicalHop'),
+    ('timezone', 'America/Los_Angeles'),
+])
+
+ARTIST = MultiDict([
+    ('name', 'Guns N Petals'), ('city', 'San Francisco'), ('state', 'CA'),
+    ('phone', '326-123-5000'), ('genres', 'RocknRoll'),
+    ('facebook_link', 'https://www.facebook.com/GunsNPetals'),
+])
+
+
+def bench(name, form_class, data, number):
+    def run():
+        # a request each, ShowForm's lookups are cached per request
+        with app.test_request_context():
+            form = form_class(data, meta={'csrf': False})
+            if not form.validate():
+                raise SystemExit(f'{name} did not validate: {form.errors}')
+
+    seconds = timeit.timeit(run, number=number)
+    print(f'{name:<12} {seconds / number * 1e6:10.1f} us/validate  ({number} runs)')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=2000)
+    parser.add_argument('--database-uri')
+    args = parser.parse_args()
+
+    if args.database_uri:
+        app.config['SQLALCHEMY_DATABASE_URI'] = args.database_uri
+
+    with app.test_request_context():
+        bench('VenueForm', VenueForm, VENUE, args.number)
+        bench('ArtistForm', ArtistForm, ARTIST, args.number)
+
+        artist_id = db.session.query(Artist.id).filter(
+            Artist.deleted_at.is_(None)).limit(1).scalar()
+        venue_id = db.session.query(Venue.id).filter(
+            Venue.deleted_at.is_(None)).limit(1).scalar()
+        if artist_id is None or venue_id is None:
+            print('ShowForm     skipped, needs an artist and a venue in the database')
+            return
+        show = MultiDict([('artist_id', str(artist_id)), ('venue_id', str(venue_id)),
+                          ('start_time', '2035-04-01 20:00:00')])
+        bench('ShowForm', ShowForm, show, args.number)
+
+
+if __name__ == '__main__':
+    main()
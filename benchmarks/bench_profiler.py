@@ -0,0 +1,80 @@
+"""Overhead of the sampling profiler on the list pages.
+
+    python benchmarks/bench_profiler.py [--number 50] [--database-uri URI]
+                                        [--sample-rate 1.0] [--interval 0.01]
+
+Serves the app on a local port and takes the median time of each page with
+the profiler off, then on (every --sample-rate of the requests sampled every
+--interval seconds), and prints the difference. Ends with the hottest
+collapsed stacks of the profiled run.
+"""
+import argparse
+import http.client
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.serving import make_server
+
+from app import app
+from profiler import get_profiler
+
+PATHS = ('/shows', '/venues', '/artists')
+
+
+def fetch(port, path):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    started = time.perf_counter()
+    conn.request('GET', path)
+    conn.getresponse().read()
+    conn.close()
+    return time.perf_counter() - started
+
+
+def bench(port, path, number):
+    fetch(port, path)  # warm up
+    return statistics.median(fetch(port, path) for _ in range(number))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=50)
+    parser.add_argument('--database-uri')
+    parser.add_argument('--sample-rate', type=float, default=1.0)
+    parser.add_argument('--interval', type=float, default=0.01)
+    args = parser.parse_args()
+
+    if args.database_uri:
+        app.config['SQLALCHEMY_DATABASE_URI'] = args.database_uri
+    app.config['RATE_LIMIT_ENABLED'] = False
+    app.config['PROFILER_INTERVAL'] = args.interval
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+    profiler = get_profiler(app)
+
+    print(f'{"path":<10} {"off ms":>10} {"on ms":>10} {"overhead":>10}')
+    try:
+        for path in PATHS:
+            off = bench(port, path, args.number)
+            profiler.start(app.config['PROFILER_MAX_SECONDS'], args.sample_rate)
+            on = bench(port, path, args.number)
+            profiler.stop()
+            print(f'{path:<10} {off * 1000:10.2f} {on * 1000:10.2f} '
+                  f'{(on - off) / off * 100:9.1f}%')
+    finally:
+        server.shutdown()
+
+    print(f'\n{profiler.samples} samples of the last page, hottest stacks:')
+    lines = profiler.collapsed().splitlines()
+    for line in sorted(lines, key=lambda line: -int(line.rsplit(' ', 1)[1]))[:5]:
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Query plans and timings of the show_venue, show_artist and shows pages.
+
+    python benchmarks/bench_show_queries.py [--number 20] [--database-uri URI]
+                                            [--venue-id 1] [--artist-id 1] [--analyze]
+
+Requests each page through the test client, records the SQL it sends and
+prints the EXPLAIN plan of every statement (EXPLAIN ANALYZE with --analyze on
+postgres). Run it before and after `flask db upgrade` / `flask db downgrade`
+of a migration to compare plans, e.g. Seq Scan vs Index Scan on "Show".
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from app import app
+from models import db
+
+
+def record(path):
+    statements = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        response = app.test_client().get(path)
+        response.get_data()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    if response.status_code != 200:
+        raise SystemExit(f'{path} answered {response.status_code}')
+    return statements
+
+
+def explain(statement, parameters, analyze):
+    if db.engine.dialect.name == 'postgresql':
+        prefix = 'EXPLAIN (ANALYZE, BUFFERS) ' if analyze else 'EXPLAIN '
+    else:
+        prefix = 'EXPLAIN QUERY PLAN '
+    with db.engine.connect() as conn:
+        rows = conn.exec_driver_sql(prefix + statement, parameters).fetchall()
+    return '\n'.join(' | '.join(str(value) for value in row) for row in rows)
+
+
+def timing(path, number):
+    client = app.test_client()
+    results = []
+    for _ in range(number):
+        started = time.perf_counter()
+        client.get(path).get_data()
+        results.append(time.perf_counter() - started)
+    return statistics.median(results)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=20)
+    parser.add_argument('--database-uri')
+    parser.add_argument('--venue-id', type=int, default=1)
+    parser.add_argument('--artist-id', type=int, default=1)
+    parser.add_argument('--analyze', action='store_true')
+    args = parser.parse_args()
+
+    if args.database_uri:
+        app.config['SQLALCHEMY_DATABASE_URI'] = args.database_uri
+    app.config['RATE_LIMIT_ENABLED'] = False
+
+    paths = [f'/venues/{args.venue_id}', f'/artists/{args.artist_id}', '/shows']
+    with app.app_context():
+        for path in paths:
+            print(f'== {path}')
+            for statement, parameters in record(path):
+                print(' '.join(statement.split()))
+                print(explain(statement, parameters, args.analyze))
+                print()
+
+    for path in paths:
+        print(f'{path:<16} {timing(path, args.number) * 1000:8.2f} ms median ({args.number} runs)')
+
+
+if __name__ == '__main__':
+    main()
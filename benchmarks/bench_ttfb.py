@@ -0,0 +1,104 @@
+"""Time to first byte and total time of the list pages, streamed vs rendered.
+
+    python benchmarks/bench_ttfb.py [--number 20] [--database-uri URI] [--seed 5000]
+
+--seed adds that many shows (plus a venue and an artist for every 10 shows)
+to the configured database before measuring, run it against a throwaway
+database that has been migrated with `flask db upgrade`.
+"""
+import argparse
+import http.client
+import os
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, insert
+from werkzeug.serving import make_server
+
+from app import app
+from feed import sync_feed
+from models import db, Artist, Show, Venue
+
+PATHS = ('/shows', '/venues', '/artists')
+
+
+def seed(count):
+    with app.app_context():
+        first = (db.session.query(func.max(Venue.id)).scalar() or 0) + 1
+        entities = max(count // 10, 1)
+        db.session.execute(insert(Venue).values([
+            {'id': first + i, 'name': f'Bench Venue {i}', 'city': 'San Francisco',
+             'state': 'CA', 'image_link': 'https://example.com/venue.jpg'}
+            for i in range(entities)]))
+        db.session.execute(insert(Artist).values([
+            {'id': first + i, 'name': f'Bench Artist {i}', 'city': 'San Francisco',
+             'state': 'CA', 'image_link': 'https://example.com/artist.jpg'}
+            for i in range(entities)]))
+        start = datetime(2030, 1, 1, 20)
+        db.session.execute(insert(Show).values([
+            {'venue_id': first + i % entities, 'artist_id': first + i % entities,
+             'start_time': start + timedelta(days=i // entities)}
+            for i in range(count)]))
+        # /shows reads the feed, the new shows need their rows there too
+        sync_feed(Show.venue_id >= first)
+        db.session.commit()
+
+
+def fetch(port, path, encoding):
+    # returns (seconds to first body byte, seconds to last byte)
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    started = time.perf_counter()
+    conn.request('GET', path, headers={'Accept-Encoding': encoding})
+    response = conn.getresponse()
+    response.read(1)
+    first = time.perf_counter() - started
+    response.read()
+    conn.close()
+    return first, time.perf_counter() - started
+
+
+def bench(port, path, encoding, number):
+    results = [fetch(port, path, encoding) for _ in range(number)]
+    ttfb = statistics.median(first for first, _ in results)
+    total = statistics.median(last for _, last in results)
+    return ttfb, total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=20)
+    parser.add_argument('--database-uri')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.database_uri:
+        app.config['SQLALCHEMY_DATABASE_URI'] = args.database_uri
+    if args.seed:
+        seed(args.seed)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+
+    print(f'{"path":<10} {"mode":<10} {"encoding":<10} {"ttfb ms":>10} {"total ms":>10}')
+    try:
+        for path in PATHS:
+            for streamed in (False, True):
+                app.config['STREAM_TEMPLATES'] = streamed
+                for encoding in ('identity', 'gzip'):
+                    fetch(port, path, encoding)  # warm up
+                    ttfb, total = bench(port, path, encoding, args.number)
+                    mode = 'streamed' if streamed else 'rendered'
+                    print(f'{path:<10} {mode:<10} {encoding:<10} '
+                          f'{ttfb * 1000:10.1f} {total * 1000:10.1f}')
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+import gzip
+import zlib
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+#----------------------------------------------------------------------------#
+# Response compression.
+#----------------------------------------------------------------------------#
+
+COMPRESSIBLE_MIMETYPES = {'text/html', 'text/css', 'text/plain', 'text/csv',
+                          'application/json', 'application/javascript',
+                          'text/javascript', 'image/svg+xml'}
+
+
+def buffered(chunks, size=4096):
+    # jinja's stream yields every few bytes of markup, sending each one on its
+    # own costs more than it saves. Chunks are joined to `size` before going
+    # out, the first one still leaves as soon as the page head is rendered.
+    pending, length = [], 0
+    for chunk in chunks:
+        pending.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(pending)
+            pending, length = [], 0
+    if pending:
+        yield ''.join(pending)
+
+
+def _accepted_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compress_stream(chunks, encoding, level):
+    # every chunk is flushed, so streamed pages still arrive piece by piece
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=min(level, 11))
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def compress_response(response):
+    config = current_app.config
+    if (not config.get('COMPRESSION_ENABLED', True)
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = _accepted_encoding()
+    if encoding is None:
+        return response
+    level = config.get('COMPRESSION_LEVEL', 6)
+
+    if response.is_streamed:
+        response.response = _compress_stream(
+            response.iter_encoded(), encoding, level)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < config.get('COMPRESSION_MIN_SIZE', 500):
+            return response
+        if encoding == 'br':
+            body = brotli.compress(body, quality=min(level, 11))
+        else:
+            body = gzip.compress(body, compresslevel=level)
+        response.set_data(body)
+
+    response.headers['Content-Encoding'] = encoding
+    # the ETag of the uncompressed body no longer matches
+    if response.get_etag()[0]:
+        response.set_etag(response.get_etag()[0], weak=True)
+    return response
+
+
+def init_compression(app) -> None:
+    app.config.setdefault('COMPRESSION_ENABLED', True)
+    app.config.setdefault('COMPRESSION_MIN_SIZE', 500)
+    app.config.setdefault('COMPRESSION_LEVEL', 6)
+    app.after_request(compress_response)
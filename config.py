@@ -18,3 +18,124 @@ SQLALCHEMY_DATABASE_URI = "postgresql://{DB_USER}:{DB_PASS}@{DB_ADDR}/{DB_NAME}"
                                                                                         DB_ADDR=pg_db_hostname,
                                                                                         DB_NAME=pg_db_name)
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Admin routes are disabled unless a token is configured
+ADMIN_TOKEN = os.environ.get('FYYUR_ADMIN_TOKEN')
+
+# Read replicas, comma separated URIs. GET pages marked @replica_read use them,
+# writes always go to SQLALCHEMY_DATABASE_URI.
+SQLALCHEMY_REPLICA_URIS = [uri for uri in os.environ.get(
+    'FYYUR_REPLICA_URIS', '').split(',') if uri]
+# seconds between health checks of a replica
+REPLICA_HEALTH_CHECK_INTERVAL = 5
+# a replica that doesn't accept a connection within this many seconds fails
+# its health check
+REPLICA_CONNECT_TIMEOUT = 2
+# after a write the client reads from the primary for this many seconds
+REPLICA_STICKY_SECONDS = 10
+
+# The autocomplete prefix index is rebuilt from the database this often so
+# writes handled by other workers show up. With AUTOCOMPLETE_WARM_UP each
+# worker starts building it on its first request of any kind.
+AUTOCOMPLETE_REFRESH_SECONDS = 300
+AUTOCOMPLETE_WARM_UP = True
+
+# image_link thumbnails are fetched once and served from this directory,
+# resizing needs Pillow (pip install Pillow), without it originals are cached
+IMAGE_CACHE_DIR = os.path.join(basedir, 'image_cache')
+IMAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+IMAGE_FETCH_TIMEOUT = 5
+IMAGE_MAX_SOURCE_BYTES = 10 * 1024 * 1024
+# image_links resolving to private, loopback or link-local addresses aren't
+# fetched, except from these networks ('10.1.2.0/24')
+IMAGE_FETCH_ALLOWED_NETWORKS = []
+# signs proxied urls. Every worker, `flask prerender` and every host serving
+# the same pages needs the same key. Unset, a key is generated once into
+# IMAGE_PROXY_KEY_FILE, which is enough for the processes of a single host.
+IMAGE_PROXY_KEY = os.environ.get('FYYUR_IMAGE_PROXY_KEY')
+IMAGE_PROXY_KEY_FILE = os.path.join(basedir, 'image_proxy_key')
+
+# gzip (or brotli when installed) for text responses above COMPRESSION_MIN_SIZE bytes
+COMPRESSION_ENABLED = True
+COMPRESSION_MIN_SIZE = 500
+COMPRESSION_LEVEL = 6
+# show times go out as ISO timestamps and are formatted by moment.js in the
+# browser, with an "in 3 days" label, instead of by babel on the server
+CLIENT_SIDE_DATES = False
+# list pages are streamed while they render, in chunks of STREAM_BUFFER_SIZE characters
+STREAM_TEMPLATES = True
+STREAM_BUFFER_SIZE = 4096
+
+# Per client token buckets, group: (requests per second, burst). Over the rate
+# is a 429. A client is its X-API-Key header when that's one of API_KEYS
+# (comma separated in FYYUR_API_KEYS), its address otherwise.
+RATE_LIMIT_ENABLED = True
+API_KEYS = [key for key in os.environ.get('FYYUR_API_KEYS', '').split(',') if key]
+# load balancers/proxies in front of the app, each appends to X-Forwarded-For.
+# Without them every client would be limited as the load balancer's address,
+# leave it at 0 when clients connect directly or they could pick their own.
+TRUSTED_PROXIES = int(os.environ.get('FYYUR_TRUSTED_PROXIES', 0))
+RATE_LIMITS = {
+    'search': (2, 20),
+    'autocomplete': (10, 50),
+    'write': (1, 10),
+    'tickets': (5, 20),
+}
+# requests of a group running at once per worker, more get a 503 after
+# waiting CONCURRENCY_WAIT_SECONDS for a slot. Switched on and off on its own,
+# RATE_LIMIT_ENABLED only covers the token buckets.
+CONCURRENCY_LIMIT_ENABLED = True
+CONCURRENCY_LIMITS = {
+    'search': 8,
+    'write': 4,
+}
+CONCURRENCY_WAIT_SECONDS = 0.5
+# sqlite file shared by the workers of a host, in memory per worker when unset
+RATE_LIMIT_STORAGE = os.environ.get('FYYUR_RATE_LIMIT_STORAGE')
+
+# `flask maintenance` archives shows that started more than RETENTION_DAYS
+# ago into RETENTION_DIR (Parquet with pyarrow installed, gzipped NDJSON
+# otherwise) and deletes them RETENTION_BATCH_SIZE at a time, pausing
+# RETENTION_PAUSE_SECONDS between batches. It also rotates LOG_FILE to
+# LOG_FILE.1.gz, keeping LOG_BACKUP_COUNT of them.
+RETENTION_DAYS = 730
+RETENTION_DIR = os.environ.get('FYYUR_RETENTION_DIR', 'archive')
+RETENTION_FORMAT = None
+RETENTION_BATCH_SIZE = 5000
+RETENTION_PAUSE_SECONDS = 0.1
+LOG_FILE = os.environ.get('FYYUR_LOG_FILE', 'error.log')
+LOG_BACKUP_COUNT = 14
+
+# /admin/profiler samples the stacks of profiled requests every
+# PROFILER_INTERVAL seconds, for at most PROFILER_MAX_SECONDS per run. Distinct
+# stacks past PROFILER_MAX_STACKS are counted as [other].
+PROFILER_INTERVAL = 0.01
+PROFILER_MAX_SECONDS = 300
+PROFILER_MAX_STACKS = 5000
+PROFILER_MAX_DEPTH = 100
+
+# tickets one POST /shows/<id>/reserve can take
+MAX_TICKETS_PER_RESERVATION = 10
+
+# /readyz fails when the database doesn't answer within this many seconds,
+# or when the database isn't migrated to the head revision of migrations/
+HEALTH_CHECK_TIMEOUT = 0.5
+READY_REQUIRES_MIGRATIONS = True
+
+# /events/* server-sent event streams of new shows. Per worker at most
+# EVENTS_MAX_SUBSCRIBERS open streams, a stream that falls EVENTS_QUEUE_SIZE
+# events behind is closed and the browser reconnects. Without postgres
+# LISTEN/NOTIFY (sqlite) ShowFeed is polled every EVENTS_POLL_INTERVAL seconds.
+EVENTS_MAX_SUBSCRIBERS = 500
+EVENTS_QUEUE_SIZE = 100
+EVENTS_POLL_INTERVAL = 2
+EVENTS_KEEPALIVE_SECONDS = 15
+EVENTS_RETRY_SECONDS = 3
+# shows sent to a client reconnecting with Last-Event-ID
+EVENTS_REPLAY_LIMIT = 200
+
+# static copies of the venue and artist pages for the CDN, written by
+# `flask prerender` and kept current after writes. Off when unset.
+PRERENDER_DIR = os.environ.get('FYYUR_PRERENDER_DIR')
+# processes used by `flask prerender`, one per CPU when None
+PRERENDER_WORKERS = None
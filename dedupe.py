@@ -0,0 +1,240 @@
+from collections import defaultdict
+from datetime import datetime
+from itertools import combinations
+import random
+import re
+import unicodedata
+import zlib
+
+from feed import sync_feed
+from identity import forget, get
+from sqlalchemy import and_, exists, or_
+from sqlalchemy.orm import aliased
+
+from models import db, Artist, Show, Venue
+
+#----------------------------------------------------------------------------#
+# Duplicate venues and artists.
+#----------------------------------------------------------------------------#
+
+# Names, phones and addresses are normalized ("Musical Hop, The" and "The
+# Musical Hop" both become "musical hop"), records are blocked by city/state
+# and only compared inside a block, and inside a block only the pairs whose
+# minhash signatures of name trigrams share a band (or that share a phone).
+# The candidates are checked with the exact trigram similarity. A merge moves
+# every show of the duplicates to the record that's kept with one UPDATE.
+
+MODELS = {'venue': Venue, 'artist': Artist}
+
+# trigram similarity (jaccard) above which two names are the same
+THRESHOLD = 0.75
+
+# 32 hashes in 8 bands of 4, pairs above ~0.6 similarity share a band
+NUM_HASHES = 32
+BANDS = 8
+ROWS = NUM_HASHES // BANDS
+# a band bucket bigger than this (the same name hundreds of times) is only
+# compared against its first record, not pair by pair
+MAX_BUCKET = 50
+
+_PRIME = (1 << 61) - 1
+_random = random.Random(2022)  # same signatures on every run
+_PERMUTATIONS = [(_random.randrange(1, _PRIME), _random.randrange(_PRIME))
+                 for _ in range(NUM_HASHES)]
+
+ABBREVIATIONS = {
+    'street': 'st', 'avenue': 'ave', 'road': 'rd', 'boulevard': 'blvd',
+    'drive': 'dr', 'lane': 'ln', 'place': 'pl', 'suite': 'ste',
+    'north': 'n', 'south': 's', 'east': 'e', 'west': 'w',
+}
+
+
+class MergeError(Exception):
+    """ Raised when the record to keep doesn't exist."""
+
+
+def _words(text) -> list:
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode()
+    return re.findall(r'[a-z0-9]+', text.lower().replace('&', ' and '))
+
+
+def normalize_name(name) -> str:
+    words = _words(name)
+    # "The Musical Hop", "Musical Hop, The"
+    while words and words[0] == 'the':
+        words.pop(0)
+    while words and words[-1] == 'the':
+        words.pop()
+    return ' '.join(words)
+
+
+def normalize_phone(phone) -> str:
+    digits = re.sub(r'\D', '', phone or '')
+    if len(digits) == 11 and digits.startswith('1'):
+        digits = digits[1:]
+    return digits
+
+
+def normalize_address(address) -> str:
+    return ' '.join(ABBREVIATIONS.get(word, word) for word in _words(address))
+
+
+def trigrams(text) -> frozenset:
+    padded = f' {text} '
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def minhash(shingles) -> tuple:
+    hashes = [zlib.crc32(shingle.encode()) for shingle in shingles] or [0]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def similarity(a, b) -> float:
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+class Record:
+
+    def __init__(self, id, name, city, state, phone, address=None) -> None:
+        self.id = id
+        self.name = name
+        self.key = normalize_name(name)
+        self.shingles = trigrams(self.key)
+        # "Studio 54" and "Studio 55" are different places
+        self.numbers = set(re.findall(r'\d+', self.key))
+        self.phone = normalize_phone(phone)
+        self.address = normalize_address(address)
+        self.block = ((state or '').strip().upper(), normalize_name(city))
+
+
+def _candidate_pairs(records) -> set:
+    buckets = defaultdict(list)
+    for index, record in enumerate(records):
+        signature = minhash(record.shingles)
+        for band in range(BANDS):
+            buckets[(band, signature[band * ROWS:(band + 1) * ROWS])].append(index)
+        if record.phone:
+            buckets[('phone', record.phone)].append(index)
+
+    pairs = set()
+    for members in buckets.values():
+        if len(members) > MAX_BUCKET:
+            pairs.update((members[0], other) for other in members[1:])
+        else:
+            pairs.update(combinations(members, 2))
+    return pairs
+
+
+def _match(a, b, threshold):
+    # returns (score, reasons) or None
+    if a.numbers != b.numbers:
+        return None
+    score = similarity(a.shingles, b.shingles)
+    reasons = ['name'] if score >= threshold else []
+    if a.phone and a.phone == b.phone:
+        reasons.append('phone')
+    if a.address and a.address == b.address:
+        reasons.append('address')
+    # a shared phone or address makes a looser name match enough
+    if 'name' in reasons or (reasons and score >= threshold / 2):
+        return score, reasons
+    return None
+
+
+def _records(kind):
+    model = MODELS[kind]
+    columns = [model.id, model.name, model.city, model.state, model.phone]
+    if kind == 'venue':
+        columns.append(model.address)
+    query = model.active().with_entities(*columns).execution_options(yield_per=5000)
+    return (Record(*row) for row in query)
+
+
+def find_duplicates(kind, threshold=THRESHOLD) -> list:
+    # groups of likely duplicates, each kept as its lowest (oldest) id:
+    # [{'keep': {...}, 'duplicates': [{..., 'score', 'reasons'}]}]
+    blocks = defaultdict(list)
+    for record in _records(kind):
+        blocks[record.block].append(record)
+
+    groups = []
+    for records in blocks.values():
+        if len(records) < 2:
+            continue
+        # union find over the matching pairs of the block
+        parent = list(range(len(records)))
+
+        def root(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        matches = {}
+        for i, j in _candidate_pairs(records):
+            match = _match(records[i], records[j], threshold)
+            if match is not None:
+                matches[(i, j)] = match
+                parent[root(i)] = root(j)
+
+        clusters = defaultdict(list)
+        for i, j in matches:
+            clusters[root(i)].extend((i, j))
+        for members in clusters.values():
+            members = sorted(set(members), key=lambda i: records[i].id)
+            keep, duplicates = members[0], members[1:]
+            groups.append({
+                'keep': _describe(records[keep]),
+                'duplicates': [dict(_describe(records[i]), **_score(matches, keep, i))
+                               for i in duplicates],
+            })
+    return sorted(groups, key=lambda group: group['keep']['id'])
+
+
+def _describe(record) -> dict:
+    return {'id': record.id, 'name': record.name}
+
+
+def _score(matches, keep, i) -> dict:
+    # how the duplicate compares to the record that's kept, or to the record
+    # that linked it to the group
+    score, reasons = matches.get((keep, i)) or matches.get((i, keep)) or max(
+        (match for pair, match in matches.items() if i in pair), key=lambda m: m[0])
+    return {'score': round(score, 3), 'reasons': reasons}
+
+
+def merge(kind, keep_id, duplicate_ids) -> dict:
+    # moves the shows of the duplicates to keep_id with one UPDATE and soft
+    # deletes the duplicates, in one transaction. A duplicate's show at a time
+    # keep_id (or an earlier duplicate's show) already plays is the same show
+    # booked twice, it's archived instead of clashing on the slot index.
+    model = MODELS[kind]
+    column = getattr(Show, f'{kind}_id')
+    duplicate_ids = sorted({int(id) for id in duplicate_ids} - {int(keep_id)})
+    try:
+        if get(model, keep_id) is None:
+            raise MergeError(f'{kind.capitalize()} {keep_id} does not exist.')
+        if not duplicate_ids:
+            return {'kept': keep_id, 'merged': 0, 'shows_moved': 0}
+        other = aliased(Show)
+        other_column = getattr(other, f'{kind}_id')
+        Show.query.filter(
+            column.in_(duplicate_ids), Show.archived_at.is_(None),
+            exists().where(
+                other.start_time == Show.start_time, other.archived_at.is_(None),
+                or_(other_column == keep_id,
+                    and_(other_column.in_(duplicate_ids), other.id < Show.id)))
+        ).update({'archived_at': datetime.utcnow()}, synchronize_session=False)
+        moved = Show.query.filter(column.in_(duplicate_ids)).update(
+            {column.key: keep_id}, synchronize_session=False)
+        merged = model.query.filter(
+            model.id.in_(duplicate_ids), model.deleted_at.is_(None)
+        ).update({'deleted_at': datetime.utcnow(), 'version': model.version + 1},
+                 synchronize_session=False)
+        sync_feed(column == keep_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    forget(model, duplicate_ids)
+    return {'kept': keep_id, 'merged': merged, 'shows_moved': moved}
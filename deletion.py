@@ -0,0 +1,74 @@
+from datetime import datetime
+
+from feed import drop_from_feed, sync_feed
+from identity import forget
+from models import db, Artist, Venue, Show, ShowFeed
+
+#----------------------------------------------------------------------------#
+# Set based archive / delete of venues and artists.
+#----------------------------------------------------------------------------#
+
+# keeps each IN (...) list well below the bind parameter limits of the drivers
+CHUNK_SIZE = 1000
+
+
+def _chunks(ids):
+    ids = sorted({int(id) for id in ids})
+    for i in range(0, len(ids), CHUNK_SIZE):
+        yield ids[i:i + CHUNK_SIZE]
+
+
+def _archive(model, show_column, ids) -> int:
+    # soft deletes the rows and archives their shows with one UPDATE per table
+    # and chunk, nothing is loaded into the session
+    now = datetime.utcnow()
+    archived = 0
+    try:
+        for chunk in _chunks(ids):
+            archived += model.query.filter(
+                model.id.in_(chunk), model.deleted_at.is_(None)
+            ).update({'deleted_at': now}, synchronize_session=False)
+            Show.query.filter(
+                show_column.in_(chunk), Show.archived_at.is_(None)
+            ).update({'archived_at': now}, synchronize_session=False)
+            sync_feed(show_column.in_(chunk))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    forget(model, ids)
+    return archived
+
+
+def _purge(model, show_column, ids) -> int:
+    # hard delete, shows go first so the foreign keys never block the delete
+    deleted = 0
+    try:
+        for chunk in _chunks(ids):
+            drop_from_feed(getattr(ShowFeed, show_column.key).in_(chunk))
+            Show.query.filter(show_column.in_(chunk)).delete(
+                synchronize_session=False)
+            deleted += model.query.filter(model.id.in_(chunk)).delete(
+                synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    forget(model, ids)
+    return deleted
+
+
+def archive_venues(venue_ids) -> int:
+    return _archive(Venue, Show.venue_id, venue_ids)
+
+
+def archive_artists(artist_ids) -> int:
+    return _archive(Artist, Show.artist_id, artist_ids)
+
+
+def purge_venues(venue_ids) -> int:
+    return _purge(Venue, Show.venue_id, venue_ids)
+
+
+def purge_artists(artist_ids) -> int:
+    return _purge(Artist, Show.artist_id, artist_ids)
@@ -0,0 +1,235 @@
+from collections import defaultdict
+from queue import Empty, Full, Queue
+from threading import Event, Lock, Thread
+from select import select as wait_readable
+import json
+
+from sqlalchemy import Text, cast, func, select
+
+from models import db, ShowFeed
+
+#----------------------------------------------------------------------------#
+# Live show updates (server-sent events).
+#----------------------------------------------------------------------------#
+
+# /events/shows, /events/venues/<id> and /events/artists/<id> stream the feed
+# rows of new and changed shows. Each worker keeps one source thread and fans
+# its events out to the open streams in memory:
+#  - postgres: sync_feed NOTIFYs the ids it wrote on NOTIFY_CHANNEL, postgres
+#    delivers them when the transaction commits, one LISTEN connection per
+#    worker loads the rows and publishes them.
+#  - sqlite: the thread polls ShowFeed for ids above the last one it saw every
+#    EVENTS_POLL_INTERVAL seconds, so only new shows are pushed.
+# A client reconnecting with Last-Event-ID gets the shows it missed first.
+
+NOTIFY_CHANNEL = 'show_events'
+# ids per NOTIFY, postgres payloads are limited to 8000 bytes
+NOTIFY_IDS = 500
+
+
+def notify_shows(shows) -> None:
+    # shows is a select of Show ids whose feed rows were just written
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return
+    ids = select(
+        ShowFeed.show_id,
+        (func.row_number().over(order_by=ShowFeed.show_id) / NOTIFY_IDS).label('page')
+    ).where(ShowFeed.show_id.in_(shows)).subquery()
+    db.session.execute(select(
+        func.pg_notify(NOTIFY_CHANNEL, func.string_agg(cast(ids.c.show_id, Text), ','))
+    ).group_by(ids.c.page))
+
+
+def _event(row) -> dict:
+    return {
+        'id': row.show_id,
+        'venue_id': row.venue_id,
+        'venue_name': row.venue_name,
+        'artist_id': row.artist_id,
+        'artist_name': row.artist_name,
+        'artist_image_link': row.artist_image_link,
+        'start_time': row.local_start_time.isoformat(),
+    }
+
+
+def channels(event) -> tuple:
+    return ('shows', f'venue:{event["venue_id"]}', f'artist:{event["artist_id"]}')
+
+
+def backlog(channel, last_id, limit) -> list:
+    # shows of channel with an id above last_id, for a reconnecting client
+    query = select(ShowFeed).where(ShowFeed.show_id > last_id)
+    kind, _, entity_id = channel.partition(':')
+    if kind == 'venue':
+        query = query.where(ShowFeed.venue_id == int(entity_id))
+    elif kind == 'artist':
+        query = query.where(ShowFeed.artist_id == int(entity_id))
+    rows = db.session.execute(query.order_by(ShowFeed.show_id).limit(limit)).scalars()
+    return [_event(row) for row in rows]
+
+
+class Subscriber:
+
+    def __init__(self, channel, queue_size) -> None:
+        self.channel = channel
+        self.queue = Queue(maxsize=queue_size)
+        # set when the client fell too far behind, its stream ends and the
+        # browser reconnects with Last-Event-ID
+        self.dropped = False
+
+
+class EventHub:
+    """ Fans the events of the worker's source thread out to the subscribers
+    of their channels."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+        self._subscribers = defaultdict(set)
+        self._lock = Lock()
+        self._thread = None
+        self._stopped = Event()
+
+    def __len__(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def subscribe(self, channel):
+        # returns None when the worker already has EVENTS_MAX_SUBSCRIBERS streams
+        config = self.app.config
+        with self._lock:
+            if len(self) >= config['EVENTS_MAX_SUBSCRIBERS']:
+                return None
+            subscriber = Subscriber(channel, config['EVENTS_QUEUE_SIZE'])
+            self._subscribers[channel].add(subscriber)
+            if self._thread is None or not self._thread.is_alive():
+                self._start()
+        return subscriber
+
+    def unsubscribe(self, subscriber) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.channel)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[subscriber.channel]
+
+    def publish(self, event) -> None:
+        with self._lock:
+            subscribers = [subscriber for channel in channels(event)
+                           for subscriber in self._subscribers.get(channel, ())]
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait(event)
+            except Full:
+                subscriber.dropped = True
+
+    def _start(self) -> None:
+        with self.app.app_context():
+            engine = db.engine
+        source = self._listen if engine.dialect.name == 'postgresql' else self._poll
+        self._stopped.clear()
+        self._thread = Thread(target=self._run, args=(source, engine),
+                              name='events', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def _idle(self) -> bool:
+        # the source thread ends once the last stream is gone (or on stop()),
+        # the next subscribe starts a new one
+        with self._lock:
+            if self._stopped.is_set() or not self._subscribers:
+                self._thread = None
+                return True
+        return False
+
+    def _run(self, source, engine) -> None:
+        # sources only return when idle, on errors (lost connection) they're
+        # started again after EVENTS_RETRY_SECONDS
+        while True:
+            try:
+                return source(engine)
+            except Exception as e:
+                self.app.logger.warning(f'Show events source failed: {e}')
+                if self._stopped.wait(self.app.config['EVENTS_RETRY_SECONDS']) or self._idle():
+                    return
+
+    def _load(self, conn, ids) -> None:
+        rows = conn.execute(select(ShowFeed).where(
+            ShowFeed.show_id.in_(ids)).order_by(ShowFeed.show_id))
+        for row in rows:
+            self.publish(_event(row))
+
+    def _listen(self, engine) -> None:
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.exec_driver_sql(f'LISTEN {NOTIFY_CHANNEL}')
+            dbapi = conn.connection.dbapi_connection
+            while not self._idle():
+                # wakes up once a second to notice it's idle
+                if not wait_readable([dbapi], [], [], 1)[0]:
+                    continue
+                dbapi.poll()
+                ids = set()
+                while dbapi.notifies:
+                    payload = dbapi.notifies.pop(0).payload
+                    ids.update(int(id) for id in payload.split(',') if id)
+                if ids:
+                    self._load(conn, ids)
+
+    def _poll(self, engine) -> None:
+        interval = self.app.config['EVENTS_POLL_INTERVAL']
+        with engine.connect() as conn:
+            last_id = conn.execute(select(func.max(ShowFeed.show_id))).scalar() or 0
+        while not self._idle():
+            if self._stopped.wait(interval):
+                continue
+            with engine.connect() as conn:
+                rows = conn.execute(select(ShowFeed).where(
+                    ShowFeed.show_id > last_id).order_by(ShowFeed.show_id)).all()
+            for row in rows:
+                self.publish(_event(row))
+                last_id = row.show_id
+
+
+def get_hub(app) -> EventHub:
+    hub = app.extensions.get('event_hub')
+    if hub is None:
+        hub = app.extensions.setdefault('event_hub', EventHub(app))
+    return hub
+
+
+def _message(event) -> str:
+    return f'id: {event["id"]}\nevent: show\ndata: {json.dumps(event)}\n\n'
+
+
+def stream(hub, subscriber, missed):
+    # yields the SSE messages of one client until it disconnects (werkzeug
+    # closes the generator) or falls too far behind
+    config = hub.app.config
+    try:
+        yield f'retry: {config["EVENTS_RETRY_SECONDS"] * 1000:.0f}\n\n'
+        for event in missed:
+            yield _message(event)
+        while not subscriber.dropped:
+            try:
+                event = subscriber.queue.get(timeout=config['EVENTS_KEEPALIVE_SECONDS'])
+            except Empty:
+                # comment line, keeps proxies from closing an idle connection
+                yield ': keepalive\n\n'
+                continue
+            if event not in missed:
+                yield _message(event)
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+def init_events(app) -> None:
+    app.config.setdefault('EVENTS_MAX_SUBSCRIBERS', 500)
+    app.config.setdefault('EVENTS_QUEUE_SIZE', 100)
+    app.config.setdefault('EVENTS_POLL_INTERVAL', 2)
+    app.config.setdefault('EVENTS_KEEPALIVE_SECONDS', 15)
+    app.config.setdefault('EVENTS_RETRY_SECONDS', 3)
+    app.config.setdefault('EVENTS_REPLAY_LIMIT', 200)
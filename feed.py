@@ -0,0 +1,70 @@
+from sqlalchemy import delete, insert, select
+
+from events import notify_shows
+from models import db, Artist, Show, ShowFeed, Venue, local_time
+
+#----------------------------------------------------------------------------#
+# /shows read model.
+#----------------------------------------------------------------------------#
+
+# ShowFeed holds one row per live show (not archived, venue and artist not
+# deleted). Every write that changes a show, or the names/image/time zone it's
+# displayed with, calls sync_feed in the same transaction with set based
+# statements, `flask rebuild-show-feed` recomputes the whole table.
+
+FEED_COLUMNS = ('show_id', 'venue_id', 'venue_name', 'artist_id', 'artist_name',
+                'artist_image_link', 'start_time', 'local_start_time')
+
+
+def _feed_rows(*criteria):
+    return select(
+        Show.id, Show.venue_id, Venue.name, Show.artist_id, Artist.name,
+        Artist.image_link, Show.start_time, local_time(Show.start_time, Venue.timezone)
+    ).join(Venue, Venue.id == Show.venue_id).join(
+        Artist, Artist.id == Show.artist_id
+    ).where(
+        Show.archived_at.is_(None), Venue.deleted_at.is_(None),
+        Artist.deleted_at.is_(None), *criteria)
+
+
+def sync_feed(*criteria) -> None:
+    # rewrites the feed rows of the shows matching criteria (on Show, Venue or
+    # Artist columns) with one DELETE and one INSERT .. SELECT. Doesn't commit.
+    shows = select(Show.id).join(Venue, Venue.id == Show.venue_id).join(
+        Artist, Artist.id == Show.artist_id).where(*criteria)
+    db.session.execute(delete(ShowFeed).where(ShowFeed.show_id.in_(shows))
+                       .execution_options(synchronize_session=False))
+    db.session.execute(insert(ShowFeed).from_select(FEED_COLUMNS, _feed_rows(*criteria)))
+    # live /events streams, delivered once the caller commits
+    notify_shows(shows)
+
+
+def drop_from_feed(*criteria) -> None:
+    # for shows that are about to be hard deleted, criteria on ShowFeed columns
+    db.session.execute(delete(ShowFeed).where(*criteria)
+                       .execution_options(synchronize_session=False))
+
+
+def rebuild_feed() -> int:
+    # in one transaction, readers see the old feed until it commits
+    try:
+        db.session.execute(delete(ShowFeed).execution_options(synchronize_session=False))
+        db.session.execute(insert(ShowFeed).from_select(FEED_COLUMNS, _feed_rows()))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return db.session.query(ShowFeed).count()
+
+
+# edited columns that show up in the feed
+FEED_FIELDS = {
+    'venue': {'name', 'timezone'},
+    'artist': {'name', 'image_link'},
+}
+
+
+def sync_after_edit(kind, entity_id, changes) -> None:
+    # called by update_from_form before it commits the edit. Doesn't commit.
+    if FEED_FIELDS[kind] & changes.keys():
+        sync_feed(getattr(Show, f'{kind}_id') == entity_id)
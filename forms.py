@@ -1,40 +1,52 @@
 from datetime import datetime
 import re
-from xml.dom import ValidationErr
 from flask_wtf import FlaskForm as Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL
-from enums import Genres, State
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, DateField, IntegerField
+from wtforms.widgets import HiddenInput
+from wtforms.validators import DataRequired, AnyOf, URL, Optional, NumberRange, ValidationError
+from enums import Genres, Recurrence, State, Timezone
+from identity import get_artist_and_venue
 
+# choices and lookups are built once at import, not on every validation
 states = State.choices()
 genres = Genres.choices()
+recurrences = Recurrence.choices()
+timezones = Timezone.choices()
+
+GENRE_VALUES = frozenset(value for _, value in genres)
+PHONE_PATTERN = re.compile(r"^[0-9]{3}-[0-9]{3}-[0-9]{4}$")
 
 # Custom Validators
 
 
 def validate_genres(form, field):
-    genres_values = [genre[1] for genre in genres]
-    for value in field.data:
-        if value not in genres_values:
-            raise ValidationErr('Invalid genre value.')
+    if not GENRE_VALUES.issuperset(field.data):
+        raise ValidationError('Invalid genre value.')
 
 
 def validate_phone(form, field):
-    if not re.search(r"^[0-9]{3}-[0-9]{3}-[0-9]{4}$", field.data):
-        raise ValidationErr("Invalid phone number.")
+    if not PHONE_PATTERN.match(field.data or ''):
+        raise ValidationError("Invalid phone number.")
 
 
 def validate_facebook_link(form, field):
-    if not 'facebook.com' in field.data:
-        raise ValidationErr("Not a valid facebook link.")
+    if not 'facebook.com' in (field.data or ''):
+        raise ValidationError("Not a valid facebook link.")
+
+
+def validate_id(form, field):
+    try:
+        field.data = int(field.data)
+    except (TypeError, ValueError):
+        raise ValidationError('Must be a numeric id.')
 
 
 class ShowForm(Form):
     artist_id = StringField(
-        'artist_id'
+        'artist_id', validators=[DataRequired(), validate_id]
     )
     venue_id = StringField(
-        'venue_id'
+        'venue_id', validators=[DataRequired(), validate_id]
     )
     start_time = DateTimeField(
         'start_time',
@@ -42,6 +54,37 @@ class ShowForm(Form):
         default=datetime.today()
     )
 
+    def validate(self, extra_validators=None):
+        # the field validators run first, the database is only asked once both
+        # ids are well formed, with one statement for both. The rows stay
+        # cached for the rest of the request, the booking reuses them, see
+        # identity.py
+        if not super().validate(extra_validators):
+            return False
+
+        artist, venue = get_artist_and_venue(self.artist_id.data, self.venue_id.data)
+        if artist is None:
+            self.artist_id.errors.append('Artist does not exist.')
+        if venue is None:
+            self.venue_id.errors.append('Venue does not exist.')
+        # start_time is entered in this zone
+        self.venue_timezone = venue.timezone if venue else None
+        return not (self.artist_id.errors or self.venue_id.errors)
+
+
+class RecurringShowForm(ShowForm):
+    recurrence = SelectField(
+        'recurrence', validators=[DataRequired()],
+        choices=recurrences
+    )
+    # only used by the custom recurrence
+    interval_days = IntegerField(
+        'interval_days', validators=[Optional(), NumberRange(min=1)]
+    )
+    end_date = DateField(
+        'end_date', validators=[DataRequired()]
+    )
+
 
 class VenueForm(Form):
     name = StringField(
@@ -74,6 +117,14 @@ class VenueForm(Form):
     website_link = StringField(
         'website_link'
     )
+    timezone = SelectField(
+        'timezone', validators=[DataRequired()],
+        choices=timezones
+    )
+    # empty for venues that don't sell tickets through us
+    capacity = IntegerField(
+        'capacity', validators=[Optional(), NumberRange(min=1)]
+    )
 
     seeking_talent = BooleanField('seeking_talent')
 
@@ -120,3 +171,14 @@ class ArtistForm(Form):
     seeking_description = StringField(
         'seeking_description'
     )
+
+
+class EditVenueForm(VenueForm):
+    # version the form was loaded with, used to detect concurrent edits
+    version = IntegerField('version', widget=HiddenInput(),
+                           validators=[DataRequired()])
+
+
+class EditArtistForm(ArtistForm):
+    version = IntegerField('version', widget=HiddenInput(),
+                           validators=[DataRequired()])
@@ -0,0 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from threading import Lock
+import os
+import time
+
+from alembic.script import ScriptDirectory
+from sqlalchemy import text
+
+from routing import get_replicas
+
+#----------------------------------------------------------------------------#
+# Health and readiness.
+#----------------------------------------------------------------------------#
+
+# /healthz only says the worker is alive. /readyz checks the database within
+# HEALTH_CHECK_TIMEOUT and reports the connection pool and migration state,
+# the load balancer polls it to stop sending traffic to a stuck worker.
+
+STARTED_AT = time.monotonic()
+
+
+class DatabaseCheck:
+    """ Runs the database check on a single background thread so a request
+    never waits longer than the timeout. A check that is still stuck (pool
+    exhausted, database gone) isn't started a second time."""
+
+    def __init__(self) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='readyz')
+        self._future = None
+        self._lock = Lock()
+
+    @staticmethod
+    def _run(engine):
+        started = time.perf_counter()
+        with engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+            seconds = time.perf_counter() - started
+            try:
+                revision = conn.execute(text(
+                    'SELECT version_num FROM alembic_version')).scalar()
+            except Exception:
+                # never migrated
+                revision = None
+        return revision, seconds
+
+    def check(self, engine, timeout) -> tuple:
+        # returns (current revision, seconds), raises on failure or timeout
+        with self._lock:
+            if self._future is None or self._future.done():
+                self._future = self._executor.submit(self._run, engine)
+            future = self._future
+        return future.result(timeout=timeout)
+
+
+def pool_status(engine) -> dict:
+    pool = engine.pool
+    status = {'class': type(pool).__name__}
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        method = getattr(pool, name, None)
+        if method is not None:
+            status[name] = method()
+    max_overflow = getattr(pool, '_max_overflow', None)
+    if 'size' in status and max_overflow is not None and max_overflow >= 0:
+        status['max_connections'] = status['size'] + max_overflow
+    return status
+
+
+def migration_head(app) -> str:
+    # the scripts only change with a deploy, read them once per worker
+    heads = app.extensions.get('migration_heads')
+    if heads is None:
+        directory = os.path.join(app.root_path, 'migrations')
+        heads = app.extensions.setdefault(
+            'migration_heads', ScriptDirectory(directory).get_heads())
+    return heads[0] if len(heads) == 1 else ','.join(sorted(heads))
+
+
+def liveness() -> dict:
+    return {'status': 'ok', 'uptime_seconds': round(time.monotonic() - STARTED_AT, 3)}
+
+
+def readiness(app, engine) -> tuple:
+    # returns (report, ready)
+    checker = app.extensions.setdefault('database_check', DatabaseCheck())
+    timeout = app.config.get('HEALTH_CHECK_TIMEOUT', 0.5)
+    report = liveness()
+    report['pool'] = pool_status(engine)
+    report['migrations'] = {'head': migration_head(app), 'current': None}
+
+    try:
+        revision, seconds = checker.check(engine, timeout)
+        report['database'] = {'ok': True, 'latency_ms': round(seconds * 1000, 2)}
+        report['migrations']['current'] = revision
+    except TimeoutError:
+        report['database'] = {'ok': False, 'error': f'no answer within {timeout}s'}
+    except Exception as e:
+        report['database'] = {'ok': False, 'error': str(e).splitlines()[0]}
+
+    replicas = get_replicas(app)
+    if len(replicas):
+        report['replicas'] = replicas.status()
+
+    migrated = report['migrations']['current'] == report['migrations']['head']
+    report['migrations']['up_to_date'] = migrated
+    ready = report['database']['ok'] and (
+        migrated or not app.config.get('READY_REQUIRES_MIGRATIONS', True))
+    report['status'] = 'ok' if ready else 'unavailable'
+    return report, ready
@@ -0,0 +1,88 @@
+from flask import g
+from sqlalchemy import literal, select
+
+from models import db, Artist, Venue
+
+#----------------------------------------------------------------------------#
+# Request scoped venue/artist lookups.
+#----------------------------------------------------------------------------#
+
+# A request asks for the same venues and artists in several places (the show
+# form validates them, then the booking and the analytics rollup need their
+# time zone, capacity, city and genres). get_venue/get_artist load each id at
+# most once per request and keep it on flask.g, get_venues/get_artists and
+# prefetch() load every id that's wanted with a single IN query. Ids that
+# don't exist are remembered too. Writes call forget() for the rows they
+# change.
+
+# keeps each IN (...) list well below the bind parameter limits of the drivers
+CHUNK_SIZE = 1000
+
+
+def _cache(model) -> dict:
+    return g.setdefault('identities', {}).setdefault(model, {})
+
+
+def _pending(model) -> set:
+    return g.setdefault('identities_pending', {}).setdefault(model, set())
+
+
+def prefetch(model, ids) -> None:
+    # ids loaded together with the next lookup of the model
+    _pending(model).update(int(id) for id in ids)
+
+
+def get_many(model, ids, include_deleted=False) -> dict:
+    # {id: entity} of the ids that exist (and aren't soft deleted)
+    cache = _cache(model)
+    ids = {int(id) for id in ids}
+    pending = _pending(model)
+    wanted = sorted((ids | pending) - cache.keys())
+    pending.clear()
+    for i in range(0, len(wanted), CHUNK_SIZE):
+        chunk = wanted[i:i + CHUNK_SIZE]
+        for entity in model.query.filter(model.id.in_(chunk)):
+            cache[entity.id] = entity
+        for id in chunk:
+            cache.setdefault(id, None)
+    return {id: cache[id] for id in ids if cache[id] is not None
+            and (include_deleted or cache[id].deleted_at is None)}
+
+
+def get(model, id, include_deleted=False):
+    return get_many(model, [id], include_deleted).get(int(id))
+
+
+def forget(model, ids) -> None:
+    cache = _cache(model)
+    for id in ids:
+        cache.pop(int(id), None)
+
+
+def get_venue(venue_id):
+    return get(Venue, venue_id)
+
+
+def get_artist(artist_id):
+    return get(Artist, artist_id)
+
+
+def get_artist_and_venue(artist_id, venue_id) -> tuple:
+    # (artist, venue) of a show, the ones not cached yet are loaded together
+    # with a single statement: both left joined to a one row select
+    artist_id, venue_id = int(artist_id), int(venue_id)
+    artists, venues = _cache(Artist), _cache(Venue)
+    if artist_id not in artists and venue_id not in venues:
+        one = select(literal(1).label('one')).subquery()
+        artist, venue = db.session.query(Artist, Venue).select_from(one).outerjoin(
+            Artist, Artist.id == artist_id).outerjoin(Venue, Venue.id == venue_id).one()
+        artists[artist_id], venues[venue_id] = artist, venue
+    return get_artist(artist_id), get_venue(venue_id)
+
+
+def get_venues(venue_ids) -> dict:
+    return get_many(Venue, venue_ids)
+
+
+def get_artists(artist_ids) -> dict:
+    return get_many(Artist, artist_ids)
@@ -0,0 +1,336 @@
+from contextlib import contextmanager
+from hashlib import sha256
+from http.client import HTTPConnection, HTTPSConnection
+from io import BytesIO
+from threading import Lock
+from urllib.parse import urlsplit
+from urllib.request import (HTTPHandler, HTTPRedirectHandler, HTTPSHandler,
+                            ProxyHandler, Request, build_opener)
+import hmac
+import ipaddress
+import os
+import socket
+import tempfile
+
+from flask import current_app, url_for
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional, without it the original is cached
+    Image = None
+
+#----------------------------------------------------------------------------#
+# Image link proxy and thumbnail cache.
+#----------------------------------------------------------------------------#
+
+# image_link urls are fetched once, resized to every width in THUMBNAIL_WIDTHS
+# and kept on disk as <sha256 of the image>-<width>.<ext>, so the same picture
+# linked from several rows is stored once. urls/<sha256 of the url> points at
+# the image hash. The directory is capped at IMAGE_CACHE_MAX_BYTES, the least
+# recently served files go first.
+
+THUMBNAIL_WIDTHS = (150, 300, 600)
+
+# browsers and CDNs keep a thumbnail for a year, a changed image_link is a new url
+CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+FORMATS = {'image/jpeg': ('JPEG', 'jpg'), 'image/png': ('PNG', 'png'),
+           'image/gif': ('GIF', 'gif'), 'image/webp': ('WEBP', 'webp')}
+
+MIMETYPES = {extension: mimetype for mimetype, (_, extension) in FORMATS.items()}
+
+# first bytes of each format, a page served as image/png isn't cached as one
+SIGNATURES = {'image/jpeg': (b'\xff\xd8\xff',), 'image/png': (b'\x89PNG\r\n\x1a\n',),
+              'image/gif': (b'GIF87a', b'GIF89a'), 'image/webp': (b'RIFF',)}
+
+
+class ImageFetchError(Exception):
+    """ The source image couldn't be downloaded or isn't an image we serve."""
+
+
+def sign(url) -> str:
+    # the proxy only fetches urls the app rendered itself. The key has to be
+    # the same in every process (SECRET_KEY is random per process), see
+    # init_images
+    key = current_app.config['IMAGE_PROXY_KEY']
+    if isinstance(key, str):
+        key = key.encode()
+    return hmac.new(key, url.encode(), sha256).hexdigest()[:32]
+
+
+def verify(url, signature) -> bool:
+    return hmac.compare_digest(sign(url), signature or '')
+
+
+def thumbnail_url(url, width=300) -> str:
+    # jinja filter: {{ artist.image_link | thumb(150) }}
+    if not url or urlsplit(url).scheme not in ('http', 'https'):
+        return url
+    width = min((w for w in THUMBNAIL_WIDTHS if w >= width), default=THUMBNAIL_WIDTHS[-1])
+    return url_for('image_thumbnail', width=width, url=url, sig=sign(url))
+
+
+#  Fetching
+#  ----------------------------------------------------------------
+
+# image_link comes from the public forms and the proxy signs whatever it
+# renders, so the signature alone doesn't keep it out of the internal network.
+# Every connection, the first one and the one of each redirect, resolves the
+# host itself and only connects to public addresses. Checking the address it
+# connects to (rather than resolving once up front) also defeats DNS
+# rebinding. IMAGE_FETCH_ALLOWED_NETWORKS lists private networks that may
+# still be fetched from, an internal image host for instance.
+
+
+def _connect(host, port, timeout, allowed_networks):
+    try:
+        addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise ImageFetchError(f'Could not resolve {host}: {e}')
+    for family, type, proto, _, address in addresses:
+        ip = ipaddress.ip_address(address[0].split('%')[0])
+        if getattr(ip, 'ipv4_mapped', None):
+            ip = ip.ipv4_mapped
+        if not ip.is_global and not any(ip in network for network in allowed_networks):
+            raise ImageFetchError(f'{host} resolves to the non-public address {ip}.')
+
+    error = None
+    for family, type, proto, _, address in addresses:
+        sock = socket.socket(family, type, proto)
+        try:
+            sock.settimeout(timeout)
+            sock.connect(address)
+            return sock
+        except OSError as e:
+            sock.close()
+            error = e
+    raise error
+
+
+def _opener(allowed_networks):
+    # urllib with connections that go through _connect, no proxies from the
+    # environment and redirects only to http(s)
+    class PublicHTTPConnection(HTTPConnection):
+        def connect(self):
+            self.sock = _connect(self.host, self.port, self.timeout, allowed_networks)
+
+    class PublicHTTPSConnection(HTTPSConnection):
+        def connect(self):
+            sock = _connect(self.host, self.port, self.timeout, allowed_networks)
+            self.sock = self._context.wrap_socket(sock, server_hostname=self.host)
+
+    class PublicHTTPHandler(HTTPHandler):
+        def http_open(self, req):
+            return self.do_open(PublicHTTPConnection, req)
+
+    class PublicHTTPSHandler(HTTPSHandler):
+        def https_open(self, req):
+            return self.do_open(PublicHTTPSConnection, req, context=self._context)
+
+    class RedirectHandler(HTTPRedirectHandler):
+        max_redirections = 5
+
+        def redirect_request(self, req, fp, code, msg, headers, newurl):
+            if urlsplit(newurl).scheme not in ('http', 'https'):
+                raise ImageFetchError(f'Refusing the redirect to {newurl!r}.')
+            return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+    return build_opener(ProxyHandler({}), PublicHTTPHandler, PublicHTTPSHandler,
+                        RedirectHandler)
+
+
+def fetch(url, timeout, max_bytes, allowed_networks=()) -> tuple:
+    # returns (content type, bytes)
+    if urlsplit(url).scheme not in ('http', 'https'):
+        raise ImageFetchError(f'Unsupported url {url!r}.')
+    networks = [ipaddress.ip_network(network) for network in allowed_networks]
+    try:
+        with _opener(networks).open(
+                Request(url, headers={'User-Agent': 'fyyur-image-proxy'}),
+                timeout=timeout) as response:
+            mimetype = response.headers.get_content_type()
+            body = response.read(max_bytes + 1)
+    except (OSError, ValueError) as e:
+        raise ImageFetchError(f'Could not fetch {url!r}: {e}')
+    if mimetype not in FORMATS:
+        raise ImageFetchError(f'{url!r} is not an image ({mimetype}).')
+    if len(body) > max_bytes:
+        raise ImageFetchError(f'{url!r} is larger than {max_bytes} bytes.')
+    return mimetype, body
+
+
+def stored_width(width) -> int:
+    # without Pillow there's only the original, stored as width 0
+    return width if Image is not None else 0
+
+
+def check_image(body, mimetype) -> None:
+    if not body.startswith(SIGNATURES[mimetype]) or (
+            mimetype == 'image/webp' and body[8:12] != b'WEBP'):
+        raise ImageFetchError(f'The body is not a {mimetype} image.')
+
+
+def resize(body, mimetype, width) -> bytes:
+    if Image is None or not width:
+        return body
+    try:
+        image = Image.open(BytesIO(body))
+        if image.width > width:
+            height = round(image.height * width / image.width)
+            image = image.resize((width, height), Image.LANCZOS)
+        out = BytesIO()
+        image_format = FORMATS[mimetype][0]
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        image.save(out, image_format, quality=85)
+    # UnidentifiedImageError and truncated files are OSErrors, bombs aren't
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ImageFetchError(f'Could not decode the {mimetype} image: {e}')
+    return out.getvalue()
+
+
+class ThumbnailCache:
+    """ Thumbnails on local disk, keyed by content hash with an LRU size cap."""
+
+    def __init__(self, directory, max_bytes, timeout=5, max_source_bytes=10 * 1024 * 1024,
+                 allowed_networks=()) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.max_source_bytes = max_source_bytes
+        self.allowed_networks = allowed_networks
+        self._lock = Lock()
+        # url key -> [lock, threads using it]
+        self._url_locks = {}
+        os.makedirs(os.path.join(directory, 'urls'), exist_ok=True)
+
+    def _path(self, *parts) -> str:
+        return os.path.join(self.directory, *parts)
+
+    def _write(self, path, body) -> None:
+        # write then rename, concurrent readers never see half a file
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(body)
+        os.replace(tmp, path)
+
+    def _lookup(self, url_key, width):
+        try:
+            with open(self._path('urls', url_key)) as f:
+                content_key, extension = f.read().strip().split('.')
+        except (FileNotFoundError, ValueError):
+            return None
+        path = self._path(f'{content_key}-{stored_width(width)}.{extension}')
+        return path if os.path.exists(path) else None
+
+    @contextmanager
+    def _url_lock(self, url_key):
+        # requests missing the same url wait for the first one's fetch
+        with self._lock:
+            entry = self._url_locks.setdefault(url_key, [Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._url_locks[url_key]
+
+    def get(self, url, width) -> str:
+        # path of the cached thumbnail, fetched and resized on a miss. None
+        # when it was evicted again right away, serve the source then.
+        url_key = sha256(url.encode()).hexdigest()
+        path = self._lookup(url_key, width)
+        if path is None:
+            with self._url_lock(url_key):
+                path = self._lookup(url_key, width) or self._store(url, url_key, width)
+        else:
+            # mtime is the LRU clock
+            os.utime(path)
+        return path
+
+    def _store(self, url, url_key, width) -> str:
+        mimetype, body = fetch(url, self.timeout, self.max_source_bytes,
+                               self.allowed_networks)
+        check_image(body, mimetype)
+        content_key = sha256(body).hexdigest()
+        extension = FORMATS[mimetype][1]
+        for w in {stored_width(w) for w in THUMBNAIL_WIDTHS}:
+            self._write(self._path(f'{content_key}-{w}.{extension}'),
+                        resize(body, mimetype, w))
+        self._write(self._path('urls', url_key), f'{content_key}.{extension}'.encode())
+        self.evict()
+        return self._lookup(url_key, width)
+
+    def evict(self) -> int:
+        # drops the least recently served thumbnails until the cache is back
+        # under 90% of max_bytes, their url links are left to dangle and
+        # simply refetch
+        with self._lock:
+            files = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and not entry.name.startswith('.'):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in files)
+            removed = 0
+            if total <= self.max_bytes:
+                return removed
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                total -= size
+                removed += 1
+            return removed
+
+
+def _load_key(path) -> str:
+    # reads the key file, creating it first if needed. The key is written to
+    # a temporary file and hard linked into place, so processes starting at
+    # the same time all end up with the first key written.
+    if not os.path.exists(path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(os.urandom(32).hex())
+            os.link(tmp, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp)
+    with open(path) as f:
+        key = f.read().strip()
+    if not key:
+        raise RuntimeError(f'{path} is empty, remove it or set IMAGE_PROXY_KEY.')
+    return key
+
+
+def init_images(app) -> None:
+    # a missing key stops the app at startup rather than leaving every
+    # thumbnail url of the other workers unverifiable
+    app.config.setdefault('IMAGE_PROXY_KEY', None)
+    app.config.setdefault('IMAGE_PROXY_KEY_FILE', None)
+    if not app.config['IMAGE_PROXY_KEY']:
+        if not app.config['IMAGE_PROXY_KEY_FILE']:
+            raise RuntimeError('Set IMAGE_PROXY_KEY or IMAGE_PROXY_KEY_FILE.')
+        app.config['IMAGE_PROXY_KEY'] = _load_key(app.config['IMAGE_PROXY_KEY_FILE'])
+
+
+def get_thumbnails(app) -> ThumbnailCache:
+    cache = app.extensions.get('thumbnails')
+    if cache is None:
+        # setdefault, concurrent first requests must share one cache and its locks
+        cache = app.extensions.setdefault('thumbnails', ThumbnailCache(
+            app.config['IMAGE_CACHE_DIR'], app.config['IMAGE_CACHE_MAX_BYTES'],
+            app.config.get('IMAGE_FETCH_TIMEOUT', 5),
+            app.config.get('IMAGE_MAX_SOURCE_BYTES', 10 * 1024 * 1024),
+            app.config.get('IMAGE_FETCH_ALLOWED_NETWORKS', ())))
+    return cache
@@ -0,0 +1,40 @@
+"""soft delete venues and artists
+
+Revision ID: 3c1f7d2a9b04
+Revises: 650f355b4a87
+Create Date: 2026-10-19 09:12:31.204118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1f7d2a9b04'
+down_revision = '650f355b4a87'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column(
+        'deleted_at', sa.DateTime(), nullable=True))
+    op.add_column('Artist', sa.Column(
+        'deleted_at', sa.DateTime(), nullable=True))
+    op.add_column('Show', sa.Column(
+        'archived_at', sa.DateTime(), nullable=True))
+
+    # partial indexes only cover live rows, so listings and searches never
+    # scan archived venues/artists
+    op.create_index('ix_Venue_active_location', 'Venue', ['state', 'city', 'name'],
+                    postgresql_where=sa.text('deleted_at IS NULL'))
+    op.create_index('ix_Artist_active_name', 'Artist', ['name'],
+                    postgresql_where=sa.text('deleted_at IS NULL'))
+
+
+def downgrade():
+    op.drop_index('ix_Artist_active_name', table_name='Artist')
+    op.drop_index('ix_Venue_active_location', table_name='Venue')
+    op.drop_column('Show', 'archived_at')
+    op.drop_column('Artist', 'deleted_at')
+    op.drop_column('Venue', 'deleted_at')
@@ -0,0 +1,54 @@
+"""booking rollups for the analytics dashboard
+
+Revision ID: 4a8c2e91d3b6
+Revises: e7c4a1d95f60
+Create Date: 2026-10-19 15:08:31.624019
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4a8c2e91d3b6'
+down_revision = 'e7c4a1d95f60'
+branch_labels = None
+depends_on = None
+
+# analytics.POSTGRES_REBUILD as of this revision, kept here so later changes
+# to the app don't change what this migration does
+REBUILD = '''
+    INSERT INTO "BookingRollup" (day, city, state, genre, bookings)
+    SELECT CAST(timezone(v.timezone, timezone('utc', s.start_time)) AS date),
+           COALESCE(v.city, ''), COALESCE(v.state, ''),
+           COALESCE(g.genre, 'Unspecified'), count(*)
+    FROM "Show" s
+    JOIN "Venue" v ON v.id = s.venue_id
+    JOIN "Artist" a ON a.id = s.artist_id
+    LEFT JOIN LATERAL unnest(a.genres) AS g(genre) ON true
+    GROUP BY 1, 2, 3, 4
+    UNION ALL
+    SELECT CAST(timezone(v.timezone, timezone('utc', s.start_time)) AS date),
+           COALESCE(v.city, ''), COALESCE(v.state, ''), '*', count(*)
+    FROM "Show" s
+    JOIN "Venue" v ON v.id = s.venue_id
+    GROUP BY 1, 2, 3
+'''
+
+
+def upgrade():
+    op.create_table('BookingRollup',
+                    sa.Column('day', sa.Date(), nullable=False),
+                    sa.Column('city', sa.String(length=120), nullable=False),
+                    sa.Column('state', sa.String(length=120), nullable=False),
+                    sa.Column('genre', sa.String(length=120), nullable=False),
+                    sa.Column('bookings', sa.Integer(),
+                              server_default='0', nullable=False),
+                    sa.PrimaryKeyConstraint('day', 'city', 'state', 'genre')
+                    )
+    # existing shows, from here on every insert keeps the rollup current
+    op.execute(REBUILD)
+
+
+def downgrade():
+    op.drop_table('BookingRollup')
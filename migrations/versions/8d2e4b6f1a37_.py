@@ -0,0 +1,104 @@
+"""partition Show by start_time
+
+Revision ID: 8d2e4b6f1a37
+Revises: 3c1f7d2a9b04
+Create Date: 2026-10-19 11:40:02.518334
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2e4b6f1a37'
+down_revision = '3c1f7d2a9b04'
+branch_labels = None
+depends_on = None
+
+# how many years past the current one get a partition straight away,
+# after that `flask create-show-partitions` keeps them coming
+YEARS_AHEAD = 2
+
+
+def upgrade():
+    # a partitioned table can't be created from an existing one, so the data is
+    # copied into a new partitioned "Show" and the old table dropped.
+    # start_time becomes a real timestamp, a text range key would compare
+    # lexically and makes the partition bounds meaningless.
+    op.execute('ALTER TABLE "Show" RENAME TO "Show_old"')
+    op.execute('ALTER TABLE "Show_old" RENAME CONSTRAINT "Show_pkey" TO "Show_old_pkey"')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY NONE')
+
+    # the partition key has to be part of the primary key
+    op.execute(
+        '''
+        CREATE TABLE "Show" (
+            id INTEGER NOT NULL DEFAULT nextval('"Show_id_seq"'),
+            venue_id INTEGER NOT NULL REFERENCES "Venue" (id),
+            artist_id INTEGER NOT NULL REFERENCES "Artist" (id),
+            start_time TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            archived_at TIMESTAMP WITHOUT TIME ZONE,
+            CONSTRAINT "Show_pkey" PRIMARY KEY (id, venue_id, artist_id, start_time)
+        ) PARTITION BY RANGE (start_time)
+        '''
+    )
+    op.execute('CREATE TABLE "Show_default" PARTITION OF "Show" DEFAULT')
+
+    conn = op.get_bind()
+    first_year, max_year = conn.execute(sa.text(
+        '''
+        SELECT EXTRACT(YEAR FROM MIN(start_time::timestamp))::int,
+               EXTRACT(YEAR FROM MAX(start_time::timestamp))::int
+        FROM "Show_old"
+        '''
+    )).one()
+    current_year = datetime.utcnow().year
+    first_year = min(first_year or current_year, current_year)
+    last_year = max(max_year or current_year, current_year + YEARS_AHEAD)
+
+    for year in range(first_year, last_year + 1):
+        op.execute(
+            f'''
+            CREATE TABLE "Show_y{year}" PARTITION OF "Show"
+            FOR VALUES FROM ('{year}-01-01 00:00:00') TO ('{year + 1}-01-01 00:00:00')
+            '''
+        )
+
+    op.execute(
+        '''
+        INSERT INTO "Show" (id, venue_id, artist_id, start_time, archived_at)
+        SELECT id, venue_id, artist_id, start_time::timestamp, archived_at FROM "Show_old"
+        '''
+    )
+    op.execute('DROP TABLE "Show_old"')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+
+
+def downgrade():
+    op.execute('ALTER TABLE "Show" RENAME TO "Show_partitioned"')
+    op.execute('ALTER TABLE "Show_partitioned" RENAME CONSTRAINT "Show_pkey" TO "Show_partitioned_pkey"')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY NONE')
+    op.execute(
+        '''
+        CREATE TABLE "Show" (
+            id INTEGER NOT NULL DEFAULT nextval('"Show_id_seq"'),
+            venue_id INTEGER NOT NULL REFERENCES "Venue" (id),
+            artist_id INTEGER NOT NULL REFERENCES "Artist" (id),
+            start_time VARCHAR NOT NULL,
+            archived_at TIMESTAMP WITHOUT TIME ZONE,
+            CONSTRAINT "Show_pkey" PRIMARY KEY (id, venue_id, artist_id)
+        )
+        '''
+    )
+    op.execute(
+        '''
+        INSERT INTO "Show" (id, venue_id, artist_id, start_time, archived_at)
+        SELECT id, venue_id, artist_id, to_char(start_time, 'YYYY-MM-DD HH24:MI:SS'), archived_at
+        FROM "Show_partitioned"
+        '''
+    )
+    # dropping the parent drops every partition with it
+    op.execute('DROP TABLE "Show_partitioned"')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
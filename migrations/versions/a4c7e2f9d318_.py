@@ -0,0 +1,32 @@
+"""ShowArchive, the runs of `flask maintenance`
+
+Revision ID: a4c7e2f9d318
+Revises: b5d91e7c2a40
+Create Date: 2026-10-19 19:40:27.915304
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c7e2f9d318'
+down_revision = 'b5d91e7c2a40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'ShowArchive',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('archived_before', sa.Date(), nullable=False),
+        sa.Column('shows', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('location', sa.String(length=500), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade():
+    op.drop_table('ShowArchive')
@@ -0,0 +1,29 @@
+"""version columns for optimistic concurrency on edits
+
+Revision ID: b5a09c3e7d21
+Revises: 8d2e4b6f1a37
+Create Date: 2026-10-19 13:05:47.906215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5a09c3e7d21'
+down_revision = '8d2e4b6f1a37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # server_default fills the existing rows, no separate backfill needed
+    op.add_column('Venue', sa.Column(
+        'version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('Artist', sa.Column(
+        'version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    op.drop_column('Artist', 'version')
+    op.drop_column('Venue', 'version')
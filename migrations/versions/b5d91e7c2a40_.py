@@ -0,0 +1,29 @@
+"""Venue capacity and Show ticket inventory
+
+Revision ID: b5d91e7c2a40
+Revises: f3d8b2c6a914
+Create Date: 2026-10-19 19:02:11.384512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d91e7c2a40'
+down_revision = 'f3d8b2c6a914'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('capacity', sa.Integer(), nullable=True))
+    # existing shows aren't ticketed, their tickets_available stays NULL
+    op.add_column('Show', sa.Column('tickets_available', sa.Integer(), nullable=True))
+    op.create_check_constraint('ck_Show_tickets_available', 'Show', 'tickets_available >= 0')
+
+
+def downgrade():
+    op.drop_constraint('ck_Show_tickets_available', 'Show', type_='check')
+    op.drop_column('Show', 'tickets_available')
+    op.drop_column('Venue', 'capacity')
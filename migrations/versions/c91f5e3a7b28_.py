@@ -0,0 +1,64 @@
+"""surrogate Show primary key, venue_id/artist_id indexes
+
+Revision ID: c91f5e3a7b28
+Revises: 4a8c2e91d3b6
+Create Date: 2026-10-19 16:47:12.089415
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c91f5e3a7b28'
+down_revision = '4a8c2e91d3b6'
+branch_labels = None
+depends_on = None
+
+
+def resync_sequence(table):
+    # the seed data was inserted with explicit ids, so the sequences still
+    # start at 1 and hand out ids that are already taken
+    op.execute(
+        f'''
+        SELECT setval(pg_get_serial_sequence('"{table}"', 'id'),
+                      COALESCE((SELECT MAX(id) FROM "{table}"), 0) + 1, false)
+        '''
+    )
+
+
+def upgrade():
+    for table in ('Venue', 'Artist', 'Show'):
+        resync_sequence(table)
+
+    # the old key allowed the same id twice as long as venue, artist or start
+    # time differed, later copies get a fresh id before id becomes the key
+    op.execute(
+        '''
+        UPDATE "Show" s SET id = nextval(pg_get_serial_sequence('"Show"', 'id'))
+        FROM (
+            SELECT tableoid, ctid,
+                   row_number() OVER (PARTITION BY id ORDER BY start_time) AS n
+            FROM "Show"
+        ) duplicate
+        WHERE s.tableoid = duplicate.tableoid AND s.ctid = duplicate.ctid
+          AND duplicate.n > 1
+        '''
+    )
+
+    # start_time has to stay in the key of the partitioned table
+    op.execute('ALTER TABLE "Show" DROP CONSTRAINT "Show_pkey"')
+    op.execute('ALTER TABLE "Show" ADD CONSTRAINT "Show_pkey" PRIMARY KEY (id, start_time)')
+
+    # created on the parent, postgres creates them on every partition
+    op.create_index('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'])
+    op.create_index('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'])
+
+
+def downgrade():
+    op.drop_index('ix_Show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_Show_venue_id_start_time', table_name='Show')
+    op.execute('ALTER TABLE "Show" DROP CONSTRAINT "Show_pkey"')
+    op.execute(
+        'ALTER TABLE "Show" ADD CONSTRAINT "Show_pkey" '
+        'PRIMARY KEY (id, venue_id, artist_id, start_time)')
@@ -0,0 +1,43 @@
+"""one live Show per venue and per artist at a time
+
+Revision ID: d8e3a5c1f027
+Revises: a4c7e2f9d318
+Create Date: 2026-10-19 21:12:45.208316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8e3a5c1f027'
+down_revision = 'a4c7e2f9d318'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # double bookings that got in before the indexes: the first one booked
+    # stays, the later ones are archived
+    for column in ('venue_id', 'artist_id'):
+        op.execute(f'''
+            UPDATE "Show" SET archived_at = CURRENT_TIMESTAMP
+            WHERE archived_at IS NULL AND EXISTS (
+                SELECT 1 FROM "Show" earlier
+                WHERE earlier.{column} = "Show".{column}
+                  AND earlier.start_time = "Show".start_time
+                  AND earlier.archived_at IS NULL AND earlier.id < "Show".id)
+        ''')
+    op.execute('''
+        DELETE FROM "ShowFeed" WHERE show_id IN (
+            SELECT id FROM "Show" WHERE archived_at IS NOT NULL)
+    ''')
+    op.create_index('uq_Show_venue_slot', 'Show', ['venue_id', 'start_time'], unique=True,
+                    postgresql_where=sa.text('archived_at IS NULL'))
+    op.create_index('uq_Show_artist_slot', 'Show', ['artist_id', 'start_time'], unique=True,
+                    postgresql_where=sa.text('archived_at IS NULL'))
+
+
+def downgrade():
+    op.drop_index('uq_Show_artist_slot', table_name='Show')
+    op.drop_index('uq_Show_venue_slot', table_name='Show')
@@ -0,0 +1,50 @@
+"""venue time zones, store show times in UTC
+
+Revision ID: e7c4a1d95f60
+Revises: b5a09c3e7d21
+Create Date: 2026-10-19 14:22:10.337904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from enums import STATE_TIMEZONES
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7c4a1d95f60'
+down_revision = 'b5a09c3e7d21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column(
+        'timezone', sa.String(length=64), server_default='UTC', nullable=False))
+
+    # best guess from the state, promoters can fix it on the edit page
+    venue = sa.table('Venue', sa.column('state'), sa.column('timezone'))
+    for state, timezone in STATE_TIMEZONES.items():
+        op.execute(venue.update().where(venue.c.state == state)
+                   .values(timezone=timezone))
+
+    # start times were entered as the venue's wall clock time, convert them
+    op.execute(
+        '''
+        UPDATE "Show" AS s
+        SET start_time = timezone('utc', timezone(v.timezone, s.start_time))
+        FROM "Venue" AS v
+        WHERE v.id = s.venue_id
+        '''
+    )
+
+
+def downgrade():
+    op.execute(
+        '''
+        UPDATE "Show" AS s
+        SET start_time = timezone(v.timezone, timezone('utc', s.start_time))
+        FROM "Venue" AS v
+        WHERE v.id = s.venue_id
+        '''
+    )
+    op.drop_column('Venue', 'timezone')
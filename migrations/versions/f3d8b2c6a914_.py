@@ -0,0 +1,53 @@
+"""denormalized ShowFeed table for /shows
+
+Revision ID: f3d8b2c6a914
+Revises: c91f5e3a7b28
+Create Date: 2026-10-19 17:31:54.716203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3d8b2c6a914'
+down_revision = 'c91f5e3a7b28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ShowFeed',
+                    sa.Column('show_id', sa.Integer(), autoincrement=False, nullable=False),
+                    sa.Column('venue_id', sa.Integer(), nullable=False),
+                    sa.Column('venue_name', sa.String(), nullable=True),
+                    sa.Column('artist_id', sa.Integer(), nullable=False),
+                    sa.Column('artist_name', sa.String(), nullable=True),
+                    sa.Column('artist_image_link', sa.String(length=500), nullable=True),
+                    sa.Column('start_time', sa.DateTime(), nullable=False),
+                    sa.Column('local_start_time', sa.DateTime(), nullable=False),
+                    sa.PrimaryKeyConstraint('show_id')
+                    )
+    op.create_index(op.f('ix_ShowFeed_start_time'), 'ShowFeed', ['start_time'])
+    op.create_index(op.f('ix_ShowFeed_venue_id'), 'ShowFeed', ['venue_id'])
+    op.create_index(op.f('ix_ShowFeed_artist_id'), 'ShowFeed', ['artist_id'])
+
+    op.execute(
+        '''
+        INSERT INTO "ShowFeed" (show_id, venue_id, venue_name, artist_id, artist_name,
+                                artist_image_link, start_time, local_start_time)
+        SELECT s.id, s.venue_id, v.name, s.artist_id, a.name, a.image_link, s.start_time,
+               timezone(v.timezone, timezone('utc', s.start_time))
+        FROM "Show" s
+        JOIN "Venue" v ON v.id = s.venue_id
+        JOIN "Artist" a ON a.id = s.artist_id
+        WHERE s.archived_at IS NULL AND v.deleted_at IS NULL AND a.deleted_at IS NULL
+        '''
+    )
+
+
+def downgrade():
+    op.drop_index(op.f('ix_ShowFeed_artist_id'), table_name='ShowFeed')
+    op.drop_index(op.f('ix_ShowFeed_venue_id'), table_name='ShowFeed')
+    op.drop_index(op.f('ix_ShowFeed_start_time'), table_name='ShowFeed')
+    op.drop_table('ShowFeed')
@@ -1,10 +1,58 @@
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DateTime, text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from routing import RoutingSQLAlchemy
+
+#----------------------------------------------------------------------------#
+# SQL functions.
+#----------------------------------------------------------------------------#
+
+# Show.start_time is stored as UTC in a timestamp without time zone column.
+# These keep the upcoming/past split and the conversion to the venue's local
+# time in SQL.
+
+
+class utcnow(FunctionElement):
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def _utcnow(element, compiler, **kw):
+    # sqlite's CURRENT_TIMESTAMP is already UTC
+    return 'CURRENT_TIMESTAMP'
+
+
+@compiles(utcnow, 'postgresql')
+def _utcnow_postgresql(element, compiler, **kw):
+    return "timezone('utc', now())"
+
+
+class local_time(FunctionElement):
+    # local_time(utc_timestamp, zone_name) -> timestamp in that zone
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(local_time)
+def _local_time(element, compiler, **kw):
+    # databases without time zone support show UTC
+    timestamp, _ = list(element.clauses)
+    return compiler.process(timestamp, **kw)
+
+
+@compiles(local_time, 'postgresql')
+def _local_time_postgresql(element, compiler, **kw):
+    timestamp, zone = list(element.clauses)
+    return "timezone(%s, timezone('utc', %s))" % (
+        compiler.process(zone, **kw), compiler.process(timestamp, **kw))
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
-db = SQLAlchemy()
+# reads of views marked with @replica_read go to a read replica, see routing.py
+db = RoutingSQLAlchemy()
 
 
 class BaseModel(db.Model):
@@ -23,8 +71,30 @@ class BaseModel(db.Model):
         return {c.name: getattr(self, c.name) for c in self.__table__.columns}
 
 
-class Venue(BaseModel):
+class SoftDeleteMixin:
+    # rows are archived by setting deleted_at instead of being deleted, so
+    # their shows keep pointing at something
+    deleted_at = db.Column(db.DateTime, nullable=True)
+
+    @classmethod
+    def active(cls):
+        return cls.query.filter(cls.deleted_at.is_(None))
+
+
+# partial indexes only cover live rows, archived ones never get scanned
+ACTIVE_ONLY = text('deleted_at IS NULL')
+LIVE_SHOWS = text('archived_at IS NULL')
+
+# postgres array, a JSON list on sqlite so the test suite can run without postgres
+GENRES = db.ARRAY(db.String()).with_variant(db.JSON(), 'sqlite')
+
+
+class Venue(SoftDeleteMixin, BaseModel):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_Venue_active_location', 'state', 'city', 'name',
+                 postgresql_where=ACTIVE_ONLY, sqlite_where=ACTIVE_ONLY),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -39,7 +109,13 @@ class Venue(BaseModel):
     seeking_description = db.Column(db.String(), default='')
     seeking_talent = db.Column(db.Boolean, default=False)
     website_link = db.Column(db.String())
-    genres = db.Column(db.ARRAY(db.String()))
+    genres = db.Column(GENRES)
+    # IANA zone name, show times are entered and displayed in it
+    timezone = db.Column(db.String(64), nullable=False, server_default='UTC')
+    # tickets of each new show, shows of venues without one aren't ticketed
+    capacity = db.Column(db.Integer, nullable=True)
+    # bumped by every edit, see updates.py
+    version = db.Column(db.Integer, nullable=False, server_default='1')
     shows = db.relationship('Show', backref='Venue', lazy='dynamic')
 
     def summarized_dict(self) -> dict:
@@ -49,15 +125,19 @@ class Venue(BaseModel):
         return {'id': self.id, 'name': self.name, 'city': self.city, 'state': self.state}
 
 
-class Artist(BaseModel):
+class Artist(SoftDeleteMixin, BaseModel):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_Artist_active_name', 'name',
+                 postgresql_where=ACTIVE_ONLY, sqlite_where=ACTIVE_ONLY),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String()))
+    genres = db.Column(GENRES)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
 
@@ -65,6 +145,7 @@ class Artist(BaseModel):
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(), default='')
     website_link = db.Column(db.String())
+    version = db.Column(db.Integer, nullable=False, server_default='1')
     shows = db.relationship('Show', backref='Artist', lazy=True)
 
 # Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
@@ -72,13 +153,76 @@ class Artist(BaseModel):
 
 class Show(BaseModel):
     __tablename__ = 'Show'
+    __table_args__ = (
+        # the venue/artist pages fetch one entity's shows split on start_time
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        # a venue or artist plays one live show at a time, what keeps two
+        # concurrent bookings from both passing the clash check, see scheduling.py
+        db.Index('uq_Show_venue_slot', 'venue_id', 'start_time', unique=True,
+                 postgresql_where=LIVE_SHOWS, sqlite_where=LIVE_SHOWS),
+        db.Index('uq_Show_artist_slot', 'artist_id', 'start_time', unique=True,
+                 postgresql_where=LIVE_SHOWS, sqlite_where=LIVE_SHOWS),
+        # last line of defence against overselling, see tickets.py
+        db.CheckConstraint('tickets_available >= 0', name='ck_Show_tickets_available'),
+    )
+
+    # surrogate key. On postgres the primary key constraint is (id, start_time)
+    # because a partitioned table's key has to contain the partition key, the
+    # id alone is still unique since it only comes from the sequence.
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     venue_id = db.Column(
         db.Integer,
-        db.ForeignKey('Venue.id'), primary_key=True
+        db.ForeignKey('Venue.id'), nullable=False
     )
     artist_id = db.Column(
         db.Integer,
-        db.ForeignKey('Artist.id'), primary_key=True
+        db.ForeignKey('Artist.id'), nullable=False
     )
-    start_time = db.Column(db.String(), nullable=False)
+    # UTC, partition key of the range partitioned Show table, see partitions.py
+    start_time = db.Column(db.DateTime, nullable=False)
+    # set when the venue or artist of the show is archived
+    archived_at = db.Column(db.DateTime, nullable=True)
+    # starts at the venue's capacity, None when the show isn't ticketed
+    tickets_available = db.Column(db.Integer, nullable=True)
+
+
+class BookingRollup(db.Model):
+    # daily booking counts per venue location and artist genre, kept current
+    # by every show insert and rebuilt by `flask rebuild-analytics`, see analytics.py
+    __tablename__ = 'BookingRollup'
+
+    day = db.Column(db.Date, primary_key=True)
+    city = db.Column(db.String(120), primary_key=True)
+    state = db.Column(db.String(120), primary_key=True)
+    genre = db.Column(db.String(120), primary_key=True)
+    bookings = db.Column(db.Integer, nullable=False, server_default='0')
+
+
+class ShowArchive(db.Model):
+    # one row per `flask maintenance` run that moved shows out of the database,
+    # rebuild-analytics keeps the rollup days before archived_before, see retention.py
+    __tablename__ = 'ShowArchive'
+
+    id = db.Column(db.Integer, primary_key=True)
+    # every show on a local day before this one is in the archive files
+    archived_before = db.Column(db.Date, nullable=False)
+    shows = db.Column(db.Integer, nullable=False, server_default='0')
+    location = db.Column(db.String(500), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, server_default=db.func.now())
+
+
+class ShowFeed(db.Model):
+    # denormalized copy of every live show with what the /shows page displays,
+    # so the feed is read from one table in start_time order, see feed.py
+    __tablename__ = 'ShowFeed'
+
+    show_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    venue_id = db.Column(db.Integer, nullable=False, index=True)
+    venue_name = db.Column(db.String)
+    artist_id = db.Column(db.Integer, nullable=False, index=True)
+    artist_name = db.Column(db.String)
+    artist_image_link = db.Column(db.String(500))
+    # UTC, for the upcoming/past split, and the venue's wall clock time to display
+    start_time = db.Column(db.DateTime, nullable=False, index=True)
+    local_start_time = db.Column(db.DateTime, nullable=False)
@@ -0,0 +1,74 @@
+from datetime import datetime
+
+from sqlalchemy import text
+
+#----------------------------------------------------------------------------#
+# Show table partitions.
+#----------------------------------------------------------------------------#
+
+# "Show" is range partitioned by start_time, one partition per year plus a
+# default partition that catches anything outside the yearly ranges.
+# Postgres only, on other databases the table is a plain table.
+
+PARENT = 'Show'
+DEFAULT_PARTITION = 'Show_default'
+
+
+def partition_name(year) -> str:
+    return f'Show_y{year}'
+
+
+def partition_bounds(year) -> tuple:
+    return f'{year}-01-01 00:00:00', f'{year + 1}-01-01 00:00:00'
+
+
+def existing_partitions(conn) -> set:
+    rows = conn.execute(text(
+        '''
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = :parent
+        '''
+    ), {'parent': PARENT})
+    return {name for name, in rows}
+
+
+def create_partition(conn, year) -> None:
+    # rows that landed in the default partition before this year's partition
+    # existed are moved over, otherwise ATTACH PARTITION refuses to run
+    name = partition_name(year)
+    lower, upper = partition_bounds(year)
+    conn.execute(text(
+        f'CREATE TABLE "{name}" (LIKE "{PARENT}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+    conn.execute(text(
+        f'''
+        WITH moved AS (
+            DELETE FROM "{DEFAULT_PARTITION}"
+            WHERE start_time >= :lower AND start_time < :upper
+            RETURNING *
+        )
+        INSERT INTO "{name}" SELECT * FROM moved
+        '''
+    ), {'lower': lower, 'upper': upper})
+    conn.execute(text(
+        f'''ALTER TABLE "{PARENT}" ATTACH PARTITION "{name}"
+            FOR VALUES FROM ('{lower}') TO ('{upper}')'''))
+
+
+def ensure_show_partitions(engine, years_ahead=2) -> list:
+    # creates the yearly partitions from the current year up to years_ahead,
+    # meant to be run regularly (cron) through `flask create-show-partitions`
+    if engine.dialect.name != 'postgresql':
+        return []
+
+    created = []
+    current_year = datetime.utcnow().year
+    with engine.begin() as conn:
+        existing = existing_partitions(conn)
+        for year in range(current_year, current_year + years_ahead + 1):
+            if partition_name(year) not in existing:
+                create_partition(conn, year)
+                created.append(partition_name(year))
+    return created
@@ -0,0 +1,151 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import os
+import tempfile
+
+from models import db, Artist, Show, Venue
+
+#----------------------------------------------------------------------------#
+# Static venue and artist pages.
+#----------------------------------------------------------------------------#
+
+# `flask prerender` renders /venues/<id> and /artists/<id> through the app
+# (the same HTML a request would get) into PRERENDER_DIR as
+# venues/<id>/index.html and artists/<id>/index.html, for the CDN or nginx
+# (try_files $uri/index.html) to serve. When PRERENDER_DIR is set the app
+# re-renders the pages a write touched on a background thread after commit.
+# Past/upcoming is decided at render time, run the command from cron (daily)
+# so shows move to "past" on the static pages too.
+
+KINDS = {'venue': Venue, 'artist': Artist}
+OTHER = {'venue': 'artist', 'artist': 'venue'}
+
+# edited columns that show up on the pages of the other kind
+PAGE_FIELDS = {
+    'venue': {'name', 'image_link', 'timezone'},
+    'artist': {'name', 'image_link'},
+}
+
+# ids per task handed to a worker process
+CHUNK_SIZE = 200
+
+
+def page_path(directory, kind, id) -> str:
+    return os.path.join(directory, f'{kind}s', str(id), 'index.html')
+
+
+def render_page(client, directory, kind, id) -> bool:
+    # returns False (and removes the page) when the entity is gone
+    path = page_path(directory, kind, id)
+    response = client.get(f'/{kind}s/{id}')
+    if response.status_code == 404:
+        if os.path.exists(path):
+            os.remove(path)
+        return False
+    if response.status_code != 200:
+        raise RuntimeError(f'/{kind}s/{id} answered {response.status_code}')
+
+    # written next to the page and renamed over it, the CDN never sees half a file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(response.get_data())
+    os.replace(tmp, path)
+    return True
+
+
+def related_ids(kind, ids) -> set:
+    # ids of the other kind sharing a show (archived ones too) with ids
+    column, other = getattr(Show, f'{kind}_id'), getattr(Show, f'{OTHER[kind]}_id')
+    return {id for id, in db.session.query(other).filter(column.in_(ids)).distinct()}
+
+
+#  Full render
+#  ----------------------------------------------------------------
+
+def _render_chunk(task) -> int:
+    # runs in a worker process
+    from app import app
+    directory, kind, ids = task
+    client = app.test_client()
+    return sum(render_page(client, directory, kind, id) for id in ids)
+
+
+def _remove_stale(directory, kind, ids) -> int:
+    # pages of entities deleted since the last run
+    removed = 0
+    root = os.path.join(directory, f'{kind}s')
+    if not os.path.isdir(root):
+        return 0
+    for name in os.listdir(root):
+        if name.isdigit() and int(name) not in ids:
+            path = page_path(directory, kind, name)
+            if os.path.exists(path):
+                os.remove(path)
+                removed += 1
+    return removed
+
+
+def prerender_all(app, directory, workers=None) -> dict:
+    # renders every active venue and artist page with a process pool,
+    # returns {'venues': rendered, 'artists': rendered, 'removed': stale pages}
+    with app.app_context():
+        ids = {kind: [id for id, in model.active().with_entities(model.id).order_by(model.id)]
+               for kind, model in KINDS.items()}
+        # forked workers must not share the parent's pooled connections
+        db.engine.dispose()
+
+    tasks = [(directory, kind, kind_ids[i:i + CHUNK_SIZE])
+             for kind, kind_ids in ids.items()
+             for i in range(0, len(kind_ids), CHUNK_SIZE)]
+    results = {'venues': 0, 'artists': 0}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for (_, kind, _), rendered in zip(tasks, pool.map(_render_chunk, tasks)):
+            results[f'{kind}s'] += rendered
+
+    results['removed'] = sum(_remove_stale(directory, kind, set(kind_ids))
+                             for kind, kind_ids in ids.items())
+    return results
+
+
+#  After writes
+#  ----------------------------------------------------------------
+
+def get_executor(app) -> ThreadPoolExecutor:
+    # one thread per worker, re-renders run in the order of the writes
+    executor = app.extensions.get('prerender')
+    if executor is None:
+        executor = app.extensions.setdefault('prerender', ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='prerender'))
+    return executor
+
+
+def _refresh(app, directory, pages, related) -> None:
+    try:
+        with app.app_context():
+            pages = {kind: set(ids) for kind, ids in pages.items()}
+            for kind in related:
+                pages.setdefault(OTHER[kind], set()).update(
+                    related_ids(kind, pages.get(kind, ())))
+            db.session.remove()
+        client = app.test_client()
+        for kind, ids in pages.items():
+            for id in sorted(ids):
+                render_page(client, directory, kind, id)
+    except Exception as e:
+        app.logger.warning(f'Pages could not be pre-rendered: {e}')
+
+
+def refresh(app, venues=(), artists=(), related=()):
+    # queues a re-render of the venue and artist pages (and of the pages of
+    # the other kind sharing shows with the kinds in related), returns the
+    # future or None when pre-rendering is off. Call it after the commit.
+    directory = app.config.get('PRERENDER_DIR')
+    if not directory:
+        return None
+    pages = {'venue': list(venues), 'artist': list(artists)}
+    return get_executor(app).submit(_refresh, app, directory, pages, tuple(related))
+
+
+def init_prerender(app) -> None:
+    app.config.setdefault('PRERENDER_DIR', None)
+    app.config.setdefault('PRERENDER_WORKERS', None)
@@ -0,0 +1,182 @@
+from collections import Counter
+from threading import Event, Lock, Thread, get_ident
+import os
+import random
+import sys
+import time
+
+from flask import request
+
+#----------------------------------------------------------------------------#
+# Sampling profiler.
+#----------------------------------------------------------------------------#
+
+# POST /admin/profiler/start turns it on for a number of seconds. While it's
+# on, a sample_rate fraction of the requests is marked when it starts, and a
+# thread reads the stacks of the marked request threads every
+# PROFILER_INTERVAL seconds (sys._current_frames, nothing is traced). Stacks
+# are counted by route and come out of /admin/profiler/stacks as collapsed
+# stacks ("GET /shows;app.py:shows;... 12"), the input of flamegraph.pl and
+# speedscope. Each worker profiles its own requests, ask every worker (or run
+# one) to see all of them.
+
+# stacks start at Flask.wsgi_app, the server's frames above it aren't kept.
+# Streamed pages render after wsgi_app returned, their stacks are whole.
+ROOT_FUNCTION = 'wsgi_app'
+
+
+class Profiler:
+    """ Samples the stacks of the marked requests of this worker."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+        self.counts = Counter()  # (route, stack) -> samples
+        self.requests = Counter()  # route -> profiled requests
+        self.samples = 0
+        self.started_at = None
+        self.stops_at = None
+        self.sample_rate = 1.0
+        self._active = {}  # thread id -> route of the request it's serving
+        self._lock = Lock()
+        self._stopped = Event()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self.stops_at is not None and time.monotonic() < self.stops_at
+
+    def start(self, seconds, sample_rate=1.0) -> None:
+        # results of the previous run are dropped
+        self.stop()
+        with self._lock:
+            self.counts.clear()
+            self.requests.clear()
+            self.samples = 0
+            self.sample_rate = sample_rate
+            self.started_at = time.monotonic()
+            self.stops_at = self.started_at + seconds
+            self._stopped.clear()
+            self._thread = Thread(target=self._run, name='profiler', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        # the results stay until the next start
+        self._stopped.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+            self._thread = None
+        if self.running:
+            self.stops_at = time.monotonic()
+        self._active.clear()
+
+    def begin_request(self, route) -> None:
+        if self.running and random.random() < self.sample_rate:
+            with self._lock:
+                self.requests[route] += 1
+            self._active[get_ident()] = route
+
+    def end_request(self) -> None:
+        self._active.pop(get_ident(), None)
+
+    def _run(self) -> None:
+        interval = self.app.config['PROFILER_INTERVAL']
+        while not self._stopped.wait(interval) and self.running:
+            self.sample()
+        self._active.clear()
+
+    def sample(self) -> None:
+        # one sample of every marked request thread
+        active = dict(self._active)
+        if not active:
+            return
+        frames = sys._current_frames()
+        max_stacks = self.app.config['PROFILER_MAX_STACKS']
+        with self._lock:
+            for ident, route in active.items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = collapse(frame, self.app.config['PROFILER_MAX_DEPTH'],
+                                 self.app.root_path + os.sep)
+                key = (route, stack)
+                # past max_stacks only the stacks seen before are counted
+                if key not in self.counts and len(self.counts) >= max_stacks:
+                    key = (route, '[other]')
+                self.counts[key] += 1
+                self.samples += 1
+
+    def collapsed(self, route=None) -> str:
+        with self._lock:
+            counts = sorted(self.counts.items())
+        return ''.join(f'{key_route};{stack} {count}\n'
+                       for (key_route, stack), count in counts
+                       if route is None or key_route == route)
+
+    def status(self) -> dict:
+        with self._lock:
+            by_route = Counter()
+            for (route, _), count in self.counts.items():
+                by_route[route] += count
+            routes = [{'route': route, 'requests': self.requests[route],
+                       'samples': by_route[route]}
+                      for route in sorted(self.requests.keys() | by_route.keys())]
+        remaining = self.stops_at - time.monotonic() if self.running else 0
+        return {
+            'running': self.running,
+            'seconds_left': round(remaining, 1),
+            'sample_rate': self.sample_rate,
+            'interval': self.app.config['PROFILER_INTERVAL'],
+            'samples': self.samples,
+            'routes': routes,
+        }
+
+
+def _label(frame, root) -> str:
+    # app.py:shows for the app's files, flask/app.py:wsgi_app for libraries
+    code = frame.f_code
+    path = code.co_filename
+    if path.startswith(root):
+        path = os.path.relpath(path, root)
+    else:
+        path = os.path.join(*path.split(os.sep)[-2:])
+    return f'{path}:{code.co_name}'.replace(';', ',')
+
+
+def collapse(frame, max_depth, root='') -> str:
+    # 'outer;...;inner' from the request's wsgi_app frame down to frame,
+    # only the innermost max_depth frames of deeper stacks
+    labels = []
+    while frame is not None:
+        labels.append(_label(frame, root))
+        if frame.f_code.co_name == ROOT_FUNCTION:
+            break
+        frame = frame.f_back
+    return ';'.join(reversed(labels[:max_depth]))
+
+
+def get_profiler(app) -> Profiler:
+    profiler = app.extensions.get('profiler')
+    if profiler is None:
+        profiler = app.extensions.setdefault('profiler', Profiler(app))
+    return profiler
+
+
+def init_profiler(app) -> None:
+    app.config.setdefault('PROFILER_INTERVAL', 0.01)
+    app.config.setdefault('PROFILER_MAX_SECONDS', 300)
+    app.config.setdefault('PROFILER_MAX_STACKS', 5000)
+    app.config.setdefault('PROFILER_MAX_DEPTH', 100)
+
+    @app.before_request
+    def profile_request():
+        profiler = app.extensions.get('profiler')
+        if profiler is not None and profiler.running:
+            rule = request.url_rule.rule if request.url_rule else 'unmatched'
+            profiler.begin_request(f'{request.method} {rule}')
+
+    @app.teardown_request
+    def end_profile(exception=None):
+        profiler = app.extensions.get('profiler')
+        if profiler is not None:
+            profiler.end_request()
@@ -0,0 +1,197 @@
+from collections import Counter
+from functools import wraps
+from threading import BoundedSemaphore, Lock, local
+import hmac
+import sqlite3
+import time
+
+from flask import current_app, request
+from werkzeug.exceptions import ServiceUnavailable, TooManyRequests
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+#----------------------------------------------------------------------------#
+# Rate limiting and admission control.
+#----------------------------------------------------------------------------#
+
+# Every limited route belongs to a group ('search', 'write'). Each client gets
+# a token bucket per group, RATE_LIMITS[group] = (tokens per second, burst),
+# and at most CONCURRENCY_LIMITS[group] requests of a group run at once per
+# worker. Over the rate is a 429, over the concurrency cap a 503, both with
+# Retry-After. Behind TRUSTED_PROXIES proxies the client address comes from
+# X-Forwarded-For (ProxyFix), so clients don't all share the proxy's bucket.
+
+# buckets idle long enough to be full again are dropped past this many keys,
+# and from the sqlite file every SQLITE_PRUNE_SECONDS. A dropped bucket comes
+# back full, so each one is kept until it's full at its own group's rate.
+MAX_MEMORY_KEYS = 10000
+SQLITE_PRUNE_SECONDS = 60
+
+
+class MemoryBuckets:
+    """ Token buckets of this worker."""
+
+    def __init__(self) -> None:
+        self._buckets = {}
+        self._lock = Lock()
+
+    def _prune(self, now) -> None:
+        self._buckets = {key: bucket for key, bucket in self._buckets.items()
+                         if bucket[2] > now}
+
+    def take(self, key, rate, burst) -> float:
+        # takes a token, returns 0 or the seconds until one is available.
+        # Buckets are (tokens, updated, full again at).
+        with self._lock:
+            now = time.monotonic()
+            if len(self._buckets) > MAX_MEMORY_KEYS:
+                self._prune(now)
+            tokens, updated, _ = self._buckets.get(key, (burst, now, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            return wait
+
+
+class SQLiteBuckets:
+    """ Token buckets in a local sqlite file, shared by every worker process on
+    the host so a client can't multiply its rate by the number of workers."""
+
+    def __init__(self, path) -> None:
+        self.path = path
+        self._local = local()
+        self._pruned_at = time.time()
+        conn = self._connect()
+        # buckets without full_at, from before pruning
+        conn.execute('DROP TABLE IF EXISTS buckets')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS token_buckets (key TEXT PRIMARY KEY, '
+            'tokens REAL NOT NULL, updated REAL NOT NULL, full_at REAL NOT NULL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_token_buckets_full_at '
+                     'ON token_buckets (full_at)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, rate, burst) -> float:
+        conn = self._connect()
+        # BEGIN IMMEDIATE takes the write lock up front, read and update of a
+        # bucket can't interleave with another process
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            if now - self._pruned_at > SQLITE_PRUNE_SECONDS:
+                self._pruned_at = now
+                conn.execute('DELETE FROM token_buckets WHERE full_at <= ?', (now,))
+            row = conn.execute('SELECT tokens, updated FROM token_buckets '
+                               'WHERE key = ?', (key,)).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens = min(burst, tokens + max(now - updated, 0) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            conn.execute('INSERT OR REPLACE INTO token_buckets '
+                         '(key, tokens, updated, full_at) VALUES (?, ?, ?, ?)',
+                         (key, tokens, now, now + (burst - tokens) / rate))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return wait
+
+
+def get_buckets(app):
+    buckets = app.extensions.get('rate_limit_buckets')
+    if buckets is None:
+        path = app.config.get('RATE_LIMIT_STORAGE')
+        buckets = SQLiteBuckets(path) if path else MemoryBuckets()
+        app.extensions['rate_limit_buckets'] = buckets
+    return buckets
+
+
+def get_semaphore(app, group):
+    semaphores = app.extensions.setdefault('concurrency_limits', {})
+    semaphore = semaphores.get(group)
+    if semaphore is None:
+        limit = app.config['CONCURRENCY_LIMITS'].get(group)
+        semaphore = semaphores.setdefault(
+            group, BoundedSemaphore(limit) if limit else None)
+    return semaphore
+
+
+def rejections(app) -> Counter:
+    # (group, reason) -> rejected requests since the worker started
+    return app.extensions.setdefault('rate_limit_rejections', Counter())
+
+
+def client_key() -> str:
+    # API clients are limited by their key, everyone else by address. Only
+    # configured keys count, a made up key per request would otherwise get a
+    # fresh bucket every time.
+    api_key = request.headers.get('X-API-Key')
+    if api_key and any(hmac.compare_digest(api_key, key)
+                       for key in current_app.config['API_KEYS']):
+        return f'key:{api_key}'
+    return f'ip:{request.remote_addr}'
+
+
+def _reject(app, group, reason, exception):
+    rejections(app)[(group, reason)] += 1
+    app.logger.debug(f'Rejected {request.method} {request.path} from {client_key()}: '
+                     f'{group} {reason}')
+    raise exception
+
+
+def limited(group):
+    # decorator for an expensive route, see the module comment
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            app = current_app._get_current_object()
+            if app.config['RATE_LIMIT_ENABLED'] and group in app.config['RATE_LIMITS']:
+                rate, burst = app.config['RATE_LIMITS'][group]
+                wait = get_buckets(app).take(f'{group}:{client_key()}', rate, burst)
+                if wait:
+                    _reject(app, group, 'rate', TooManyRequests(
+                        retry_after=max(int(wait + 0.999), 1)))
+
+            semaphore = (get_semaphore(app, group)
+                         if app.config['CONCURRENCY_LIMIT_ENABLED'] else None)
+            if semaphore is None:
+                return view(*args, **kwargs)
+            if not semaphore.acquire(timeout=app.config['CONCURRENCY_WAIT_SECONDS']):
+                _reject(app, group, 'concurrency', ServiceUnavailable(retry_after=1))
+            try:
+                return view(*args, **kwargs)
+            finally:
+                semaphore.release()
+        return wrapper
+    return decorator
+
+
+def init_rate_limits(app) -> None:
+    app.config.setdefault('RATE_LIMIT_ENABLED', True)
+    app.config.setdefault('RATE_LIMITS', {})
+    app.config.setdefault('CONCURRENCY_LIMIT_ENABLED', True)
+    app.config.setdefault('CONCURRENCY_LIMITS', {})
+    app.config.setdefault('CONCURRENCY_WAIT_SECONDS', 0.5)
+    app.config.setdefault('RATE_LIMIT_STORAGE', None)
+    app.config.setdefault('API_KEYS', [])
+    app.config.setdefault('TRUSTED_PROXIES', 0)
+    if app.config['TRUSTED_PROXIES']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'])
+
+
+def stats(app) -> dict:
+    counts = rejections(app)
+    return {
+        'rejected': [{'group': group, 'reason': reason, 'count': count}
+                     for (group, reason), count in sorted(counts.items())],
+        'rejected_total': sum(counts.values()),
+    }
@@ -0,0 +1,182 @@
+from datetime import date, datetime, timedelta
+import gzip
+import json
+import os
+import tempfile
+import time
+
+from sqlalchemy import Date, func, select
+
+from feed import drop_from_feed
+from models import db, Artist, Show, ShowArchive, ShowFeed, Venue, local_time
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pyarrow is optional, gzipped NDJSON is always available
+    pyarrow = None
+
+#----------------------------------------------------------------------------#
+# Retention of old shows and logs.
+#----------------------------------------------------------------------------#
+
+# `flask maintenance` (daily from cron) moves the shows on a local day more
+# than RETENTION_DAYS ago out of the database into RETENTION_DIR:
+#   shows-<run>/part-00001.parquet (or .ndjson.gz), part-00002...
+# one part per batch of RETENTION_BATCH_SIZE shows, with the venue and artist
+# names, city, state and genres so reports don't need the database. A part is
+# written (and renamed into place) before its shows are deleted, in a short
+# transaction of its own, so a run never holds locks for long and a crash at
+# worst exports a batch twice (the show ids are unique). Query the parts with
+# duckdb: SELECT ... FROM 'archive/shows-*/part-*.parquet'.
+# Each run that archived shows leaves a ShowArchive row with the local day it
+# archived before, the booking rollups of the days before it stay as they are
+# when rebuild-analytics recomputes the rest. The pre-rendered pages of the
+# venues and artists that lost shows are refreshed once the run is done.
+#
+# Workers log to LOG_FILE with a WatchedFileHandler, the same command renames
+# the file to LOG_FILE.1.gz (older copies shift up to LOG_BACKUP_COUNT) and
+# every worker reopens a fresh LOG_FILE on its next line.
+
+FORMATS = ('parquet', 'ndjson')
+
+
+def default_format() -> str:
+    return 'parquet' if pyarrow is not None else 'ndjson'
+
+
+def _local_day():
+    return func.date(local_time(Show.start_time, Venue.timezone), type_=Date)
+
+
+def _archive_query(cutoff, limit):
+    return select(
+        Show.id, Show.venue_id, Venue.name.label('venue_name'),
+        Venue.city, Venue.state, Show.artist_id, Artist.name.label('artist_name'),
+        Artist.genres, Show.start_time,
+        local_time(Show.start_time, Venue.timezone).label('local_start_time'),
+        Show.archived_at, Show.tickets_available,
+    ).join(Venue, Venue.id == Show.venue_id).join(
+        Artist, Artist.id == Show.artist_id
+    ).where(
+        _local_day() < cutoff,
+        # local days start at most 14 hours ahead of UTC, lets postgres skip
+        # the newer partitions
+        Show.start_time < cutoff + timedelta(days=1),
+    ).order_by(Show.id).limit(limit)
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _write_ndjson(f, rows) -> None:
+    with gzip.GzipFile(fileobj=f, mode='wb') as out:
+        for row in rows:
+            out.write(json.dumps(row, default=_json_default).encode() + b'\n')
+
+
+def _write_parquet(f, rows) -> None:
+    pyarrow.parquet.write_table(pyarrow.Table.from_pylist(rows), f,
+                                compression='zstd')
+
+
+def write_part(path, rows, format) -> None:
+    # written next to the part and renamed over it once it's on disk
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            (_write_parquet if format == 'parquet' else _write_ndjson)(f, rows)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def archive_shows(directory, days, format=None, batch_size=5000, pause=0) -> dict:
+    # exports and deletes the shows on a local day more than days ago, batch by
+    # batch, returns {'shows': archived, 'parts': [paths], 'venues': {ids},
+    # 'artists': {ids}} with the venues and artists that lost shows
+    format = format or default_format()
+    if format == 'parquet' and pyarrow is None:
+        raise RuntimeError('Parquet needs pyarrow installed, use ndjson instead.')
+    cutoff = datetime.utcnow().date() - timedelta(days=days)
+    run = os.path.join(directory, f'shows-{datetime.utcnow():%Y%m%dT%H%M%S}')
+    extension = 'parquet' if format == 'parquet' else 'ndjson.gz'
+
+    archived, parts, venues, artists = 0, [], set(), set()
+    record = None
+    while True:
+        rows = [row._asdict() for row in db.session.execute(
+            _archive_query(cutoff, batch_size))]
+        if not rows:
+            break
+        path = os.path.join(run, f'part-{len(parts) + 1:05d}.{extension}')
+        write_part(path, rows, format)
+        parts.append(path)
+
+        ids = [row['id'] for row in rows]
+        try:
+            drop_from_feed(ShowFeed.show_id.in_(ids))
+            # the start_time predicate lets postgres skip the newer partitions
+            deleted = Show.query.filter(
+                Show.id.in_(ids), Show.start_time < cutoff + timedelta(days=1)
+            ).delete(synchronize_session=False)
+            # committed with the deletes, rebuilds never miss archived shows
+            if record is None:
+                record = ShowArchive(archived_before=cutoff, shows=0, location=run)
+                db.session.add(record)
+            record.shows += deleted
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        archived += deleted
+        venues.update(row['venue_id'] for row in rows)
+        artists.update(row['artist_id'] for row in rows)
+        if len(rows) < batch_size:
+            break
+        # lets replicas and autovacuum keep up between batches
+        time.sleep(pause)
+    return {'shows': archived, 'parts': parts, 'venues': venues, 'artists': artists}
+
+
+def rotate_log(path, backup_count) -> bool:
+    # path -> path.1.gz, path.1.gz -> path.2.gz ... the oldest beyond
+    # backup_count is removed. Returns False when there was nothing to rotate.
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return False
+    for i in range(backup_count, 0, -1):
+        source = f'{path}.{i}.gz'
+        if os.path.exists(source):
+            if i == backup_count:
+                os.remove(source)
+            else:
+                os.replace(source, f'{path}.{i + 1}.gz')
+
+    # renamed first, the workers' handlers see the file is gone and reopen path
+    rotated = f'{path}.1'
+    os.replace(path, rotated)
+    with open(rotated, 'rb') as f, gzip.open(f'{rotated}.gz', 'wb') as out:
+        while True:
+            chunk = f.read(1 << 20)
+            if not chunk:
+                break
+            out.write(chunk)
+    os.remove(rotated)
+    return True
+
+
+def init_retention(app) -> None:
+    app.config.setdefault('RETENTION_DAYS', 730)
+    app.config.setdefault('RETENTION_DIR', 'archive')
+    app.config.setdefault('RETENTION_FORMAT', None)
+    app.config.setdefault('RETENTION_BATCH_SIZE', 5000)
+    app.config.setdefault('RETENTION_PAUSE_SECONDS', 0.1)
+    app.config.setdefault('LOG_FILE', 'error.log')
+    app.config.setdefault('LOG_BACKUP_COUNT', 14)
@@ -0,0 +1,164 @@
+from functools import wraps
+from itertools import count
+from threading import Lock
+import time
+
+from flask import current_app, g, has_app_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import create_engine, orm, text
+
+#----------------------------------------------------------------------------#
+# Read replica routing.
+#----------------------------------------------------------------------------#
+
+# set on the client after a write so its next reads go to the primary and it
+# sees its own booking even if the replicas are lagging
+STICKY_COOKIE = 'fyyur_primary_until'
+
+
+def _engine_options(uri, connect_timeout) -> dict:
+    # a replica that doesn't answer fails its health check after
+    # connect_timeout seconds instead of the driver's default (none for psycopg2)
+    if connect_timeout is None:
+        return {}
+    if uri.startswith('postgresql'):
+        return {'connect_args': {'connect_timeout': max(int(connect_timeout), 1)}}
+    if uri.startswith('sqlite'):
+        return {'connect_args': {'timeout': connect_timeout}}
+    return {}
+
+
+class ReplicaPool:
+    """ Round robin over the configured read replicas, skipping the ones that
+    failed their last health check."""
+
+    def __init__(self, uris, health_check_interval=5, connect_timeout=None) -> None:
+        self.health_check_interval = health_check_interval
+        self._engines = [create_engine(uri, **_engine_options(uri, connect_timeout))
+                         for uri in uris]
+        self._healthy = [True] * len(self._engines)
+        self._checked_at = [None] * len(self._engines)
+        self._counter = count()
+        # one per replica, a replica that hangs only delays its own check
+        self._locks = [Lock() for _ in self._engines]
+
+    def __len__(self) -> int:
+        return len(self._engines)
+
+    def _is_fresh(self, index) -> bool:
+        checked_at = self._checked_at[index]
+        return (checked_at is not None
+                and time.monotonic() - checked_at < self.health_check_interval)
+
+    def _check(self, index) -> bool:
+        if self._is_fresh(index):
+            return self._healthy[index]
+
+        # while another thread checks the replica the others go by its last
+        # result instead of waiting for the connect
+        lock = self._locks[index]
+        if not lock.acquire(blocking=False):
+            return self._healthy[index]
+        try:
+            # another thread may have just checked it
+            if self._is_fresh(index):
+                return self._healthy[index]
+            try:
+                with self._engines[index].connect() as conn:
+                    conn.execute(text('SELECT 1'))
+                self._healthy[index] = True
+            except Exception as e:
+                current_app.logger.warning(
+                    f'Read replica {index} failed its health check: {e}')
+                self._healthy[index] = False
+            self._checked_at[index] = time.monotonic()
+        finally:
+            lock.release()
+        return self._healthy[index]
+
+    def pick(self):
+        # returns None when no replica is healthy, callers fall back to the primary
+        for _ in range(len(self._engines)):
+            index = next(self._counter) % len(self._engines)
+            if self._check(index):
+                return self._engines[index]
+        return None
+
+    def status(self) -> list:
+        return [{'url': repr(engine.url), 'healthy': healthy}
+                for engine, healthy in zip(self._engines, self._healthy)]
+
+    def dispose(self) -> None:
+        for engine in self._engines:
+            engine.dispose()
+
+
+def get_replicas(app):
+    # built on first use so config changes made after init_app (tests) count
+    pool = app.extensions.get('replicas')
+    if pool is None:
+        uris = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+        pool = ReplicaPool(uris, app.config.get('REPLICA_HEALTH_CHECK_INTERVAL', 5),
+                           app.config.get('REPLICA_CONNECT_TIMEOUT'))
+        app.extensions['replicas'] = pool
+    return pool
+
+
+def _wants_replica() -> bool:
+    return has_app_context() and g.get('use_replica', False)
+
+
+class RoutingSession(SignallingSession):
+    """ Sends reads of views marked with @replica_read to a replica, everything
+    else, and every write, to the primary."""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        writing = self._flushing or getattr(clause, 'is_dml', False)
+        if writing and has_app_context():
+            g.wrote_primary = True
+
+        if not writing and _wants_replica():
+            replica = get_replicas(self.app).pick()
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def init_app(self, app):
+        super().init_app(app)
+        app.config.setdefault('SQLALCHEMY_REPLICA_URIS', [])
+        app.config.setdefault('REPLICA_HEALTH_CHECK_INTERVAL', 5)
+        app.config.setdefault('REPLICA_CONNECT_TIMEOUT', 2)
+        app.config.setdefault('REPLICA_STICKY_SECONDS', 10)
+        app.after_request(_stick_to_primary)
+
+
+def _stick_to_primary(response):
+    if g.get('wrote_primary') and current_app.config['SQLALCHEMY_REPLICA_URIS']:
+        seconds = current_app.config['REPLICA_STICKY_SECONDS']
+        response.set_cookie(STICKY_COOKIE, str(time.time() + seconds),
+                            max_age=seconds, httponly=True, samesite='Lax')
+    return response
+
+
+def _is_sticky() -> bool:
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def replica_read(view):
+    # marks a read only view, its queries may be served by a read replica
+    # unless the client wrote something in the last REPLICA_STICKY_SECONDS
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.use_replica = (bool(current_app.config['SQLALCHEMY_REPLICA_URIS'])
+                         and not _is_sticky())
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,175 @@
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import insert, or_
+from sqlalchemy.exc import IntegrityError
+
+from analytics import record_bookings
+from enums import Recurrence
+from feed import sync_feed
+from identity import get_artists, get_venues
+from models import db, Show
+
+#----------------------------------------------------------------------------#
+# Batch show scheduling.
+#----------------------------------------------------------------------------#
+
+START_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# a weekly residency booked for ten years, anything above is most likely a typo
+MAX_OCCURRENCES = 520
+
+RECURRENCE_DAYS = {
+    Recurrence.weekly.value: 7,
+    Recurrence.biweekly.value: 14,
+}
+
+
+class BookingError(Exception):
+    """ Raised when a batch of bookings can't be inserted. Carries every problem
+    found so the whole batch can be fixed in one go, and the HTTP status to
+    answer with: 400 for a malformed booking, 409 when it clashes with the
+    data."""
+
+    def __init__(self, problems, status=409) -> None:
+        super().__init__('; '.join(problems))
+        self.problems = problems
+        self.status = status
+
+
+def expand_occurrences(start_time, recurrence, end_date, interval_days=None) -> list:
+    # turns a recurrence rule into the list of start times, end_date is inclusive
+    if recurrence == Recurrence.custom.value:
+        # JSON can send anything, "3" and true included
+        if (not isinstance(interval_days, int) or isinstance(interval_days, bool)
+                or interval_days < 1):
+            raise BookingError(
+                ['Custom recurrence needs an interval of at least 1 day.'], 400)
+        step = timedelta(days=interval_days)
+    elif recurrence in RECURRENCE_DAYS:
+        step = timedelta(days=RECURRENCE_DAYS[recurrence])
+    else:
+        raise BookingError([f'Unknown recurrence "{recurrence}".'], 400)
+
+    if end_date < start_time.date():
+        raise BookingError(['End date is before the first show.'], 400)
+
+    occurrences = []
+    current = start_time
+    while current.date() <= end_date:
+        occurrences.append(current)
+        if len(occurrences) > MAX_OCCURRENCES:
+            raise BookingError(
+                [f'Recurrence would create more than {MAX_OCCURRENCES} shows.'], 400)
+        current += step
+    return occurrences
+
+
+def parse_start_time(value, field='start_time') -> datetime:
+    if isinstance(value, datetime):
+        return value
+    if value is None:
+        raise BookingError([f'Missing {field}.'], 400)
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        raise BookingError([f'Invalid {field} "{value}".'], 400)
+
+
+def to_utc(local_time, zone_name) -> datetime:
+    # wall clock time at the venue -> naive UTC, the way Show.start_time is stored
+    aware = local_time.replace(tzinfo=ZoneInfo(zone_name))
+    return aware.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def booked_slots(start_times, venue_ids, artist_ids) -> list:
+    # (venue_id, artist_id, start_time) of every live show that could clash
+    return db.session.query(Show.venue_id, Show.artist_id, Show.start_time).filter(
+        Show.start_time.in_(start_times), Show.archived_at.is_(None),
+        or_(Show.venue_id.in_(venue_ids), Show.artist_id.in_(artist_ids))
+    ).all()
+
+
+def book_shows(bookings) -> int:
+    # bookings is a list of {'artist_id', 'venue_id', 'start_time'} dicts with
+    # start_time in the venue's local time.
+    # Everything is validated up front with a fixed number of queries and then
+    # inserted with a single multi-row INSERT in a single transaction. A batch
+    # committed in between the check and the INSERT is caught by the unique
+    # venue and artist slot indexes.
+    if not bookings:
+        raise BookingError(['No shows to book.'], 400)
+
+    rows = []
+    for booking in bookings:
+        try:
+            artist_id = int(booking['artist_id'])
+            venue_id = int(booking['venue_id'])
+        except (KeyError, TypeError, ValueError):
+            raise BookingError([f'Invalid artist_id/venue_id in {booking!r}.'], 400)
+        start_time = parse_start_time(booking.get('start_time'))
+        rows.append({'artist_id': artist_id, 'venue_id': venue_id,
+                     'start_time': start_time.replace(microsecond=0)})
+
+    venue_ids = {row['venue_id'] for row in rows}
+    artist_ids = {row['artist_id'] for row in rows}
+
+    problems = []
+
+    # the rollup reuses both, see identity.py
+    venues = get_venues(venue_ids)
+    found_artists = get_artists(artist_ids)
+    for id in sorted(venue_ids - venues.keys()):
+        problems.append(f'Venue {id} does not exist.')
+    for id in sorted(artist_ids - found_artists.keys()):
+        problems.append(f'Artist {id} does not exist.')
+    if problems:
+        raise BookingError(problems)
+
+    # messages keep the local time the promoter entered, the rows get UTC
+    local_times = [row['start_time'] for row in rows]
+    for row in rows:
+        venue = venues[row['venue_id']]
+        row['start_time'] = to_utc(row['start_time'], venue.timezone)
+        row['tickets_available'] = venue.capacity
+    start_times = {row['start_time'] for row in rows}
+
+    # one query for every existing booking that could clash with the batch
+    existing = booked_slots(start_times, venue_ids, artist_ids)
+    busy_venues = {(venue_id, start_time)
+                   for venue_id, _, start_time in existing}
+    busy_artists = {(artist_id, start_time)
+                    for _, artist_id, start_time in existing}
+
+    for row, local_time in zip(rows, local_times):
+        when = local_time.strftime(START_TIME_FORMAT)
+        venue_slot = (row['venue_id'], row['start_time'])
+        artist_slot = (row['artist_id'], row['start_time'])
+        if venue_slot in busy_venues:
+            problems.append(
+                f'Venue {row["venue_id"]} is already booked at {when}.')
+        if artist_slot in busy_artists:
+            problems.append(
+                f'Artist {row["artist_id"]} is already booked at {when}.')
+        # also catches clashes between rows of the same batch
+        busy_venues.add(venue_slot)
+        busy_artists.add(artist_slot)
+
+    if problems:
+        raise BookingError(problems)
+
+    try:
+        db.session.execute(insert(Show).values(rows))
+        record_bookings([dict(row, start_time=local_time)
+                         for row, local_time in zip(rows, local_times)])
+        sync_feed(Show.venue_id.in_(venue_ids), Show.start_time.in_(start_times))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise BookingError(['Some of these venues or artists were booked at the same '
+                            'time by someone else, please try again.'])
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return len(rows)
@@ -2,3 +2,28 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// typeahead for the venue/artist search boxes, fed by /autocomplete
+document.querySelectorAll('input[data-autocomplete]').forEach(function (input) {
+  var kind = input.dataset.autocomplete;
+  var list = document.getElementById(input.getAttribute('list'));
+  var pending = null;
+
+  input.addEventListener('input', function () {
+    clearTimeout(pending);
+    pending = setTimeout(function () {
+      var q = input.value.trim();
+      if (!q) { list.innerHTML = ''; return; }
+      fetch('/autocomplete?type=' + kind + '&limit=8&q=' + encodeURIComponent(q))
+        .then(function (response) { return response.json(); })
+        .then(function (data) {
+          list.innerHTML = '';
+          (data[kind + 's'] || []).forEach(function (item) {
+            var option = document.createElement('option');
+            option.value = item.name;
+            list.appendChild(option);
+          });
+        });
+    }, 120);
+  });
+});
@@ -0,0 +1,200 @@
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, insert, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app as flask_app
+from feed import rebuild_feed
+from health import migration_head
+from models import db, Artist, Show, Venue
+
+#----------------------------------------------------------------------------#
+# Backends.
+#----------------------------------------------------------------------------#
+
+# every test runs on sqlite, and on postgres as well when TEST_POSTGRES_URI
+# points at a throwaway database (its tables are dropped and recreated)
+POSTGRES_URI = os.environ.get('TEST_POSTGRES_URI')
+
+# latency budgets are multiplied by this on slow machines
+LATENCY_SCALE = float(os.environ.get('TEST_LATENCY_SCALE', '1'))
+
+ADMIN_TOKEN = 'test-admin-token'
+
+# far enough from today that upcoming/past never flips during a run
+UPCOMING = datetime.utcnow().replace(microsecond=0) + timedelta(days=400)
+PAST = datetime.utcnow().replace(microsecond=0) - timedelta(days=400)
+
+
+def _create_schema():
+    db.drop_all()
+    db.session.execute(text('DROP TABLE IF EXISTS alembic_version'))
+    db.session.commit()
+    db.create_all()
+
+
+@pytest.fixture(scope='session', params=['sqlite', 'postgres'])
+def backend(request, tmp_path_factory):
+    if request.param == 'postgres':
+        if not POSTGRES_URI:
+            pytest.skip('TEST_POSTGRES_URI is not set')
+        uri = POSTGRES_URI
+    else:
+        uri = 'sqlite:///' + str(tmp_path_factory.mktemp('db') / 'fyyur.db')
+
+    flask_app.config.update(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI=uri,
+        SQLALCHEMY_REPLICA_URIS=[],
+        ADMIN_TOKEN=ADMIN_TOKEN,
+        RATE_LIMIT_ENABLED=False,
+        # tests build the index when they need it, after the data is seeded
+        AUTOCOMPLETE_WARM_UP=False,
+        IMAGE_CACHE_DIR=str(tmp_path_factory.mktemp('images')),
+    )
+    with flask_app.app_context():
+        _create_schema()
+    yield request.param
+
+
+#----------------------------------------------------------------------------#
+# Data.
+#----------------------------------------------------------------------------#
+
+
+def _seed():
+    # three venues and artists, each venue with two upcoming and two past shows
+    for table in ('BookingRollup', 'ShowArchive', 'ShowFeed', 'Show', 'Venue', 'Artist'):
+        db.session.execute(text(f'DELETE FROM "{table}"'))
+    zones = ['America/New_York', 'America/Los_Angeles', 'UTC']
+    for i in range(1, 4):
+        db.session.execute(insert(Venue).values(
+            id=i, name=f'The Musical Hop {i}', city='San Francisco', state='CA',
+            address=f'{i} Folsom Street', phone='123-123-1234', timezone=zones[i - 1],
+            image_link='https://example.com/venue.jpg', genres=['Jazz', 'Folk'],
+            seeking_talent=True, seeking_description='Looking for bands'))
+        db.session.execute(insert(Artist).values(
+            id=i, name=f'Guns N Petals {i}', city='San Francisco', state='CA',
+            phone='326-123-5000', image_link='https://example.com/artist.jpg',
+            genres=['Jazz'], seeking_venue=False))
+    shows = []
+    for venue_id in range(1, 4):
+        for n in range(2):
+            artist_id = (venue_id + n - 1) % 3 + 1
+            shows.append({'venue_id': venue_id, 'artist_id': artist_id,
+                          'start_time': UPCOMING + timedelta(days=venue_id * 10 + n)})
+            shows.append({'venue_id': venue_id, 'artist_id': artist_id,
+                          'start_time': PAST - timedelta(days=venue_id * 10 + n)})
+    db.session.execute(insert(Show).values(shows))
+    db.session.commit()
+    rebuild_feed()
+
+
+@pytest.fixture
+def app(backend):
+    with flask_app.app_context():
+        _seed()
+        db.session.remove()
+    # per worker caches would leak rows between tests
+    for name in ('autocomplete', 'rate_limit_buckets', 'concurrency_limits',
+                 'rate_limit_rejections', 'thumbnails'):
+        flask_app.extensions.pop(name, None)
+    config = dict(flask_app.config)
+    yield flask_app
+    hub = flask_app.extensions.pop('event_hub', None)
+    if hub is not None:
+        hub.stop()
+    executor = flask_app.extensions.pop('prerender', None)
+    if executor is not None:
+        executor.shutdown()
+    profiler = flask_app.extensions.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+    warm_up = flask_app.extensions.pop('autocomplete_warm_up', None)
+    if warm_up is not None:
+        warm_up.join()
+    index = flask_app.extensions.pop('autocomplete', None)
+    if index is not None and index.refresh_thread is not None:
+        index.refresh_thread.join()
+    replicas = flask_app.extensions.pop('replicas', None)
+    if replicas is not None:
+        replicas.dispose()
+    flask_app.config.update(config)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin():
+    return {'X-Admin-Token': ADMIN_TOKEN}
+
+
+@pytest.fixture
+def migrated(app):
+    # records the head revision the way `flask db upgrade` would
+    with app.app_context():
+        db.session.execute(text(
+            'CREATE TABLE IF NOT EXISTS alembic_version (version_num VARCHAR(32) NOT NULL)'))
+        db.session.execute(text('DELETE FROM alembic_version'))
+        db.session.execute(text('INSERT INTO alembic_version VALUES (:head)'),
+                           {'head': migration_head(app)})
+        db.session.commit()
+        db.session.remove()
+
+
+#----------------------------------------------------------------------------#
+# Query and latency budgets.
+#----------------------------------------------------------------------------#
+
+
+@contextmanager
+def recorded_queries(app):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+@pytest.fixture
+def budget(app):
+    # budget(max_queries, max_ms, request) runs request() once to warm the
+    # caches it's allowed to use, then again against the budgets. Writes pass
+    # warm=False so they only run once. Every route is budgeted in its tests
+    # but the /events streams: they stay open until the client leaves, and
+    # the hub's poll thread queries on its own schedule while they do.
+    def check(max_queries, max_ms, request, warm=True):
+        if warm:
+            request().get_data()
+        with recorded_queries(app) as statements:
+            started = time.perf_counter()
+            response = request()
+            response.get_data()  # streamed pages render while being read
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        assert len(statements) <= max_queries, (
+            f'{len(statements)} queries, budget {max_queries}:\n' + '\n'.join(statements))
+        assert elapsed_ms <= max_ms * LATENCY_SCALE, (
+            f'{elapsed_ms:.1f} ms, budget {max_ms * LATENCY_SCALE:.1f} ms')
+        return response
+    return check
+
+
+def count(model, *filters) -> int:
+    with flask_app.app_context():
+        return model.query.filter(*filters).count()
@@ -0,0 +1,53 @@
+from models import Artist, Show, Venue
+
+from conftest import count
+
+
+def test_admin_routes_need_the_token(client):
+    assert client.get('/admin/analytics').status_code == 403
+    assert client.get('/admin/analytics.json?token=wrong').status_code == 403
+    assert client.post('/admin/venues/delete', json={'ids': [1]}).status_code == 403
+
+
+def test_bulk_archive(client, admin, budget):
+    response = budget(4, 200, lambda: client.post(
+        '/admin/artists/delete', json={'ids': [1, 2]}, headers=admin), warm=False)
+    assert response.json == {'action': 'archive', 'requested': 2, 'affected': 2}
+    assert count(Artist, Artist.deleted_at.is_(None)) == 1
+
+
+def test_bulk_delete(client, admin):
+    response = client.post('/admin/venues/delete?action=delete',
+                           data={'ids': ['2', '3']}, headers=admin)
+    assert response.json['affected'] == 2
+    assert count(Venue) == 1
+    assert count(Show, Show.venue_id.in_([2, 3])) == 0
+
+
+def test_bulk_delete_bad_request(client, admin):
+    assert client.post('/admin/venues/delete', json={'ids': ['x']},
+                       headers=admin).status_code == 400
+    assert client.post('/admin/venues/delete?action=drop', json={'ids': [1]},
+                       headers=admin).status_code == 400
+
+
+def test_analytics_follow_bookings(client, admin, budget):
+    client.post('/shows/batch', json={'shows': [
+        {'artist_id': 1, 'venue_id': 1, 'start_time': '2041-01-01T20:00:00'}]})
+    stats = budget(3, 200, lambda: client.get('/admin/analytics.json', headers=admin)).json
+    assert stats['by_location'] == [{'city': 'San Francisco', 'state': 'CA', 'bookings': 1}]
+    assert stats['by_genre'] == [{'genre': 'Jazz', 'bookings': 1}]
+    assert stats['by_month'] == [{'month': '2041-01', 'bookings': 1}]
+
+
+def test_analytics_page(client, admin, budget):
+    response = budget(3, 200, lambda: client.get('/admin/analytics', headers=admin))
+    assert response.status_code == 200
+    assert b'By genre' in response.data
+
+
+def test_rebuild_analytics(app, admin):
+    result = app.test_cli_runner().invoke(args=['rebuild-analytics'])
+    assert 'Rebuilt booking rollups' in result.output
+    stats = app.test_client().get('/admin/analytics.json', headers=admin).json
+    assert stats['by_location'][0]['bookings'] == 12
@@ -0,0 +1,57 @@
+from models import Artist
+
+from conftest import count
+
+
+def test_artists(client, budget):
+    response = budget(1, 200, lambda: client.get('/artists'))
+    assert response.status_code == 200
+    for i in range(1, 4):
+        assert f'Guns N Petals {i}'.encode() in response.data
+
+
+def test_search_artists(client, budget):
+    response = budget(1, 200, lambda: client.post(
+        '/artists/search', data={'search_term': 'PETALS 3'}))
+    assert response.status_code == 200
+    assert b'Guns N Petals 3' in response.data
+    assert b'Guns N Petals 1' not in response.data
+
+
+def test_show_artist(client, budget):
+    response = budget(3, 200, lambda: client.get('/artists/1'))
+    assert response.status_code == 200
+    assert b'Guns N Petals 1' in response.data
+    assert b'2 Upcoming Shows' in response.data
+
+
+def test_show_artist_not_found(client):
+    assert client.get('/artists/999').status_code == 404
+
+
+def test_create_artist_form(client, budget):
+    assert budget(0, 100, lambda: client.get('/artists/create')).status_code == 200
+
+
+def test_create_artist(client, budget):
+    data = {'name': 'Matt Quevedo', 'city': 'New York', 'state': 'NY',
+            'phone': '300-400-5000', 'genres': ['Jazz'],
+            'facebook_link': 'https://www.facebook.com/mattquevedo923251523'}
+    response = budget(2, 200, lambda: client.post('/artists/create', data=data), warm=False)
+    assert b'was successfully listed' in response.data
+    assert count(Artist, Artist.name == 'Matt Quevedo') == 1
+
+
+def test_edit_artist_form(client, budget):
+    response = budget(1, 200, lambda: client.get('/artists/1/edit'))
+    assert response.status_code == 200
+
+
+def test_edit_artist(client, budget):
+    data = {'name': 'Guns N Roses', 'city': 'San Francisco', 'state': 'CA',
+            'phone': '326-123-5000', 'genres': ['Jazz'], 'version': '1',
+            'image_link': 'https://example.com/artist.jpg',
+            'facebook_link': 'https://www.facebook.com/GunsNPetals'}
+    response = budget(4, 200, lambda: client.post('/artists/1/edit', data=data), warm=False)
+    assert response.status_code == 302
+    assert count(Artist, Artist.name == 'Guns N Roses') == 1
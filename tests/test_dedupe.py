@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from sqlalchemy import insert
+
+from dedupe import normalize_address, normalize_name, normalize_phone
+from models import db, Show, ShowFeed, Venue
+
+from conftest import UPCOMING, count
+
+
+def test_normalize():
+    assert normalize_name('Musical Hop, The') == normalize_name('The  Musical HOP') == 'musical hop'
+    assert normalize_name('Café & Bar') == 'cafe and bar'
+    assert normalize_phone('+1 (415) 123-4567') == normalize_phone('415.123.4567') == '4151234567'
+    assert normalize_address('1015 Folsom Street') == '1015 folsom st'
+
+
+def add_venue(app, **values):
+    with app.app_context():
+        db.session.execute(insert(Venue).values(**dict(
+            {'city': 'San Francisco', 'state': 'CA', 'phone': '415-000-0000'}, **values)))
+        db.session.commit()
+
+
+def test_find_duplicates(app, client, admin, budget):
+    add_venue(app, id=10, name='Musical Hop 2, The', city='san francisco ')
+    add_venue(app, id=11, name='Musical Hopp 2', phone='(123) 123-1234')
+    # same name in another city, and a different number
+    add_venue(app, id=12, name='The Musical Hop 2', city='Oakland')
+    add_venue(app, id=13, name='The Musical Hop 22')
+
+    groups = budget(1, 300, lambda: client.get(
+        '/admin/venues/duplicates', headers=admin)).json['groups']
+    assert len(groups) == 1
+    assert groups[0]['keep'] == {'id': 2, 'name': 'The Musical Hop 2'}
+    duplicates = {d['id']: d for d in groups[0]['duplicates']}
+    assert duplicates.keys() == {10, 11}
+    assert duplicates[10]['score'] == 1.0
+    assert 'phone' in duplicates[11]['reasons']
+
+
+def test_merge(app, client, admin, budget):
+    add_venue(app, id=10, name='Musical Hop 2, The')
+    with app.app_context():
+        db.session.execute(insert(Show).values(
+            venue_id=10, artist_id=1, start_time=UPCOMING))
+        db.session.commit()
+
+    response = budget(6, 200, lambda: client.post(
+        '/admin/venues/merge', json={'keep': 2, 'ids': [10]}, headers=admin), warm=False)
+    assert response.json == {'kept': 2, 'merged': 1, 'shows_moved': 1}
+    assert count(Show, Show.venue_id == 10) == 0
+    assert count(Show, Show.venue_id == 2) == 5
+    assert count(Venue, Venue.id == 10, Venue.deleted_at.is_(None)) == 0
+    assert count(ShowFeed, ShowFeed.venue_id == 2) == 5
+
+
+def test_merge_archives_double_bookings(app, client, admin):
+    add_venue(app, id=10, name='Musical Hop 2, The')
+    with app.app_context():
+        # venue 2 already has a show then
+        db.session.execute(insert(Show).values(
+            venue_id=10, artist_id=3, start_time=UPCOMING + timedelta(days=20)))
+        db.session.commit()
+
+    response = client.post('/admin/venues/merge', json={'keep': 2, 'ids': [10]}, headers=admin)
+    assert response.json == {'kept': 2, 'merged': 1, 'shows_moved': 1}
+    assert count(Show, Show.venue_id == 2, Show.archived_at.is_(None)) == 4
+    assert count(ShowFeed, ShowFeed.venue_id == 2) == 4
+
+
+def test_merge_into_missing_venue(client, admin):
+    response = client.post('/admin/venues/merge', json={'keep': 99, 'ids': [1]}, headers=admin)
+    assert response.status_code == 404
+    assert count(Show, Show.venue_id == 1) == 4
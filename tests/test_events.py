@@ -0,0 +1,51 @@
+import json
+import time
+
+from events import get_hub
+from models import Show
+
+from conftest import count
+
+
+def messages(response, kind='show', timeout=5):
+    # the show events of an open stream, skipping keepalives
+    deadline = time.monotonic() + timeout
+    for chunk in response.response:
+        assert time.monotonic() < deadline, 'no event in time'
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if f'event: {kind}' in text:
+            yield json.loads(text.split('data: ', 1)[1])
+
+
+def test_reconnect_replays_missed_shows(client):
+    response = client.get('/events/venues/1', headers={'Last-Event-ID': '0'},
+                          buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    assert 'Content-Encoding' not in response.headers
+    events = messages(response)
+    missed = [next(events) for _ in range(4)]
+    response.close()
+    assert {event['venue_id'] for event in missed} == {1}
+    assert [event['id'] for event in missed] == sorted(event['id'] for event in missed)
+
+
+def test_new_show_is_pushed(app, client):
+    app.config.update(EVENTS_POLL_INTERVAL=0.05, EVENTS_KEEPALIVE_SECONDS=0.05)
+    response = client.get('/events/artists/3', buffered=False)
+    events = messages(response)
+    client.post('/shows/create', data={
+        'artist_id': '3', 'venue_id': '2', 'start_time': '2040-06-15 20:00:00'})
+    event = next(events)
+    response.close()
+    assert (event['artist_id'], event['venue_id']) == (3, 2)
+    assert count(Show, Show.id == event['id'], Show.artist_id == 3) == 1
+    assert len(get_hub(app)) == 0
+
+
+def test_subscriber_limit(app, client):
+    app.config.update(EVENTS_MAX_SUBSCRIBERS=1)
+    first = client.get('/events/shows', buffered=False)
+    second = client.get('/events/shows', buffered=False)
+    assert second.status_code == 503
+    assert second.headers['Retry-After'] == '3'
+    first.close()
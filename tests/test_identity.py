@@ -0,0 +1,46 @@
+from identity import forget, get_artist, get_artist_and_venue, get_venue, get_venues, prefetch
+from models import Artist, Venue
+
+from conftest import recorded_queries
+
+
+def test_lookups_share_one_query(app):
+    with app.test_request_context(), recorded_queries(app) as statements:
+        venues = get_venues([1, 2, 999])
+        assert sorted(venues) == [1, 2]
+        assert get_venue(1) is venues[1]
+        assert get_venue(999) is None
+    assert len(statements) == 1
+
+
+def test_prefetch_batches_the_next_lookup(app):
+    with app.test_request_context(), recorded_queries(app) as statements:
+        prefetch(Artist, [1, 2])
+        assert get_artist(3).id == 3
+        assert get_artist(1).id == 1 and get_artist(2).id == 2
+    assert len(statements) == 1
+
+
+def test_artist_and_venue_in_one_statement(app):
+    with app.test_request_context(), recorded_queries(app) as statements:
+        artist, venue = get_artist_and_venue(2, 3)
+        assert (artist.id, venue.id) == (2, 3)
+        assert get_artist_and_venue(999, 1)[0] is None
+        assert get_artist(2) is artist and get_venue(3) is venue
+    assert len(statements) == 2
+
+
+def test_forget_reloads(app):
+    with app.test_request_context(), recorded_queries(app) as statements:
+        get_venue(1)
+        forget(Venue, [1])
+        get_venue(1)
+    assert len(statements) == 2
+
+
+def test_cache_is_per_request(app):
+    with app.test_request_context():
+        get_venue(1)
+    with app.test_request_context(), recorded_queries(app) as statements:
+        get_venue(1)
+    assert len(statements) == 1
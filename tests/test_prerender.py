@@ -0,0 +1,51 @@
+import os
+
+from prerender import get_executor, page_path, prerender_all
+
+
+def test_prerender_all(app, tmp_path):
+    results = prerender_all(app, str(tmp_path), workers=2)
+    assert results == {'venues': 3, 'artists': 3, 'removed': 0}
+    with open(page_path(str(tmp_path), 'venue', 2), 'rb') as f:
+        assert b'The Musical Hop 2' in f.read()
+    assert os.path.exists(page_path(str(tmp_path), 'artist', 3))
+
+
+def test_prerender_removes_deleted_pages(app, client, tmp_path):
+    prerender_all(app, str(tmp_path), workers=1)
+    client.delete('/venues/3')
+    results = prerender_all(app, str(tmp_path), workers=1)
+    assert results['removed'] == 1
+    assert not os.path.exists(page_path(str(tmp_path), 'venue', 3))
+
+
+def written(app):
+    # waits for the re-renders queued by the previous requests
+    get_executor(app).submit(int).result()
+
+
+def test_edit_rerenders_related_pages(app, client, tmp_path):
+    app.config.update(PRERENDER_DIR=str(tmp_path))
+    response = client.post('/artists/1/edit', data={
+        'name': 'Guns N Roses', 'city': 'San Francisco', 'state': 'CA',
+        'phone': '326-123-5000', 'genres': ['Jazz'], 'version': '1',
+        'image_link': 'https://example.com/artist.jpg',
+        'facebook_link': 'https://www.facebook.com/GunsNPetals'})
+    assert response.status_code == 302
+    written(app)
+    with open(page_path(str(tmp_path), 'artist', 1), 'rb') as f:
+        assert b'Guns N Roses' in f.read()
+    # artist 1 plays venues 1 and 3
+    assert sorted(os.listdir(tmp_path / 'venues')) == ['1', '3']
+    with open(page_path(str(tmp_path), 'venue', 1), 'rb') as f:
+        assert b'Guns N Roses' in f.read()
+
+
+def test_new_show_rerenders_its_pages(app, client, tmp_path):
+    app.config.update(PRERENDER_DIR=str(tmp_path))
+    client.post('/shows/create', data={
+        'artist_id': '3', 'venue_id': '2', 'start_time': '2040-06-15 20:00:00'})
+    written(app)
+    assert sorted(os.listdir(tmp_path)) == ['artists', 'venues']
+    assert os.listdir(tmp_path / 'venues') == ['2']
+    assert os.listdir(tmp_path / 'artists') == ['3']
@@ -0,0 +1,62 @@
+from threading import get_ident
+
+from profiler import get_profiler
+
+
+def test_profiler_needs_the_token(client):
+    assert client.post('/admin/profiler/start').status_code == 403
+    assert client.get('/admin/profiler/stacks').status_code == 403
+
+
+def test_bad_settings(client, admin):
+    for payload in ({'seconds': 'x'}, {'seconds': 0}, {'seconds': 10 ** 6},
+                    {'sample_rate': 2}):
+        response = client.post('/admin/profiler/start', json=payload, headers=admin)
+        assert response.status_code == 400
+
+
+def test_requests_are_counted_by_route(client, admin, budget):
+    response = budget(0, 100, lambda: client.post(
+        '/admin/profiler/start', json={'seconds': 60}, headers=admin), warm=False)
+    assert response.json['running']
+    for _ in range(3):
+        client.get('/shows').get_data()
+    client.get('/venues/1')
+    status = budget(0, 100, lambda: client.post(
+        '/admin/profiler/stop', headers=admin), warm=False).json
+    assert not status['running']
+    requests = {route['route']: route['requests'] for route in status['routes']}
+    assert requests['GET /shows'] == 3
+    assert requests['GET /venues/<int:venue_id>'] == 1
+    # nothing is counted once it's stopped
+    client.get('/shows')
+    response = budget(0, 50, lambda: client.get('/admin/profiler', headers=admin))
+    assert response.json['routes'] == status['routes']
+
+
+def test_sample_rate(client, admin):
+    client.post('/admin/profiler/start', json={'seconds': 60, 'sample_rate': 0.000001},
+                headers=admin)
+    client.get('/shows')
+    assert client.get('/admin/profiler', headers=admin).json['routes'] == []
+
+
+def test_collapsed_stacks(app, client, admin, budget):
+    profiler = get_profiler(app)
+    profiler.start(60)
+    # samples the test's own thread as if it was serving a request
+    profiler._active[get_ident()] = 'GET /test'
+    profiler.sample()
+    profiler.sample()
+    profiler.stop()
+
+    response = budget(0, 50, lambda: client.get(
+        '/admin/profiler/stacks?route=GET /test', headers=admin))
+    assert response.mimetype == 'text/plain'
+    line, = response.get_data(as_text=True).splitlines()
+    stack, count = line.rsplit(' ', 1)
+    assert count == '2'
+    frames = stack.split(';')
+    assert frames[0] == 'GET /test'
+    assert frames[-2:] == ['tests/test_profiler.py:test_collapsed_stacks', 'profiler.py:sample']
+    assert client.get('/admin/profiler/stacks?route=GET /shows', headers=admin).data == b''
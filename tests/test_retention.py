@@ -0,0 +1,102 @@
+import gzip
+import json
+import os
+
+import retention
+from models import db, Show, ShowFeed
+from retention import archive_shows, rotate_log
+
+from conftest import UPCOMING, count
+
+
+def read_parts(paths):
+    rows = []
+    for path in paths:
+        with gzip.open(path, 'rt') as f:
+            rows.extend(json.loads(line) for line in f)
+    return rows
+
+
+def test_old_shows_are_archived_in_batches(app, tmp_path):
+    with app.app_context():
+        result = archive_shows(str(tmp_path), days=30, format='ndjson', batch_size=4)
+        db.session.remove()
+    assert result['shows'] == 6
+    assert [os.path.basename(path) for path in result['parts']] == [
+        'part-00001.ndjson.gz', 'part-00002.ndjson.gz']
+
+    rows = read_parts(result['parts'])
+    assert len({row['id'] for row in rows}) == 6
+    assert rows[0]['venue_name'].startswith('The Musical Hop')
+    assert rows[0]['genres'] == ['Jazz']
+    assert count(Show) == 6
+    assert count(Show, Show.start_time < UPCOMING) == 0
+    assert count(ShowFeed) == 6
+
+    # nothing left to archive
+    with app.app_context():
+        assert archive_shows(str(tmp_path), days=30, format='ndjson')['shows'] == 0
+
+
+def test_maintenance_command(app, tmp_path):
+    log = tmp_path / 'error.log'
+    log.write_text('old errors\n')
+    app.config['LOG_FILE'] = str(log)
+    result = app.test_cli_runner().invoke(args=[
+        'maintenance', '--days', '30', '--output', str(tmp_path / 'archive'),
+        '--format', 'ndjson'])
+    assert 'Archived 6 shows older than 30 days into 1 files' in result.output
+    assert 'Rotated' in result.output
+    with gzip.open(f'{log}.1.gz', 'rt') as f:
+        assert f.read() == 'old errors\n'
+    assert not log.exists()
+
+
+def test_parquet_needs_pyarrow(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(retention, 'pyarrow', None)
+    assert retention.default_format() == 'ndjson'
+    result = app.test_cli_runner().invoke(args=[
+        'maintenance', '--output', str(tmp_path), '--format', 'parquet', '--skip-logs'])
+    assert result.exit_code != 0
+    assert 'pyarrow' in result.output
+
+
+def test_rotate_log_keeps_backup_count(tmp_path):
+    path = str(tmp_path / 'error.log')
+    assert not rotate_log(path, 2)
+    for line in ('first', 'second', 'third'):
+        with open(path, 'w') as f:
+            f.write(line)
+        assert rotate_log(path, 2)
+    assert sorted(os.listdir(tmp_path)) == ['error.log.1.gz', 'error.log.2.gz']
+    with gzip.open(path + '.2.gz', 'rt') as f:
+        assert f.read() == 'second'
+
+
+def test_rebuild_keeps_archived_shows(app, admin, tmp_path):
+    runner = app.test_cli_runner()
+    runner.invoke(args=['rebuild-analytics'])
+    before = app.test_client().get('/admin/analytics.json', headers=admin).json
+    runner.invoke(args=['maintenance', '--days', '30', '--output', str(tmp_path),
+                        '--format', 'ndjson', '--skip-logs'])
+    result = runner.invoke(args=['rebuild-analytics'])
+    assert 'Rebuilt booking rollups' in result.output
+    after = app.test_client().get('/admin/analytics.json', headers=admin).json
+    assert after == before
+    assert after['by_location'][0]['bookings'] == 12
+
+
+def test_maintenance_refreshes_pages(app, tmp_path):
+    pages = tmp_path / 'pages'
+    app.config.update(PRERENDER_DIR=str(pages))
+    with app.app_context():
+        archived = db.session.query(Show.venue_id, Show.artist_id).filter(
+            Show.start_time < UPCOMING).all()
+        db.session.remove()
+    app.test_cli_runner().invoke(args=[
+        'maintenance', '--days', '30', '--output', str(tmp_path / 'archive'),
+        '--format', 'ndjson', '--skip-logs'])
+    assert sorted(map(int, os.listdir(pages / 'venues'))) == sorted(
+        {venue_id for venue_id, _ in archived})
+    assert sorted(map(int, os.listdir(pages / 'artists'))) == sorted(
+        {artist_id for _, artist_id in archived})
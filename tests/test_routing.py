@@ -0,0 +1,54 @@
+import pytest
+from sqlalchemy import create_engine, insert
+
+from models import db, Venue
+from routing import get_replicas
+
+
+@pytest.fixture
+def replica(app, tmp_path):
+    # a second sqlite file standing in for a replica, with its own venue
+    uri = 'sqlite:///' + str(tmp_path / 'replica.db')
+    engine = create_engine(uri)
+    db.Model.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Venue).values(
+            id=1, name='Replica Hall', city='Oakland', state='CA',
+            image_link='https://example.com/venue.jpg'))
+    engine.dispose()
+    app.config['SQLALCHEMY_REPLICA_URIS'] = [uri]
+    return uri
+
+
+def test_reads_go_to_the_replica(client, replica):
+    page = client.get('/venues').data
+    assert b'Replica Hall' in page
+    assert b'The Musical Hop' not in page
+
+
+def test_writes_stick_to_the_primary(client, replica):
+    assert b'Replica Hall' in client.get('/venues').data
+    client.post('/shows/batch', json={'shows': [
+        {'artist_id': 1, 'venue_id': 1, 'start_time': '2041-01-01T20:00:00'}]})
+    # the sticky cookie sends this client's reads to the primary for a while
+    page = client.get('/venues').data
+    assert b'The Musical Hop' in page
+
+
+def test_unhealthy_replica_falls_back_to_the_primary(app, client, tmp_path):
+    app.config['SQLALCHEMY_REPLICA_URIS'] = [
+        'sqlite:///' + str(tmp_path / 'missing' / 'replica.db')]
+    assert b'The Musical Hop' in client.get('/venues').data
+    assert get_replicas(app).status()[0]['healthy'] is False
+
+
+def test_busy_health_check_does_not_block(app, replica):
+    pool = get_replicas(app)
+    # another thread is connecting to the replica, the last result is used
+    pool._locks[0].acquire()
+    try:
+        with app.app_context():
+            assert pool.pick() is not None
+        assert pool._checked_at[0] is None
+    finally:
+        pool._locks[0].release()
@@ -0,0 +1,349 @@
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import os
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from sqlalchemy import insert
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+import autocomplete
+import compression
+import images
+import ratelimit
+from images import thumbnail_url
+from models import db, Venue
+
+from conftest import recorded_queries
+
+
+def test_healthz(client, budget):
+    response = budget(0, 50, lambda: client.get('/healthz'))
+    assert response.json['status'] == 'ok'
+
+
+def test_readyz_needs_migrations(client):
+    response = client.get('/readyz')
+    assert response.status_code == 503
+    assert response.json['database']['ok']
+    assert not response.json['migrations']['up_to_date']
+
+
+def test_readyz(client, migrated, budget):
+    response = budget(2, 100, lambda: client.get('/readyz'))
+    assert response.status_code == 200
+    assert response.json['migrations']['up_to_date']
+    assert 'pool' in response.json
+
+
+def test_autocomplete(client, budget):
+    response = budget(0, 50, lambda: client.get('/autocomplete?q=musical&type=venue'))
+    assert [venue['name'] for venue in response.json['venues']] == [
+        'The Musical Hop 1', 'The Musical Hop 2', 'The Musical Hop 3']
+    assert 'artists' not in response.json
+
+
+def test_autocomplete_beyond_ascii(app):
+    index = autocomplete.PrefixIndex()
+    index.build([('artist', 1, 'Beyoncé'), ('artist', 2, '東京事変'), ('artist', 3, 'Sigur Rós')])
+    assert index.search('beyonce', 'artist') == [{'id': 1, 'name': 'Beyoncé'}]
+    assert index.search('BEYONCÉ', 'artist') == [{'id': 1, 'name': 'Beyoncé'}]
+    assert index.search('東京', 'artist') == [{'id': 2, 'name': '東京事変'}]
+    assert index.search('ros', 'artist') == [{'id': 3, 'name': 'Sigur Rós'}]
+
+
+def test_autocomplete_index_is_built_once(app, client, monkeypatch):
+    loads = []
+    real_load = autocomplete._load_entries
+
+    def load():
+        loads.append(1)
+        time.sleep(0.05)  # long enough for every thread to find it missing
+        return real_load()
+
+    monkeypatch.setattr(autocomplete, '_load_entries', load)
+    with ThreadPoolExecutor(8) as pool:
+        codes = list(pool.map(lambda _: app.test_client().get(
+            '/autocomplete?q=musical').status_code, range(8)))
+    assert codes == [200] * 8
+    assert len(loads) == 1
+
+
+def test_autocomplete_refreshes_in_the_background(app, client):
+    client.get('/autocomplete?q=musical')
+    with app.app_context():
+        db.session.execute(insert(Venue).values(
+            id=4, name='Musical Barn', city='Oakland', state='CA',
+            image_link='https://example.com/venue.jpg'))
+        db.session.commit()
+    app.config['AUTOCOMPLETE_REFRESH_SECONDS'] = 0
+    # answered from the old index while the new one is built
+    assert client.get('/autocomplete?q=musical&type=venue').status_code == 200
+    app.extensions['autocomplete'].refresh_thread.join()
+    app.config['AUTOCOMPLETE_REFRESH_SECONDS'] = 300
+    assert len(client.get('/autocomplete?q=musical&type=venue').json['venues']) == 4
+
+
+def test_autocomplete_is_warm_before_its_first_request(app, client):
+    app.config['AUTOCOMPLETE_WARM_UP'] = True
+    assert client.get('/healthz').status_code == 200
+    app.extensions['autocomplete_warm_up'].join()
+    with recorded_queries(app) as statements:
+        response = client.get('/autocomplete?q=musical&type=venue')
+    assert len(response.json['venues']) == 3
+    assert statements == []
+
+
+def test_autocomplete_keeps_writes_made_during_a_rebuild(app):
+    index = autocomplete.PrefixIndex()
+    entries = [('venue', 1, 'The Musical Hop'), ('venue', 2, 'Park Square Live')]
+    index.build(entries)
+    index.record_changes()
+    # committed after the rebuild read the database
+    index.add('venue', 3, 'Musical Barn')
+    index.remove('venue', 1)
+    index.add('venue', 2, 'Musical Square')
+    index.build(entries)
+    assert index.search('musical', 'venue') == [
+        {'id': 3, 'name': 'Musical Barn'}, {'id': 2, 'name': 'Musical Square'}]
+    assert index.search('park', 'venue') == []
+
+
+def test_pages_are_compressed(client):
+    # /shows is streamed, a venue page is rendered in one piece
+    for path in ('/shows', '/venues/1'):
+        plain = client.get(path)
+        assert 'Content-Encoding' not in plain.headers
+        response = client.get(path, headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert gzip.decompress(response.data) == plain.data
+    assert client.get('/shows', headers={'Accept-Encoding': 'gzip'}).is_streamed
+
+
+@pytest.mark.skipif(compression.brotli is None, reason='brotli is not installed')
+def test_pages_are_compressed_with_brotli(client):
+    plain = client.get('/shows')
+    response = client.get('/shows', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert compression.brotli.decompress(response.data) == plain.data
+
+
+def test_small_responses_are_not_compressed(client):
+    response = client.get('/healthz', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+
+def test_not_found(client):
+    assert client.get('/nothing-here').status_code == 404
+
+
+def test_rate_limit(app, client, budget):
+    app.config.update(RATE_LIMIT_ENABLED=True)
+    try:
+        burst = app.config['RATE_LIMITS']['search'][1]
+        codes = [client.post('/artists/search', data={'search_term': 'a'}).status_code
+                 for _ in range(burst + 1)]
+        assert codes[-1] == 429
+        assert codes.count(200) == burst
+        stats = budget(0, 50, lambda: client.get(
+            '/admin/rate-limits?token=test-admin-token')).json
+        assert stats['rejected_total'] == 1
+    finally:
+        app.config.update(RATE_LIMIT_ENABLED=False)
+
+
+def test_rate_limit_ignores_unknown_api_keys(app, client):
+    app.config.update(RATE_LIMIT_ENABLED=True, API_KEYS=['partner-key'])
+    burst = app.config['RATE_LIMITS']['search'][1]
+
+    def search(api_key):
+        return client.post('/artists/search', data={'search_term': 'a'},
+                           headers={'X-API-Key': api_key}).status_code
+
+    # a new random key on every request still shares the address's bucket
+    codes = [search(os.urandom(8).hex()) for _ in range(burst + 1)]
+    assert codes[-1] == 429
+    # a configured key has a bucket of its own
+    assert search('partner-key') == 200
+
+
+def test_rate_limit_per_client_behind_a_proxy(app, client, monkeypatch):
+    # what init_rate_limits does with TRUSTED_PROXIES=1
+    monkeypatch.setattr(app, 'wsgi_app', ProxyFix(app.wsgi_app, x_for=1))
+    app.config.update(RATE_LIMIT_ENABLED=True)
+    burst = app.config['RATE_LIMITS']['search'][1]
+
+    def search(address):
+        return client.post('/artists/search', data={'search_term': 'a'},
+                           headers={'X-Forwarded-For': address}).status_code
+
+    codes = [search('203.0.113.1') for _ in range(burst + 1)]
+    assert codes[-1] == 429
+    # another client behind the same load balancer isn't throttled
+    assert search('203.0.113.2') == 200
+
+
+def test_buckets_are_pruned_at_their_own_rate(tmp_path, monkeypatch):
+    monkeypatch.setattr(ratelimit, 'MAX_MEMORY_KEYS', 1)
+    monkeypatch.setattr(ratelimit, 'SQLITE_PRUNE_SECONDS', 0)
+    for buckets in (ratelimit.MemoryBuckets(), ratelimit.SQLiteBuckets(str(tmp_path / 'b.db'))):
+        # a slow group's bucket emptied, a fast one that's full again right away
+        for _ in range(10):
+            buckets.take('write:ip:a', 1, 10)
+        buckets.take('search:ip:a', 1000, 1)
+        time.sleep(0.01)
+        buckets.take('search:ip:b', 1000, 1)
+        assert buckets.take('write:ip:a', 1, 10) > 0
+    with sqlite3.connect(str(tmp_path / 'b.db')) as conn:
+        keys = {key for key, in conn.execute('SELECT key FROM token_buckets')}
+    assert keys == {'write:ip:a', 'search:ip:b'}
+
+
+def test_concurrency_limit_without_rate_limits(app, client):
+    app.config.update(RATE_LIMIT_ENABLED=False, CONCURRENCY_WAIT_SECONDS=0.01)
+    semaphore = ratelimit.get_semaphore(app, 'search')
+    taken = app.config['CONCURRENCY_LIMITS']['search']
+    for _ in range(taken):
+        semaphore.acquire()
+    try:
+        assert client.post('/artists/search', data={'search_term': 'a'}).status_code == 503
+        app.config.update(CONCURRENCY_LIMIT_ENABLED=False)
+        assert client.post('/artists/search', data={'search_term': 'a'}).status_code == 200
+    finally:
+        for _ in range(taken):
+            semaphore.release()
+
+
+# 1x1 png
+PNG = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c6364f8cf500f0003860180'
+    '5a347d6b0000000049454e44ae426082')
+
+
+@pytest.fixture
+def image_server():
+    # stands in for the image hosts behind image_link
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            if self.path == '/moved':
+                # an image_link bouncing into the cloud metadata service
+                self.send_response(302)
+                self.send_header('Location', 'http://169.254.169.254/latest/meta-data/')
+                self.end_headers()
+                return
+            if self.path == '/page.png':
+                # a broken image host answering with its html error page
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/png')
+                self.end_headers()
+                self.wfile.write(b'<html><body>Not found</body></html>')
+                return
+            time.sleep(0.05)  # slow enough for concurrent misses to overlap
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.end_headers()
+            self.wfile.write(PNG)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}', hits
+    server.shutdown()
+
+
+def test_image_thumbnails_are_fetched_once(app, client, image_server, budget):
+    base, hits = image_server
+    app.config['IMAGE_FETCH_ALLOWED_NETWORKS'] = ['127.0.0.1/32']
+    with app.test_request_context():
+        url = thumbnail_url(f'{base}/hop.png', 300)
+
+    first = client.get(url)
+    assert first.status_code == 200
+    assert first.mimetype == 'image/png'
+    assert 'immutable' in first.headers['Cache-Control']
+    first.close()
+    # served from disk
+    budget(0, 50, lambda: client.get(url), warm=False).close()
+    assert hits == ['/hop.png']
+
+
+def test_concurrent_misses_fetch_once(app, image_server):
+    base, hits = image_server
+    app.config['IMAGE_FETCH_ALLOWED_NETWORKS'] = ['127.0.0.1/32']
+    with app.test_request_context():
+        url = thumbnail_url(f'{base}/busy.png', 150)
+
+    def get(_):
+        response = app.test_client().get(url)
+        response.close()
+        return response.status_code
+
+    with ThreadPoolExecutor(8) as pool:
+        assert list(pool.map(get, range(8))) == [200] * 8
+    assert hits == ['/busy.png']
+
+
+def test_image_proxy_stays_out_of_private_networks(app, client, image_server):
+    base, hits = image_server
+    with app.test_request_context():
+        url = thumbnail_url(f'{base}/internal.png', 300)
+    # not fetched, the browser is sent to the source instead
+    response = client.get(url)
+    assert response.status_code == 302
+    assert hits == []
+
+    # every redirect hop is checked too
+    with pytest.raises(images.ImageFetchError, match='non-public address 169.254.169.254'):
+        images.fetch(f'{base}/moved', 5, 1024, ['127.0.0.1/32'])
+    assert hits == ['/moved']
+
+
+def test_image_proxy_sends_non_images_to_the_source(app, client, image_server):
+    base, hits = image_server
+    app.config['IMAGE_FETCH_ALLOWED_NETWORKS'] = ['127.0.0.1/32']
+    with app.test_request_context():
+        url = thumbnail_url(f'{base}/page.png', 300)
+    response = client.get(url)
+    assert response.status_code == 302
+    assert response.location == f'{base}/page.png'
+    # nothing was cached
+    assert client.get(url).status_code == 302
+    assert hits == ['/page.png', '/page.png']
+
+
+def test_image_proxy_evicted_right_away(app, client, image_server):
+    base, hits = image_server
+    # every thumbnail is evicted as soon as it's written
+    app.config.update(IMAGE_FETCH_ALLOWED_NETWORKS=['127.0.0.1/32'], IMAGE_CACHE_MAX_BYTES=1)
+    with app.test_request_context():
+        url = thumbnail_url(f'{base}/hop.png', 300)
+    response = client.get(url)
+    assert response.status_code == 302
+    assert response.location == f'{base}/hop.png'
+
+
+def test_image_proxy_only_serves_signed_urls(client, image_server):
+    base, hits = image_server
+    response = client.get('/images/300', query_string={'url': f'{base}/x.png', 'sig': 'x'})
+    assert response.status_code == 404
+    assert hits == []
+
+
+def test_image_proxy_key_is_shared(tmp_path):
+    # a second worker (or a restart, or `flask prerender`) reads the same key
+    path = str(tmp_path / 'keys' / 'image_proxy_key')
+    key = images._load_key(path)
+    assert len(key) == 64
+    assert images._load_key(path) == key
+    assert [name for name in os.listdir(tmp_path / 'keys')] == ['image_proxy_key']
@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta
+
+import scheduling
+from models import Show
+
+from conftest import UPCOMING, count
+
+
+def test_shows(client, budget):
+    response = budget(1, 300, lambda: client.get('/shows'))
+    assert response.status_code == 200
+    assert response.data.count(b'tile-show') == 12
+
+
+def test_shows_by_period(client):
+    upcoming = client.get('/shows?period=upcoming').data
+    past = client.get('/shows?period=past').data
+    assert upcoming.count(b'tile-show') == 6
+    assert past.count(b'tile-show') == 6
+
+
+def test_create_show_form(client, budget):
+    assert budget(0, 100, lambda: client.get('/shows/create')).status_code == 200
+
+
+def test_create_show(client, budget):
+    data = {'artist_id': '3', 'venue_id': '2', 'start_time': '2040-06-15 20:00:00'}
+    response = budget(5, 200, lambda: client.post('/shows/create', data=data), warm=False)
+    assert b'successfully booked' in response.data
+    # venue 2 is in Los Angeles, the show is stored in UTC
+    assert count(Show, Show.venue_id == 2, Show.artist_id == 3,
+                 Show.start_time == datetime(2040, 6, 16, 3)) == 1
+
+
+def test_create_show_for_missing_venue(client):
+    data = {'artist_id': '1', 'venue_id': '999', 'start_time': '2040-06-15 20:00:00'}
+    response = client.post('/shows/create', data=data)
+    assert b'Errors' in response.data
+    assert count(Show, Show.venue_id == 999) == 0
+
+
+def test_recurring_shows_form(client, budget):
+    assert budget(0, 100, lambda: client.get('/shows/recurring')).status_code == 200
+
+
+def test_recurring_shows(client, budget):
+    data = {'artist_id': '1', 'venue_id': '3', 'start_time': '2040-01-02 20:00:00',
+            'recurrence': 'weekly', 'end_date': '2040-03-01'}
+    response = budget(7, 300, lambda: client.post('/shows/recurring', data=data), warm=False)
+    assert b'9 shows successfully booked' in response.data
+    assert count(Show, Show.venue_id == 3, Show.artist_id == 1,
+                 Show.start_time >= datetime(2040, 1, 1)) == 9
+
+
+def test_batch_shows(client, budget):
+    payload = {'shows': [
+        {'artist_id': 2, 'venue_id': 3, 'start_time': '2041-01-01T20:00:00'},
+        {'artist_id': 3, 'venue_id': 3, 'start_time': '2041-01-02T20:00:00',
+         'recurrence': 'custom', 'interval_days': 3, 'end_date': '2041-01-10'},
+    ]}
+    response = budget(7, 300, lambda: client.post('/shows/batch', json=payload), warm=False)
+    assert response.status_code == 201
+    assert response.json == {'booked': 4}
+
+
+def test_batch_shows_rejects_clashes_atomically(client):
+    taken = UPCOMING.strftime('%Y-%m-%dT%H:%M:%S')
+    payload = {'shows': [
+        {'artist_id': 2, 'venue_id': 3, 'start_time': '2041-01-01T20:00:00'},
+        {'artist_id': 1, 'venue_id': 1, 'start_time': taken},
+        {'artist_id': 1, 'venue_id': 999, 'start_time': taken},
+    ]}
+    before = count(Show)
+    response = client.post('/shows/batch', json=payload)
+    assert response.status_code == 409
+    assert response.json['problems'] == ['Venue 999 does not exist.']
+    assert count(Show) == before
+
+
+def test_batch_shows_racing_another_batch(client, monkeypatch):
+    # the other batch committed after this one's clash check
+    monkeypatch.setattr(scheduling, 'booked_slots', lambda *args: [])
+    # venue 3 is on UTC
+    taken = (UPCOMING + timedelta(days=30)).strftime('%Y-%m-%dT%H:%M:%S')
+    before = count(Show)
+    response = client.post('/shows/batch', json={'shows': [
+        {'artist_id': 1, 'venue_id': 3, 'start_time': taken}]})
+    assert response.status_code == 409
+    assert 'booked at the same time' in response.json['problems'][0]
+    assert count(Show) == before
+
+
+def test_batch_shows_rejects_malformed_payloads(client):
+    show = {'artist_id': 2, 'venue_id': 3, 'start_time': '2041-01-01T20:00:00'}
+    for item, problem in (
+            (dict(show, recurrence='custom', interval_days='3', end_date='2041-01-10'),
+             'Custom recurrence needs an interval of at least 1 day.'),
+            (dict(show, recurrence='weekly'), 'Missing end_date.'),
+            (dict(show, start_time='tomorrow'), 'Invalid start_time "tomorrow".'),
+            (dict(show, artist_id='x'), None)):
+        response = client.post('/shows/batch', json={'shows': [item]})
+        assert response.status_code == 400
+        if problem:
+            assert response.json['problems'] == [problem]
+
+
+def test_shows_feed_follows_writes(client):
+    client.post('/shows/batch', json={'shows': [
+        {'artist_id': 2, 'venue_id': 3, 'start_time': '2041-01-01T20:00:00'}]})
+    client.post('/artists/2/edit', data={
+        'name': 'The Wild Sax Band', 'city': 'San Francisco', 'state': 'CA',
+        'phone': '326-123-5000', 'genres': ['Jazz'], 'version': '1',
+        'facebook_link': 'https://www.facebook.com/TheWildSaxBand'})
+    page = client.get('/shows').data
+    assert page.count(b'tile-show') == 13
+    assert page.count(b'The Wild Sax Band') == 5
+    assert b'Guns N Petals 2' not in page
+
+    client.delete('/venues/3')
+    page = client.get('/shows').data
+    assert page.count(b'tile-show') == 8
+
+
+def test_client_side_dates(app, client, budget):
+    app.config.update(CLIENT_SIDE_DATES=True)
+    response = budget(1, 300, lambda: client.get('/shows'))
+    assert b'flask_moment_render_all' in response.data
+    assert response.data.count(b'data-function="fromNow"') == 12
+    # the venue's wall clock time is sent without a zone, the instant in UTC
+    # (the same here, sqlite shows UTC)
+    first = UPCOMING + timedelta(days=10)
+    assert first.strftime('"%Y-%m-%dT%H:%M:%S" data-function="format"').encode() in response.data
+    assert first.strftime('"%Y-%m-%dT%H:%M:%SZ" data-function="fromNow"').encode() in response.data
+
+    venue = client.get('/venues/1').data
+    assert venue.count(b'data-function="format"') == 4
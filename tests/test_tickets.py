@@ -0,0 +1,73 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import update
+
+from models import db, Show, Venue
+
+from conftest import UPCOMING, count
+
+
+def set_capacity(app, venue_id, capacity):
+    with app.app_context():
+        db.session.execute(update(Venue).where(Venue.id == venue_id).values(capacity=capacity))
+        db.session.commit()
+
+
+def upcoming_show(app, venue_id, tickets):
+    with app.app_context():
+        show = Show.query.filter(Show.venue_id == venue_id, Show.start_time > UPCOMING).first()
+        show.tickets_available = tickets
+        db.session.commit()
+        return show.id
+
+
+def test_new_shows_get_the_venue_capacity(app, client):
+    set_capacity(app, 2, 300)
+    client.post('/shows/create', data={
+        'artist_id': '3', 'venue_id': '2', 'start_time': '2040-06-15 20:00:00'})
+    client.post('/shows/batch', json={'shows': [
+        {'artist_id': 1, 'venue_id': 2, 'start_time': '2041-01-01T20:00:00'}]})
+    assert count(Show, Show.venue_id == 2, Show.tickets_available == 300) == 2
+
+
+def test_reserve(app, client, budget):
+    show_id = upcoming_show(app, 1, 5)
+    response = budget(2, 200, lambda: client.post(
+        f'/shows/{show_id}/reserve', json={'quantity': 3}), warm=False)
+    assert response.json == {'show_id': show_id, 'reserved': 3, 'tickets_available': 2}
+
+    response = client.post(f'/shows/{show_id}/reserve', json={'quantity': 3})
+    assert response.status_code == 409
+    assert response.json['tickets_available'] == 2
+    response = budget(1, 100, lambda: client.get(f'/shows/{show_id}/tickets'))
+    assert response.json['tickets_available'] == 2
+
+
+def test_reserve_refusals(app, client):
+    with app.app_context():
+        past_id = Show.query.filter(Show.start_time < UPCOMING).first().id
+        untracked_id = Show.query.filter(Show.start_time > UPCOMING).first().id
+    assert client.post('/shows/999/reserve', json={'quantity': 1}).status_code == 404
+    assert client.post(f'/shows/{past_id}/reserve', json={'quantity': 1}).status_code == 409
+    assert client.post(f'/shows/{untracked_id}/reserve', json={'quantity': 1}).status_code == 409
+    assert client.post(f'/shows/{untracked_id}/reserve', json={'quantity': 0}).status_code == 400
+    assert client.post(f'/shows/{untracked_id}/reserve', json={'quantity': 'x'}).status_code == 400
+
+
+def test_no_oversell_under_concurrency(app):
+    show_id = upcoming_show(app, 3, 50)
+
+    def buy(_):
+        # a client per thread, the test client keeps per client state
+        return app.test_client().post(f'/shows/{show_id}/reserve', json={'quantity': 1})
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        responses = list(pool.map(buy, range(200)))
+
+    codes = [response.status_code for response in responses]
+    assert codes.count(200) == 50
+    assert codes.count(409) == 150
+    assert count(Show, Show.id == show_id, Show.tickets_available == 0) == 1
+    # every success saw a distinct count, no two buyers got the same ticket
+    left = sorted(r.json['tickets_available'] for r in responses if r.status_code == 200)
+    assert left == list(range(50))
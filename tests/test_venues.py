@@ -0,0 +1,109 @@
+import feed
+from models import Show, ShowFeed, Venue
+
+from conftest import count
+
+
+def test_index(client, budget):
+    response = budget(0, 100, lambda: client.get('/'))
+    assert response.status_code == 200
+
+
+def test_venues_lists_every_active_venue(client, budget):
+    response = budget(1, 200, lambda: client.get('/venues'))
+    assert response.status_code == 200
+    for i in range(1, 4):
+        assert f'The Musical Hop {i}'.encode() in response.data
+
+
+def test_search_venues_is_case_insensitive(client, budget):
+    response = budget(1, 200, lambda: client.post(
+        '/venues/search', data={'search_term': 'musical hop 2'}))
+    assert response.status_code == 200
+    assert b'The Musical Hop 2' in response.data
+    assert b'The Musical Hop 1' not in response.data
+
+
+def test_show_venue_splits_upcoming_and_past(client, budget):
+    response = budget(3, 200, lambda: client.get('/venues/1'))
+    assert response.status_code == 200
+    assert b'2 Upcoming Shows' in response.data
+    assert b'2 Past Shows' in response.data
+
+
+def test_show_venue_not_found(client):
+    assert client.get('/venues/999').status_code == 404
+
+
+def test_create_venue_form(client, budget):
+    response = budget(0, 100, lambda: client.get('/venues/create'))
+    assert response.status_code == 200
+
+
+def test_create_venue(client, budget):
+    data = {'name': 'Park Square Live Music', 'city': 'San Francisco', 'state': 'CA',
+            'address': '34 Whiskey Moore Ave', 'phone': '415-000-1234',
+            'genres': ['Jazz', 'Folk'], 'timezone': 'America/Los_Angeles',
+            'facebook_link': 'https://www.facebook.com/ParkSquareLiveMusicAndCoffee'}
+    response = budget(2, 200, lambda: client.post('/venues/create', data=data), warm=False)
+    assert response.status_code == 200
+    assert b'was successfully listed' in response.data
+    assert count(Venue, Venue.name == 'Park Square Live Music') == 1
+
+
+def test_create_venue_invalid(client):
+    response = client.post('/venues/create', data={'name': 'No city'})
+    assert b'Errors' in response.data
+    assert count(Venue, Venue.name == 'No city') == 0
+
+
+def test_edit_venue_form(client, budget):
+    response = budget(1, 200, lambda: client.get('/venues/1/edit'))
+    assert response.status_code == 200
+    assert b'The Musical Hop 1' in response.data
+
+
+def edit_data(**changes):
+    data = {'name': 'The Musical Hop 1', 'city': 'San Francisco', 'state': 'CA',
+            'address': '1 Folsom Street', 'phone': '123-123-1234',
+            'genres': ['Jazz', 'Folk'], 'timezone': 'America/New_York',
+            'image_link': 'https://example.com/venue.jpg', 'version': '1',
+            'facebook_link': 'https://www.facebook.com/TheMusicalHop',
+            'seeking_talent': 'y', 'seeking_description': 'Looking for bands'}
+    data.update(changes)
+    return data
+
+
+def test_edit_venue(client, budget):
+    response = budget(4, 200, lambda: client.post(
+        '/venues/1/edit', data=edit_data(name='The Renamed Hop')), warm=False)
+    assert response.status_code == 302
+    assert count(Venue, Venue.name == 'The Renamed Hop', Venue.version == 2) == 1
+
+
+def test_edit_venue_with_stale_version(client):
+    client.post('/venues/1/edit', data=edit_data(name='First edit'))
+    response = client.post('/venues/1/edit', data=edit_data(name='Second edit'))
+    assert response.status_code == 302
+    assert count(Venue, Venue.name == 'Second edit') == 0
+
+
+def test_edit_venue_updates_the_feed_in_the_same_transaction(client, monkeypatch):
+    client.post('/venues/1/edit', data=edit_data(name='The Renamed Hop', version='1'))
+    assert count(ShowFeed, ShowFeed.venue_name == 'The Renamed Hop') > 0
+
+    def broken(*criteria):
+        raise RuntimeError('feed is down')
+    monkeypatch.setattr(feed, 'sync_feed', broken)
+    response = client.post('/venues/1/edit', data=edit_data(name='Lost edit', version='2'))
+    assert response.status_code == 302
+    assert count(Venue, Venue.name == 'Lost edit') == 0
+    assert count(ShowFeed, ShowFeed.venue_name == 'The Renamed Hop') > 0
+
+
+def test_delete_venue_archives_its_shows(client, budget):
+    response = budget(4, 200, lambda: client.delete('/venues/1'), warm=False)
+    assert response.json['success']
+    assert client.get('/venues/1').status_code == 404
+    assert count(Show, Show.venue_id == 1, Show.archived_at.is_(None)) == 0
+    assert client.delete('/venues/1').status_code == 404
@@ -0,0 +1,73 @@
+from sqlalchemy import update
+
+from models import db, Show, Venue, utcnow
+
+#----------------------------------------------------------------------------#
+# Ticket inventory.
+#----------------------------------------------------------------------------#
+
+# A show starts with its venue's capacity in tickets_available. A reservation
+# is one conditional UPDATE .. SET tickets_available = tickets_available - n
+# WHERE tickets_available >= n, the database serializes concurrent updates of
+# the row and re-checks the condition, so two buyers can never both get the
+# last ticket and nothing is read and written back in python. The CHECK
+# constraint on the column backs it up.
+
+
+class ReservationError(Exception):
+    """ Raised when tickets can't be reserved. Carries the HTTP status to answer
+    with and the tickets that are left, if any."""
+
+    def __init__(self, message, status=409, tickets_available=None) -> None:
+        super().__init__(message)
+        self.status = status
+        self.tickets_available = tickets_available
+
+
+def reserve(show_id, quantity) -> int:
+    # takes quantity tickets of an upcoming show, returns the tickets left
+    statement = update(Show).where(
+        Show.id == show_id, Show.archived_at.is_(None), Show.start_time >= utcnow(),
+        Show.tickets_available >= quantity,
+    ).values(tickets_available=Show.tickets_available - quantity).execution_options(
+        synchronize_session=False)
+    try:
+        if db.session.get_bind().dialect.full_returning:
+            # postgres returns the new count with the update, one round trip
+            remaining = db.session.execute(
+                statement.returning(Show.tickets_available)).scalar()
+            reserved = remaining is not None
+        else:
+            reserved = db.session.execute(statement).rowcount == 1
+            remaining = db.session.query(Show.tickets_available).filter(
+                Show.id == show_id).scalar() if reserved else None
+        if reserved:
+            db.session.commit()
+            return remaining
+
+        # nothing was updated, find out why
+        show = db.session.query(
+            Show.tickets_available, Show.archived_at, Show.start_time >= utcnow()
+        ).filter(Show.id == show_id).first()
+        db.session.rollback()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if show is None or show.archived_at is not None:
+        raise ReservationError(f'Show {show_id} does not exist.', 404)
+    tickets_available, _, upcoming = show
+    if not upcoming:
+        raise ReservationError(f'Show {show_id} has already taken place.')
+    if tickets_available is None:
+        raise ReservationError(f'Show {show_id} is not ticketed.')
+    raise ReservationError(f'Only {tickets_available} tickets left.',
+                           tickets_available=tickets_available)
+
+
+def availability(show_id):
+    # {'tickets_available', 'capacity'} of a live show, None when there's none
+    row = db.session.query(Show.tickets_available, Venue.capacity).join(
+        Venue, Venue.id == Show.venue_id).filter(
+        Show.id == show_id, Show.archived_at.is_(None)).first()
+    return row._asdict() if row else None
@@ -0,0 +1,59 @@
+from sqlalchemy import update
+
+from feed import sync_after_edit
+from identity import forget
+from models import db
+
+#----------------------------------------------------------------------------#
+# Targeted, versioned updates from edit forms.
+#----------------------------------------------------------------------------#
+
+# never taken from the form
+PROTECTED_COLUMNS = ('id', 'version', 'deleted_at')
+
+
+class StaleEditError(Exception):
+    """ The row was changed by someone else after the form was loaded."""
+
+
+def form_columns(model, form) -> list:
+    return [column for column in model.__table__.columns
+            if column.name in form._fields and column.name not in PROTECTED_COLUMNS]
+
+
+def update_from_form(model, entity_id, form, expected_version):
+    # Diffs the form against the current row and writes only the changed
+    # columns with a single UPDATE guarded by the version the form was loaded
+    # with, the feed rows it changes are written in the same transaction.
+    # Returns the changed values, None when the row doesn't exist.
+    columns = form_columns(model, form)
+    current = db.session.query(model.version, *columns).filter(
+        model.id == entity_id, model.deleted_at.is_(None)).first()
+    if current is None:
+        return None
+    if current.version != expected_version:
+        raise StaleEditError()
+
+    changes = {column.name: form[column.name].data for column in columns
+               if form[column.name].data != getattr(current, column.name)}
+    if not changes:
+        return changes
+
+    result = db.session.execute(
+        update(model)
+        .where(model.id == entity_id, model.version == expected_version)
+        .values(version=model.version + 1, **changes)
+        .execution_options(synchronize_session=False)
+    )
+    # someone committed between our read and our write
+    if result.rowcount == 0:
+        db.session.rollback()
+        raise StaleEditError()
+    try:
+        sync_after_edit(model.__tablename__.lower(), entity_id, changes)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    forget(model, [entity_id])
+    return changes